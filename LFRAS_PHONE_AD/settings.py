@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "django_cron",
     # LocalApps
     "accounts",
@@ -39,6 +40,9 @@ INSTALLED_APPS = [
     "validation",
     "preferences",
     "payments",
+    "jobs",
+    "filestore",
+    "search",
     "django_browser_reload",
     "widget_tweaks",
 ]
@@ -147,6 +151,27 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY", "")
 AWS_STORAGE_BUCKET_NAME = os.getenv("AWS_STORAGE_BUCKET_NAME", "lfras-data")
 AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME", "us-east-1")  # e.g. us-east-1
 AWS_QUERYSTRING_AUTH = True
+# Point at a local S3 stand-in (MinIO, moto server) in development; unset for AWS.
+AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL") or None
+
+# Shared cache: dashboard contexts and notification counters are invalidated
+# from other processes (web workers, run_workers, cron), so the cache must be
+# shared. Redis when REDIS_URL is set, otherwise a table in the main database
+# (`manage.py createcachetable`).
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "lucid_cache",
+        }
+    }
 
 DJANGO_CRON_LOCK_BACKEND = "django_cron.backends.lock.cache.CacheLock"
 DJANGO_CRON_MAX_LOG_ENTRIES = 1000
@@ -156,6 +181,10 @@ DJANGO_CRON_TIME_ZONE = "America/Chicago"  # ensure cron uses Central time
 CRON_CLASSES = [
     "documents.cron.SendExpiryNotificationsCron",
     "payments.cron.ExpireSubscriptionsCron",
+    "activities.cron.PruneActivityEventsCron",
+    "filestore.cron.SweepBlobsCron",
+    "notifications.cron.SendOutboxCron",
+    "jobs.cron.RunJobsCron",
 ]
 
 ROLE_THEME_CLASS = {
@@ -170,8 +199,23 @@ ROLE_THEME_CLASS = {
 STORAGES = {
     "default": {"BACKEND": "storages.backends.s3boto3.S3Boto3Storage"},
     "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    # content-addressed blobs (filestore): keys are unique per row, so skip the
+    # exists() HEAD that AWS_S3_FILE_OVERWRITE=False does on every save
+    "blobs": {
+        "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
+        "OPTIONS": {"file_overwrite": True},
+    },
 }
 
+# Hash uploads while they are received (filestore deduplication)
+FILE_UPLOAD_HANDLERS = [
+    "filestore.uploadhandler.HashingMemoryFileUploadHandler",
+    "filestore.uploadhandler.HashingTemporaryFileUploadHandler",
+]
+
+# Multi-document ZIP posts one "ids" field per selected document
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 5000
+
 CSRF_TRUSTED_ORIGINS = [
     "https://lucidcompliances.com",
     "https://www.lucidcompliances.com",
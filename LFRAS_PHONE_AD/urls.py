@@ -24,4 +24,5 @@ urlpatterns = [
     path("settings/", include(("preferences.urls", "preferences"), namespace="preferences")),
     path("audit/", include(("auditlog.urls", "auditlog"), namespace="audit")),
     path("payments/", include(("payments.urls", "payments"), namespace="payments")),
+    path("search/", include(("search.urls", "search"), namespace="search")),
 ]
\ No newline at end of file
@@ -125,6 +125,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     profile_photo = models.ImageField(
         upload_to=profile_photo_upload_to, null=True, blank=True
     )
+    profile_photo_size = models.BigIntegerField(default=0)
     phone = models.CharField(max_length=32, blank=True)
     address_line1 = models.CharField(max_length=128, blank=True)
     address_line2 = models.CharField(max_length=128, blank=True)
@@ -194,7 +194,7 @@ def my_profile(request):
         if request.POST.get("remove_photo") and u.profile_photo:
             u.profile_photo.delete(save=False)
             u.profile_photo = None
-            u.save(update_fields=["profile_photo"])
+            u.save(update_fields=["profile_photo", "profile_photo_size"])
             messages.success(request, "Profile photo removed.")
             return redirect("accounts:my_profile")
 
@@ -202,7 +202,7 @@ def my_profile(request):
         file_obj = request.FILES.get("profile_photo")
         if file_obj:
             u.profile_photo = file_obj
-            u.save(update_fields=["profile_photo"])
+            u.save(update_fields=["profile_photo", "profile_photo_size"])
             messages.success(request, "Profile photo updated.")
         else:
             messages.info(request, "No file selected.")
@@ -25,6 +25,7 @@ class ActivityAdmin(admin.ModelAdmin):
         "started_at",
         "ended_at",
         "total_files",
+        "valid_files",
         "failed_files",
         "reuploaded_files",
     )
@@ -34,4 +35,4 @@ class ActivityAdmin(admin.ModelAdmin):
 
 @admin.register(ActivityZip)
 class ActivityZipAdmin(admin.ModelAdmin):
-    list_display = ("activity", "generated_at")
+    list_display = ("activity", "generated_at", "file_size", "fingerprint")
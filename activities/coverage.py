@@ -0,0 +1,118 @@
+"""
+Persisted validation-rule coverage per activity.
+
+ActivityRuleCoverage holds, per (activity, rule), the number of VALID_OK
+files whose name contains the rule's expected name. activities.signals
+applies +1/-1 as files enter or leave VALID_OK (or are deleted), and
+recomputes a rule's rows when the rule itself changes, so `summary()` is one
+indexed read regardless of how many files and rules an activity has.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Activity, ActivityFile, ActivityRuleCoverage, FileStatus
+from .rules import for_activity, matcher_for
+
+
+def _matcher(af: ActivityFile):
+    if ActivityFile.activity.is_cached(af):
+        return for_activity(af.activity)
+    row = (
+        Activity.objects.filter(pk=af.activity_id)
+        .values_list("supplier_id", "supplier__rules_version")
+        .first()
+    )
+    return matcher_for(*row) if row else None
+
+
+def deltas_for(af: ActivityFile, delta: int) -> Counter:
+    """{(activity_id, rule_id): delta} for the rules `af`'s name matches."""
+    out = Counter()
+    matcher = _matcher(af)
+    if matcher is None:
+        return out
+    for rule in matcher.matching((af.original_name or "").lower()):
+        out[(af.activity_id, rule.id)] += delta
+    return out
+
+
+def apply(deltas: Counter) -> None:
+    """
+    Add deltas in the caller's transaction. Missing rows are only created for
+    positive deltas: a decrement with no row comes from a cascading activity
+    delete, whose coverage rows are going away anyway.
+    """
+    for (activity_id, rule_id), delta in deltas.items():
+        if not delta:
+            continue
+        key = dict(activity_id=activity_id, rule_id=rule_id)
+        if ActivityRuleCoverage.objects.filter(**key).update(valid_count=F("valid_count") + delta):
+            continue
+        if delta < 0:
+            continue
+        try:
+            with transaction.atomic():
+                ActivityRuleCoverage.objects.create(**key, valid_count=delta)
+        except IntegrityError:
+            # Lost the insert race; the row exists now.
+            ActivityRuleCoverage.objects.filter(**key).update(valid_count=F("valid_count") + delta)
+
+
+def rebuild_rule(rule) -> int:
+    """Recompute one rule's rows across its supplier's activities. Returns rows written."""
+    ActivityRuleCoverage.objects.filter(rule_id=rule.pk).delete()
+    needle = (rule.expected_name or "").strip()
+    if not rule.is_active or not needle:
+        return 0
+    counts = (
+        ActivityFile.objects.filter(
+            activity__supplier_id=rule.supplier_id,
+            status=FileStatus.VALID_OK,
+            original_name__icontains=needle,
+        )
+        .values("activity_id")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    rows = [
+        ActivityRuleCoverage(activity_id=c["activity_id"], rule_id=rule.pk, valid_count=c["n"])
+        for c in counts
+    ]
+    ActivityRuleCoverage.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def rebuild() -> int:
+    """Recompute every active rule's coverage (repair / backfill)."""
+    from tenants.models import SupplierValidationRule as Rule
+
+    with transaction.atomic():
+        ActivityRuleCoverage.objects.exclude(rule__is_active=True).delete()
+        return sum(rebuild_rule(r) for r in Rule.objects.filter(is_active=True))
+
+
+def summary(a: Activity) -> dict:
+    """Rule coverage and missing required documents for an activity."""
+    rules = for_activity(a).rules
+    if not rules:
+        return {"any_active_rules": False, "required_missing": [], "matched_counts": {}}
+
+    counts = dict(
+        ActivityRuleCoverage.objects.filter(activity=a, valid_count__gt=0).values_list(
+            "rule_id", "valid_count"
+        )
+    )
+    matched_counts = {r.needle: counts.get(r.id, 0) for r in rules if r.needle}
+    required_missing = [
+        r.expected_name for r in rules if r.required and r.needle and not matched_counts.get(r.needle)
+    ]
+    return {
+        "any_active_rules": True,
+        "required_missing": required_missing,
+        "matched_counts": matched_counts,
+    }
@@ -0,0 +1,17 @@
+# activities/cron.py
+from django.core.management import call_command
+from django_cron import CronJobBase, Schedule
+
+
+class PruneActivityEventsCron(CronJobBase):
+    """
+    Drop old activity file change-feed events at 2:00 AM US/Central.
+    Calls the prune_activity_events management command.
+    """
+
+    RUN_AT_TIMES = ["02:00"]
+    schedule = Schedule(run_at_times=RUN_AT_TIMES)
+    code = "activities.prune_activity_events_cron"
+
+    def do(self):
+        call_command("prune_activity_events")
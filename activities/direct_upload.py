@@ -0,0 +1,225 @@
+"""
+Direct-to-bucket uploads for activity files.
+
+The client asks Django to `initiate` an S3 multipart upload, fetches
+presigned URLs for its parts (`part_urls`), PUTs the bytes straight to the
+bucket and then calls `complete`. Django never sees the file body: it only
+creates the ActivityFile row pointing at the finished object, validated in
+memory and inserted in its final status.
+
+Upload state travels in a signed token. The file's version is resolved
+at `complete`, under a lock on the activity, so uploads of one name that
+overlap still get distinct versions. The key is staged (filestore) at
+`initiate` and unstaged when the row commits, so an upload completed in S3
+whose row never landed is removed by `sweep_blobs`; an abandoned multipart
+upload is cleaned up by `abort` or by the bucket's incomplete-multipart
+lifecycle rule. Set AWS_S3_ENDPOINT_URL to point the whole flow at a local
+S3 stand-in (MinIO, moto server).
+"""
+
+from __future__ import annotations
+
+import math
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from filestore.services import stage, unstage
+from .models import Activity, ActivityFile, FileStatus
+
+SALT = "activities.direct_upload"
+
+# S3 limits: parts of 5 MiB..5 GiB (the last may be smaller), at most 10k parts.
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10_000
+
+PART_SIZE = max(int(getattr(settings, "ACTIVITY_UPLOAD_PART_SIZE", 8 * 1024 * 1024)), MIN_PART_SIZE)
+URL_EXPIRES = int(getattr(settings, "ACTIVITY_UPLOAD_URL_EXPIRES", 3600))
+# How long a started upload may take before its token is refused.
+TOKEN_MAX_AGE = int(getattr(settings, "ACTIVITY_UPLOAD_TOKEN_MAX_AGE", 24 * 3600))
+MAX_BYTES = int(getattr(settings, "ACTIVITY_UPLOAD_MAX_BYTES", 5 * 1024**3))
+
+
+class DirectUploadError(Exception):
+    pass
+
+
+def _s3(storage=None):
+    storage = storage or default_storage
+    connection = getattr(storage, "connection", None)
+    if connection is None or not getattr(storage, "bucket_name", None):
+        raise DirectUploadError("Direct uploads need S3 storage.")
+    return connection.meta.client, storage.bucket_name
+
+
+def _key(storage, name: str) -> str:
+    from core.zipstream import s3_key
+
+    return s3_key(storage, name)
+
+
+def _next_version(a: Activity, original_name: str) -> tuple[int, int | None]:
+    last = (
+        a.files.filter(original_name=original_name)
+        .order_by("-version", "-uploaded_at")
+        .values_list("id", "version")
+        .first()
+    )
+    return ((last[1] + 1), last[0]) if last else (1, None)
+
+
+def part_size_for(size: int) -> int:
+    return max(PART_SIZE, math.ceil(size / MAX_PARTS))
+
+
+# ---------- token ----------
+
+
+def _sign(state: dict) -> str:
+    return signing.dumps(state, salt=SALT, compress=True)
+
+
+def read_token(token: str, *, activity: Activity, user) -> dict:
+    try:
+        state = signing.loads(token or "", salt=SALT, max_age=TOKEN_MAX_AGE)
+    except signing.SignatureExpired:
+        raise DirectUploadError("Upload session expired; start the upload again.")
+    except signing.BadSignature:
+        raise DirectUploadError("Invalid upload token.")
+    if state.get("a") != activity.id or state.get("u") != user.id:
+        raise DirectUploadError("Upload token does not belong to this activity.")
+    return state
+
+
+# ---------- flow ----------
+
+
+def initiate(a: Activity, user, original_name: str, size: int, content_type: str = "") -> dict:
+    original_name = (original_name or "").strip()[:255]
+    if not original_name:
+        raise DirectUploadError("A file name is required.")
+    if size <= 0:
+        raise DirectUploadError("A file size is required.")
+    if size > MAX_BYTES:
+        raise DirectUploadError(f"File is larger than {MAX_BYTES} bytes.")
+
+    storage = default_storage
+    client, bucket = _s3(storage)
+    # only names the object; complete() assigns the row's version
+    version, _ = _next_version(a, original_name)
+    field = ActivityFile._meta.get_field("file")
+    name = storage.get_available_name(
+        field.generate_filename(ActivityFile(activity=a, version=version), original_name),
+        max_length=field.max_length,
+    )
+    extra = {"ContentType": content_type} if content_type else {}
+    stage([name])
+    upload_id = client.create_multipart_upload(Bucket=bucket, Key=_key(storage, name), **extra)["UploadId"]
+
+    part_size = part_size_for(size)
+    state = {
+        "a": a.id,
+        "u": user.id,
+        "name": name,
+        "upload_id": upload_id,
+        "original_name": original_name,
+        "size": size,
+    }
+    return {
+        "token": _sign(state),
+        "part_size": part_size,
+        "part_count": max(1, math.ceil(size / part_size)),
+        "expires_in": URL_EXPIRES,
+    }
+
+
+def part_urls(state: dict, part_numbers) -> dict:
+    """{part_number: presigned PUT url}."""
+    client, bucket = _s3()
+    key = _key(default_storage, state["name"])
+    part_count = max(1, math.ceil(state["size"] / part_size_for(state["size"])))
+    urls = {}
+    for n in part_numbers:
+        n = int(n)
+        if not 1 <= n <= part_count:
+            raise DirectUploadError(f"Part number {n} is out of range 1..{part_count}.")
+        urls[n] = client.generate_presigned_url(
+            "upload_part",
+            Params={"Bucket": bucket, "Key": key, "UploadId": state["upload_id"], "PartNumber": n},
+            ExpiresIn=URL_EXPIRES,
+        )
+    return urls
+
+
+def _uploaded_parts(client, bucket, key, upload_id) -> list:
+    parts, marker = [], 0
+    while True:
+        page = client.list_parts(Bucket=bucket, Key=key, UploadId=upload_id, PartNumberMarker=marker)
+        parts += [{"PartNumber": p["PartNumber"], "ETag": p["ETag"]} for p in page.get("Parts", [])]
+        if not page.get("IsTruncated"):
+            return parts
+        marker = page["NextPartNumberMarker"]
+
+
+def complete(state: dict, *, activity: Activity, user, validate) -> ActivityFile:
+    """
+    Assemble the parts (no transaction open), then create the ActivityFile
+    for the stored object. `validate(af) -> (ok, reason)` runs on the unsaved
+    row, as in activities.ingest; the version is assigned after it, with the
+    activity locked.
+    """
+    client, bucket = _s3()
+    key = _key(default_storage, state["name"])
+    try:
+        parts = _uploaded_parts(client, bucket, key, state["upload_id"])
+    except client.exceptions.NoSuchUpload:
+        raise DirectUploadError("Upload was already completed or aborted.")
+    except client.exceptions.ClientError as e:
+        raise DirectUploadError(f"Could not list uploaded parts: {e}")
+    if not parts:
+        raise DirectUploadError("No parts were uploaded.")
+    try:
+        client.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=state["upload_id"], MultipartUpload={"Parts": parts}
+        )
+        size = client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+    except client.exceptions.ClientError as e:
+        raise DirectUploadError(f"Could not assemble upload: {e}")
+    if size != state["size"] or size > MAX_BYTES:
+        # The token only vouches for the size declared at initiate.
+        client.delete_object(Bucket=bucket, Key=key)
+        unstage([state["name"]])
+        raise DirectUploadError(f"Uploaded {size} bytes but {state['size']} were declared.")
+
+    af = ActivityFile(
+        activity=activity,
+        uploaded_by=user,
+        original_name=state["original_name"],
+        file_size=size,
+        validated_at=timezone.now(),
+    )
+    af.file.name = state["name"]  # already in the bucket; nothing to upload
+    ok, reason = validate(af)
+    af.status = FileStatus.VALID_OK if ok else FileStatus.VALID_FAILED
+    af.failure_reason = "" if ok else (reason or "Validation failed")
+    with transaction.atomic():
+        # serializes concurrent completes of the same activity
+        Activity.objects.select_for_update().only("pk").get(pk=activity.pk)
+        af.version, af.reupload_of_id = _next_version(activity, af.original_name)
+        af.save()
+        unstage([state["name"]])
+    return af
+
+
+def abort(state: dict) -> None:
+    client, bucket = _s3()
+    try:
+        client.abort_multipart_upload(
+            Bucket=bucket, Key=_key(default_storage, state["name"]), UploadId=state["upload_id"]
+        )
+    except client.exceptions.ClientError:
+        pass  # already completed or aborted
+    unstage([state["name"]])
@@ -0,0 +1,98 @@
+"""
+Change feed for activity file statuses.
+
+activities.signals appends an ActivityFileEvent for every file create, status
+change and delete once the change commits. Clients keep the id of the last
+event they saw (the cursor) and ask for newer ones: the SSE view streams them,
+the JSON view returns one batch. Ids come from a sequence assigned at insert,
+so an insert that commits late could appear behind the cursor; events are
+only handed out once they are SETTLE_SECONDS old to leave room for that.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Activity, ActivityFile, ActivityFileEvent
+
+DELETED = "deleted"
+BATCH = 500
+SETTLE_SECONDS = float(getattr(settings, "ACTIVITY_FEED_SETTLE_SECONDS", 1.0))
+RETENTION_DAYS = int(getattr(settings, "ACTIVITY_FEED_RETENTION_DAYS", 2))
+
+
+# ---------- writes ----------
+
+
+def _event(af: ActivityFile, status=None) -> ActivityFileEvent:
+    return ActivityFileEvent(
+        activity_id=af.activity_id,
+        file_id=af.pk,
+        original_name=af.original_name or "",
+        version=af.version or 1,
+        status=status or af.status,
+        failure_reason=af.failure_reason or "",
+    )
+
+
+def _write(events: list) -> None:
+    if any(e.status == DELETED for e in events):
+        # deletes cascading from an activity delete have nothing left to point at
+        alive = set(
+            Activity.objects.filter(pk__in={e.activity_id for e in events}).values_list("pk", flat=True)
+        )
+        events = [e for e in events if e.activity_id in alive]
+    ActivityFileEvent.objects.bulk_create(events)
+
+
+def record_on_commit(files, status=None) -> None:
+    """Append events for `files` after the surrounding transaction commits."""
+    events = [_event(af, status) for af in files]
+    if events:
+        transaction.on_commit(lambda: _write(events))
+
+
+def prune() -> int:
+    cutoff = timezone.now() - timedelta(days=RETENTION_DAYS)
+    return ActivityFileEvent.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+# ---------- reads ----------
+
+
+def latest_cursor(activity_id) -> int:
+    qs = ActivityFileEvent.objects.filter(activity_id=activity_id)
+    return qs.aggregate(m=Max("id"))["m"] or 0
+
+
+def _since(activity_id, cursor: int):
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    return ActivityFileEvent.objects.filter(
+        activity_id=activity_id, id__gt=cursor, created_at__lte=settled
+    ).order_by("id")[:BATCH]
+
+
+def as_dict(e: ActivityFileEvent) -> dict:
+    return {
+        "cursor": e.id,
+        "id": e.file_id,
+        "name": e.original_name,
+        "version": e.version,
+        "status": e.status,
+        "deleted": e.status == DELETED,
+        "failure_reason": e.failure_reason,
+        "at": e.created_at.isoformat(),
+    }
+
+
+def changes_since(activity_id, cursor: int) -> list[dict]:
+    return [as_dict(e) for e in _since(activity_id, cursor)]
+
+
+async def achanges_since(activity_id, cursor: int) -> list[dict]:
+    return [as_dict(e) async for e in _since(activity_id, cursor)]
@@ -0,0 +1,278 @@
+"""
+Batch upload pipeline for activity files.
+
+Plain uploads, ZIP entries and re-uploads all go through `ingest()`:
+
+1. versions for every incoming name are resolved in one query;
+2. content is deduplicated per evaluator (filestore): digests are taken on
+   receipt for request files and by a hashing pass for ZIP entries, the
+   known ones are looked up in one query, and only new content is streamed
+   to storage, by a bounded thread pool, outside any transaction (ZIPs are
+   read in place, entry by entry, never into memory);
+3. rows are validated in memory and inserted with one bulk_create in their
+   final status, in a short transaction that covers only the DB writes and
+   the blob references.
+"""
+
+from __future__ import annotations
+
+import threading
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from dataclasses import dataclass
+from typing import Callable
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.signals import bulk_create
+from filestore import services as blobs
+from .models import Activity, ActivityFile, FileStatus
+
+MAX_ENTRIES = int(getattr(settings, "ACTIVITY_ZIP_MAX_ENTRIES", 2000))
+# Cap on the total uncompressed size; ZipExtFile never yields more than an
+# entry's declared size, so checking the declared sizes bounds the real work.
+MAX_BYTES = int(getattr(settings, "ACTIVITY_ZIP_MAX_BYTES", 2 * 1024**3))
+WORKERS = int(getattr(settings, "ACTIVITY_ZIP_WORKERS", 8))
+
+
+@dataclass
+class Source:
+    """
+    One file to store: `open()` returns a readable file object. A source
+    with a known `sha256` and no `open` refers to content already stored.
+    """
+
+    original_name: str
+    size: int
+    open: Callable | None
+    close_after: bool = True  # close what open() returned once stored
+    lock: threading.Lock | None = None  # serializes open/close (shared ZipFile)
+    reupload_of: ActivityFile | None = None  # explicit re-upload target
+    zip_entry: bool = False
+    sha256: str | None = None
+
+
+@dataclass
+class _Entry:
+    source: Source
+    version: int
+    reupload_of_id: int | None
+    prev_index: int | None = None  # earlier entry with the same name (its row is reupload_of)
+    error: str = ""
+
+
+def latest_versions(a: Activity, names) -> dict:
+    """{original_name: (file id, version)} of the newest file per name, in one query."""
+    latest = {}
+    rows = (
+        a.files.filter(original_name__in=set(names))
+        .order_by("original_name", "-version", "-uploaded_at")
+        .values_list("original_name", "id", "version")
+    )
+    for name, pk, version in rows:
+        latest.setdefault(name, (pk, version))
+    return latest
+
+
+def _plan(a: Activity, sources) -> list[_Entry]:
+    """Assign versions, in upload order."""
+    latest = latest_versions(a, (s.original_name for s in sources if s.reupload_of is None))
+    entries = []
+    in_batch = {}  # original_name -> index of its latest entry in this batch
+    for src in sources:
+        prev_index = None
+        if src.reupload_of is not None:
+            version, prev_id = src.reupload_of.version + 1, src.reupload_of.pk
+        else:
+            prev_id, prev_version = latest.get(src.original_name, (None, 0))
+            version = prev_version + 1
+            prev_index = in_batch.get(src.original_name)
+            in_batch[src.original_name] = len(entries)
+            latest[src.original_name] = (None, version)
+        entries.append(_Entry(src, version, prev_id, prev_index))
+    return entries
+
+
+def _read(entry: _Entry, fn):
+    """Run fn(file object) on the entry's source; errors land on the entry."""
+    src = entry.source
+    lock = src.lock or nullcontext()
+    try:
+        with lock:
+            fh = src.open()
+        try:
+            return fn(fh)
+        finally:
+            with lock:
+                if src.close_after:
+                    fh.close()
+                else:
+                    fh.seek(0)
+    except Exception as e:
+        entry.error = f"Upload/validation error: {e}"
+    return None
+
+
+def _digest(entry: _Entry) -> None:
+    src = entry.source
+    if src.sha256 or src.open is None:
+        return
+    result = _read(entry, blobs.digest)
+    if result:
+        src.sha256 = result[0]
+
+
+def _put(entry: _Entry, blob):
+    return _read(entry, lambda fh: blobs.put(blob, fh))
+
+
+def _rows(a: Activity, user, entries, validate) -> list[ActivityFile]:
+    now = timezone.now()
+    failed_status = getattr(FileStatus, "UPLOAD_FAILED", FileStatus.VALID_FAILED)
+    rows = []
+    for e in entries:
+        af = ActivityFile(
+            activity=a,
+            uploaded_by=user,
+            original_name=e.source.original_name,
+            version=e.version,
+            reupload_of_id=e.reupload_of_id,
+            validated_at=now,
+        )
+        if e.error:
+            af.status, af.failure_reason = failed_status, e.error
+        else:
+            ok, reason = validate(af)
+            af.status = FileStatus.VALID_OK if ok else FileStatus.VALID_FAILED
+            af.failure_reason = "" if ok else (reason or "Validation failed")
+        rows.append(af)
+    return rows
+
+
+def ingest(a: Activity, user, sources, *, validate) -> list[ActivityFile]:
+    """
+    Store `sources` and create their ActivityFiles. `validate(af) -> (ok, reason)`
+    runs on each unsaved row. Returns the rows in source order.
+    """
+    sources = list(sources)
+    if not sources:
+        return []
+    entries = _plan(a, sources)
+    with ThreadPoolExecutor(max_workers=max(1, min(WORKERS, len(entries)))) as pool:
+        list(pool.map(_digest, entries))
+        live = [e for e in entries if not e.error]
+        known = blobs.lookup(a.evaluator_id, (e.source.sha256 for e in live if e.source.open is not None))
+        # without bytes, only content the supplier already holds may be attached
+        held = blobs.lookup(
+            a.evaluator_id, (e.source.sha256 for e in live if e.source.open is None), supplier_id=a.supplier_id
+        )
+        # one write per new content, however often it occurs in the batch
+        first = {}
+        for e in live:
+            if e.source.open is None:
+                if e.source.sha256 not in held:
+                    e.error = "File content was not uploaded."
+                continue
+            if e.source.sha256 not in known:
+                first.setdefault(e.source.sha256, e)
+        reserved = [
+            (e, blobs.reserve(a.evaluator_id, sha, e.source.size, e.source.original_name))
+            for sha, e in first.items()
+        ]
+        # staged before any bytes go out, so a commit that never happens is swept
+        blobs.stage(b.file.name for _, b in reserved)
+        written = [b for b in pool.map(lambda pair: _put(*pair), reserved) if b]
+    for e in entries:
+        head = first.get(e.source.sha256)
+        if not e.error and head is not None and head.error:
+            e.error = head.error
+    rows = _rows(a, user, entries, validate)
+
+    with transaction.atomic():
+        stored = blobs.acquire(
+            a.evaluator_id, written, Counter(e.source.sha256 for e in entries if not e.error)
+        )
+        for e, af in zip(entries, rows):
+            if e.error:
+                continue
+            blob = stored.get(e.source.sha256)
+            if blob is None:  # swept between lookup and now
+                af.status, af.failure_reason = FileStatus.UPLOAD_FAILED, "Stored copy went away; upload again."
+                continue
+            af.blob_id, af.file, af.file_size = blob.pk, blob.file.name, blob.size
+        rows = bulk_create(ActivityFile, rows, batch_size=500)
+        relinked = []
+        for e, af in zip(entries, rows):
+            if e.prev_index is not None:
+                af.reupload_of_id = rows[e.prev_index].pk
+                relinked.append(af)
+        if relinked:
+            ActivityFile.objects.bulk_update(relinked, ["reupload_of"])
+    return rows
+
+
+# ---------- sources ----------
+
+
+def upload_source(f, original_name: str | None = None, reupload_of: ActivityFile | None = None) -> Source:
+    """A Django UploadedFile (in memory, or spooled to disk when large)."""
+    return Source(
+        original_name=(original_name or getattr(f, "name", None) or "upload.bin")[:255],
+        size=f.size,
+        open=lambda: f,
+        close_after=False,
+        reupload_of=reupload_of,
+        sha256=getattr(f, "sha256", None),  # taken on receipt (filestore.uploadhandler)
+    )
+
+
+def zip_sources(zf: zipfile.ZipFile, zip_name: str) -> tuple[list[Source], list[str]]:
+    """Sources for the entries of an open archive, or failure messages if it's over the caps."""
+    infos = [i for i in zf.infolist() if not i.is_dir() and i.filename.split("/")[-1]]
+    if len(infos) > MAX_ENTRIES:
+        return [], [f"{zip_name}: more than {MAX_ENTRIES} files"]
+    if sum(i.file_size for i in infos) > MAX_BYTES:
+        return [], [f"{zip_name}: larger than {MAX_BYTES // 1024**2} MB when extracted"]
+    # ZipFile shares one file handle between members; opening/closing members
+    # touches its refcount, so serialize those (reads are locked by zipfile).
+    lock = threading.Lock()
+    return [
+        Source(
+            original_name=info.filename.split("/")[-1][:255],
+            size=info.file_size,
+            open=lambda info=info: zf.open(info),
+            lock=lock,
+            zip_entry=True,
+        )
+        for info in infos
+    ], []
+
+
+def ingest_uploads(a: Activity, user, uploads, *, validate) -> tuple[list[tuple[Source, ActivityFile]], list[str]]:
+    """
+    Ingest request files in one batch, expanding .zip uploads into their
+    entries. Returns ([(source, created row)], failure messages).
+    """
+    sources, failures = [], []
+    with ExitStack() as stack:
+        for f in uploads:
+            name = getattr(f, "name", None) or "upload.bin"
+            if not name.lower().endswith(".zip"):
+                sources.append(upload_source(f, name))
+                continue
+            try:
+                zf = stack.enter_context(zipfile.ZipFile(f))
+            except zipfile.BadZipFile:
+                failures.append(f"{name}: invalid zip archive")
+                continue
+            entries, errors = zip_sources(zf, name)
+            sources += entries
+            failures += errors
+        rows = ingest(a, user, sources, validate=validate)
+
+    failures += [f"{af.original_name}: {af.failure_reason}" for af in rows if af.status != FileStatus.VALID_OK]
+    return list(zip(sources, rows)), failures
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from activities import feed
+
+
+class Command(BaseCommand):
+    help = "Delete activity file change-feed events older than ACTIVITY_FEED_RETENTION_DAYS."
+
+    def handle(self, *args, **options):
+        n = feed.prune()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {n} activity file events."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from activities.services import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recount total / valid / failed / re-uploaded files on every Activity and fix drifted counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--activity", type=int, action="append", help="Only these activity ids (repeatable)."
+        )
+
+    def handle(self, *args, **options):
+        n = rebuild_counters(options.get("activity"))
+        self.stdout.write(self.style.SUCCESS(f"Fixed counters on {n} activities."))
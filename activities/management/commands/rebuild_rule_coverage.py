@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from activities import coverage
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-activity validation rule coverage table from Activity files and active rules."
+
+    def handle(self, *args, **options):
+        n = coverage.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rule coverage: {n} rows."))
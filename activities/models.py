@@ -5,6 +5,8 @@ from django.conf import settings
 from django.utils import timezone
 from pathlib import Path
 
+from documents.utils import next_reminder_on
+
 User = settings.AUTH_USER_MODEL
 
 from django.conf import settings as dj_settings
@@ -83,8 +85,10 @@ class Activity(models.Model):
     started_at = models.DateTimeField(auto_now_add=True)
     ended_at = models.DateTimeField(null=True, blank=True)
 
-    # denorm counters for report
+    # denorm counters for report; maintained by activities.signals,
+    # repaired by `rebuild_activity_counters`
     total_files = models.PositiveIntegerField(default=0)
+    valid_files = models.PositiveIntegerField(default=0)
     failed_files = models.PositiveIntegerField(default=0)
     reuploaded_files = models.PositiveIntegerField(default=0)
 
@@ -94,6 +98,15 @@ class Activity(models.Model):
     def __str__(self):
         return f"Activity #{self.id} — {self.supplier.name}"
 
+    @property
+    def file_counters(self) -> dict:
+        return {
+            "total": self.total_files,
+            "valid": self.valid_files,
+            "failed": self.failed_files,
+            "reuploads": self.reuploaded_files,
+        }
+
 
 class ActivityFile(models.Model):
     activity = models.ForeignKey(
@@ -103,8 +116,16 @@ class ActivityFile(models.Model):
         User, on_delete=models.SET_NULL, null=True, related_name="activity_files"
     )
     original_name = models.CharField(max_length=255)
-    file = models.FileField(upload_to=activity_file_upload_path)
+    file = models.FileField(upload_to=activity_file_upload_path, max_length=255)
     file_size = models.BigIntegerField(default=0)
+    # shared content-addressed object `file` points at (None: own object)
+    blob = models.ForeignKey(
+        "filestore.StoredBlob",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="activity_files",
+    )
 
     status = models.CharField(
         max_length=20, choices=FileStatus.choices, default=FileStatus.UPLOADING
@@ -120,6 +141,12 @@ class ActivityFile(models.Model):
 
     # Optional expiry date (set by uploader when required by rules)
     expires_on = models.DateField(null=True, blank=True)
+    last_expiry_notified_at = models.DateTimeField(null=True, blank=True)
+    # Due date of the next expiry reminder; kept by save() and the nightly run
+    next_reminder_on = models.DateField(null=True, blank=True, editable=False)
+
+    # fields next_reminder_on is derived from
+    REMINDER_FIELDS = {"expires_on", "status", "last_expiry_notified_at"}
 
     @property
     def is_expired(self) -> bool:
@@ -129,11 +156,36 @@ class ActivityFile(models.Model):
         ordering = ["uploaded_at"]
         indexes = [
             models.Index(fields=["expires_on"]),
+            models.Index(fields=["next_reminder_on"]),
             models.Index(fields=["status", "uploaded_at"]),
         ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # status as loaded, so post_save receivers can see transitions
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+    def schedule_reminder(self, today=None):
+        """Recompute next_reminder_on (not saved); failed uploads get no reminders."""
+        self.next_reminder_on = None
+        if self.expires_on and self.status not in (FileStatus.UPLOAD_FAILED, FileStatus.VALID_FAILED):
+            last = self.last_expiry_notified_at
+            self.next_reminder_on = next_reminder_on(
+                self.expires_on,
+                today=today,
+                last_notified=timezone.localdate(last) if last else None,
+            )
+        return self.next_reminder_on
+
     def save(self, *args, **kwargs):
+        self.schedule_reminder()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and self.REMINDER_FIELDS.intersection(update_fields):
+            kwargs["update_fields"] = {*update_fields, "next_reminder_on"}
         super().save(*args, **kwargs)
+        self._loaded_status = self.status
         if self.file and (not self.file_size or self.file_size <= 0):
             try:
                 self.file_size = self.file.size
@@ -148,3 +200,58 @@ class ActivityZip(models.Model):
     )
     zip_file = models.FileField(upload_to=activity_zip_path)
     generated_at = models.DateTimeField(auto_now_add=True)
+
+    # sha256 over the (file id, version, size) set the archive was built from;
+    # the archive is reused for as long as the activity's files still match.
+    fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
+    manifest = models.JSONField(default=list, blank=True)  # [[file_id, version, size], ...]
+    file_size = models.BigIntegerField(default=0)
+
+
+class ActivityRuleCoverage(models.Model):
+    """
+    Number of VALID_OK files of an activity whose name contains a validation
+    rule's expected name. Maintained incrementally by activities.signals (see
+    activities.coverage) and rebuilt by `rebuild_rule_coverage`.
+    """
+
+    activity = models.ForeignKey(
+        Activity, on_delete=models.CASCADE, related_name="rule_coverage"
+    )
+    rule = models.ForeignKey(
+        "tenants.SupplierValidationRule",
+        on_delete=models.CASCADE,
+        related_name="activity_coverage",
+    )
+    valid_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [("activity", "rule")]
+
+    def __str__(self):
+        return f"Activity #{self.activity_id} rule #{self.rule_id}: {self.valid_count}"
+
+
+class ActivityFileEvent(models.Model):
+    """
+    Append-only log of ActivityFile status changes, read by the activity page's
+    change feed. The id is the feed cursor. Rows are written after the file
+    change commits (activities.signals) and pruned after a retention window.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    activity = models.ForeignKey(
+        Activity, on_delete=models.CASCADE, related_name="file_events"
+    )
+    file_id = models.BigIntegerField()
+    original_name = models.CharField(max_length=255)
+    version = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=20)  # a FileStatus value or "deleted"
+    failure_reason = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["activity", "id"])]
+
+    def __str__(self):
+        return f"#{self.id} file {self.file_id} -> {self.status}"
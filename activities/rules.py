@@ -0,0 +1,172 @@
+"""
+Compiled supplier validation rules.
+
+A supplier's active SupplierValidationRules are compiled once into a
+`Matcher`: an Aho–Corasick automaton over the lower-cased `expected_name`s
+(one pass over a filename finds every rule it contains) with extension and
+keyword lists parsed up front. Compiled matchers are memoized per process,
+keyed by `Supplier.rules_version`, a random stamp that activities.signals
+replaces in the same transaction that saves or deletes a rule, so every
+process sees the change as soon as it commits. A stamp is never reused, not
+even after a rollback, so a memoized matcher can't be mistaken for current. `for_activity()` reads the stamp from the
+activity's (cached) supplier: validating a batch of files costs no rule
+queries while the rules are unchanged, and one compile when they changed.
+"""
+
+from __future__ import annotations
+
+import threading
+import uuid
+from dataclasses import dataclass
+
+MAX_MEMO = 1024  # compiled suppliers kept per process
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    id: int
+    expected_name: str
+    needle: str
+    required: bool
+    extensions: tuple  # lower-case, no dot, in rule order (for messages)
+    keywords: tuple
+
+
+def _split(value: str, strip_dot: bool = False) -> tuple:
+    parts = (p.strip().lower() for p in (value or "").split("|"))
+    return tuple((p.lstrip(".") if strip_dot else p) for p in parts if p)
+
+
+def compile_rule(r) -> CompiledRule:
+    return CompiledRule(
+        id=r.pk,
+        expected_name=r.expected_name,
+        needle=(r.expected_name or "").strip().lower(),
+        required=bool(r.is_required),
+        extensions=_split(r.allowed_extensions, strip_dot=True),
+        keywords=_split(r.required_keywords),
+    )
+
+
+class Matcher:
+    """Aho–Corasick automaton over rule needles; earlier rules win ties."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.any_required = any(r.required for r in self.rules)
+        # goto[state] = {char: state}; out[state] = rule indexes ending here (incl. suffixes)
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        for idx, rule in enumerate(self.rules):
+            if not rule.needle:
+                continue
+            state = 0
+            for ch in rule.needle:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                state = nxt
+            self.out[state] += (idx,)
+        self._link()
+
+    def _link(self):
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, nxt in self.goto[state].items():
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                # needles ending at the failure state also end here
+                self.out[nxt] += self.out[self.fail[nxt]]
+                queue.append(nxt)
+
+    def _hits(self, name: str):
+        state = 0
+        goto, fail, out = self.goto, self.fail, self.out
+        for ch in name:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                yield out[state]
+
+    def match(self, name: str) -> CompiledRule | None:
+        """First rule (in rule order) whose expected name occurs in `name` (lower-cased)."""
+        best = min((min(hits) for hits in self._hits(name)), default=None)
+        return None if best is None else self.rules[best]
+
+    def matching(self, name: str) -> list[CompiledRule]:
+        """Every rule whose expected name occurs in `name` (lower-cased)."""
+        found = set()
+        for hits in self._hits(name):
+            found.update(hits)
+        return [self.rules[i] for i in sorted(found)]
+
+    def validate(self, original_name: str) -> tuple[bool, str]:
+        if not self.rules:
+            return True, ""
+        name = (original_name or "").lower()
+        rule = self.match(name)
+        if rule is None:
+            if self.any_required:
+                return False, "No matching expected file for this upload."
+            return True, ""
+
+        if rule.extensions:
+            ext = name.rsplit(".", 1)[-1] if "." in name else ""
+            if ext not in rule.extensions:
+                return False, f"Extension '.{ext}' not allowed. Expected: {', '.join(rule.extensions)}."
+
+        missing = [kw for kw in rule.keywords if kw not in name]
+        if missing:
+            return False, f"Missing required keywords: {', '.join(missing)}."
+        return True, ""
+
+
+# ---------- per-supplier cache ----------
+
+_memo: dict = {}  # supplier_id -> (version, Matcher)
+_memo_lock = threading.Lock()
+
+
+def version(supplier_id) -> uuid.UUID | None:
+    from tenants.models import Supplier
+
+    return Supplier.objects.filter(pk=supplier_id).values_list("rules_version", flat=True).first()
+
+
+def bump(supplier_id) -> None:
+    """Invalidate the supplier's compiled rules; call in the rule change's transaction."""
+    from tenants.models import Supplier
+
+    Supplier.objects.filter(pk=supplier_id).update(rules_version=uuid.uuid4())
+
+
+def matcher_for(supplier_id, ver: uuid.UUID | None = None) -> Matcher:
+    """The compiled rules of a supplier at version `ver` (read from the row if not given)."""
+    from tenants.models import SupplierValidationRule as Rule
+
+    if ver is None:
+        ver = version(supplier_id)
+    hit = _memo.get(supplier_id)
+    if hit and ver is not None and hit[0] == ver:
+        return hit[1]
+    # Read after the version: rules newer than `ver` only cost a recompile later.
+    rows = Rule.objects.filter(supplier_id=supplier_id, is_active=True).order_by("id")
+    matcher = Matcher(compile_rule(r) for r in rows)
+    with _memo_lock:
+        if len(_memo) >= MAX_MEMO:
+            _memo.clear()
+        _memo[supplier_id] = (ver, matcher)
+    return matcher
+
+
+def for_activity(a) -> Matcher:
+    """Matcher for an activity's supplier; the supplier row is loaded once per instance."""
+    return matcher_for(a.supplier_id, a.supplier.rules_version)
@@ -1,12 +1,21 @@
 from __future__ import annotations
-import io, zipfile
-from types import SimpleNamespace
-from django.core.files.base import ContentFile
+import hashlib
+import logging
+import shutil
+import tempfile
+from django.core.files import File
 from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
 from accounts.models import Roles, User
-from .models import Activity
+from core.zipstream import CHUNK_SIZE, IncompleteZip, StorageTee, ZipMember, append_zip, iter_zip
+from filestore.services import stage, unstage
+from .models import Activity, ActivityFile, ActivityZip, FileStatus
+
+log = logging.getLogger(__name__)
 
 
 def visible_activities_qs(user: User):
@@ -20,50 +29,218 @@ def visible_activities_qs(user: User):
     return qs.none()
 
 
+# ---------- file counters ----------
+
+FAILED_STATUSES = (FileStatus.VALID_FAILED, FileStatus.UPLOAD_FAILED)
+
+COUNTER_FIELDS = ("total_files", "valid_files", "failed_files", "reuploaded_files")
+
+
+def counter_deltas(status, version, sign: int) -> dict:
+    """Activity counter changes for one file entering (+1) or leaving (-1) the counts."""
+    return {
+        "total_files": sign,
+        "valid_files": sign if status == FileStatus.VALID_OK else 0,
+        "failed_files": sign if status in FAILED_STATUSES else 0,
+        "reuploaded_files": sign if (version or 1) > 1 else 0,
+    }
+
+
+def bump_counters(activity_id, **deltas) -> None:
+    """Apply counter deltas with F() in the caller's transaction (never below zero)."""
+    updates = {
+        k: (F(k) + v if v > 0 else Greatest(F(k) + v, Value(0)))
+        for k, v in deltas.items()
+        if v
+    }
+    if updates:
+        Activity.objects.filter(pk=activity_id).update(**updates)
+
+
+def rebuild_counters(activity_ids=None) -> int:
+    """Recount files per activity in one grouped query; returns activities corrected."""
+    activities = Activity.objects.only("pk", *COUNTER_FIELDS)
+    files = ActivityFile.objects.all()
+    if activity_ids is not None:
+        activities = activities.filter(pk__in=activity_ids)
+        files = files.filter(activity_id__in=activity_ids)
+    stats = {
+        r["activity_id"]: r
+        for r in files.values("activity_id")
+        .annotate(
+            total_files=Count("id"),
+            valid_files=Count("id", filter=Q(status=FileStatus.VALID_OK)),
+            failed_files=Count("id", filter=Q(status__in=FAILED_STATUSES)),
+            reuploaded_files=Count("id", filter=Q(version__gt=1)),
+        )
+        .order_by()
+    }
+    changed = []
+    for a in activities.iterator():
+        row = stats.get(a.pk, {})
+        new = {f: row.get(f, 0) for f in COUNTER_FIELDS}
+        if any(getattr(a, f) != v for f, v in new.items()):
+            for f, v in new.items():
+                setattr(a, f, v)
+            changed.append(a)
+    Activity.objects.bulk_update(changed, COUNTER_FIELDS, batch_size=500)
+    return len(changed)
+
+
 def _zip_key_for_activity(a: Activity, ts=None):
     ts = ts or timezone.now()
     fname = f"activity_{a.id}_{ts.strftime('%Y%m%d_%H%M%S')}.zip"
     return f"Evaluator/{a.evaluator_id}/Supplier/{a.supplier_id}/Activity/{a.id}/Files/zipped/{fname}"
 
 
-def zip_activity(a: Activity, create_if_missing: bool = True):
+def _arcname(af) -> str:
+    # original name + version suffix before the extension
+    arcname = f"{af.original_name}"
+    if af.version and af.version > 1:
+        if "." in arcname:
+            base, ext = arcname.rsplit(".", 1)
+            arcname = f"{base}_v{af.version}.{ext}"
+        else:
+            arcname = f"{arcname}_v{af.version}"
+    return arcname
+
+
+def archived_files(a: Activity) -> list:
+    """Stored files of the activity, in archive order (one snapshot per build)."""
+    return [af for af in a.files.order_by("id") if af.file]
+
+
+def _member(af) -> ZipMember:
+    return ZipMember(
+        arcname=_arcname(af),
+        open=lambda name=af.file.name: default_storage.open(name, "rb"),
+        date_time=timezone.localtime(af.uploaded_at).timetuple()[:6],
+    )
+
+
+def activity_zip_members(a: Activity, files=None) -> list[ZipMember]:
+    """One streamed ZIP entry per stored file of the activity."""
+    return [_member(af) for af in (files if files is not None else archived_files(a))]
+
+
+def archive_tee(a: Activity) -> StorageTee:
+    """A storage writer for a new archive object of this activity (staged until saved)."""
+    tee = StorageTee(_zip_key_for_activity(a))
+    stage([tee.name])
+    return tee
+
+
+def activity_zip_filename(a: Activity) -> str:
+    return f"activity_{a.id}.zip"
+
+
+# ---------- archive reuse ----------
+
+
+def zip_manifest(files) -> list:
+    return [[af.id, af.version, af.file_size] for af in files]
+
+
+def zip_fingerprint(manifest) -> str:
+    raw = ";".join(f"{fid}:{ver}:{size}" for fid, ver, size in sorted(map(tuple, manifest)))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def current_archive(a: Activity, files=None):
+    """The stored ActivityZip if it still matches the activity's files, else None."""
+    archive = ActivityZip.objects.filter(activity=a).first()
+    if not archive or not archive.zip_file:
+        return None
+    files = files if files is not None else archived_files(a)
+    if archive.fingerprint != zip_fingerprint(zip_manifest(files)):
+        return None
+    return archive
+
+
+def save_archive(a: Activity, name: str, size: int, manifest: list) -> ActivityZip:
+    """Point the activity's ActivityZip at `name`; the replaced object is deleted."""
+    archive = ActivityZip.objects.filter(activity=a).first() or ActivityZip(activity=a)
+    old_name = archive.zip_file.name if archive.zip_file else None
+    archive.zip_file.name = name
+    archive.file_size = size
+    archive.manifest = manifest
+    archive.fingerprint = zip_fingerprint(manifest)
+    archive.generated_at = timezone.now()
+    with transaction.atomic():
+        archive.save()
+        unstage([name])
+    if old_name and old_name != name:
+        try:
+            default_storage.delete(old_name)
+        except Exception:
+            pass
+    return archive
+
+
+def _append_to_archive(a: Activity, archive: ActivityZip, files: list):
     """
-    Create a ZIP of all successful files and write it to default storage (S3).
-    Returns an object with `.zip_file` that mimics a FileField (has name, open()).
+    Add the files missing from `archive` without re-reading the ones already
+    in it: copy the stored zip to a local temp file, append, upload.
+    Returns the updated ActivityZip, or None if the archive cannot be appended
+    to (a file changed or went away since it was built). Raises IncompleteZip
+    if a new file could not be read.
     """
-    # Build zip in memory
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
-        for af in a.files.all():
-            try:
-                # Only include actual stored file; use original name + version
-                path = af.file.name
-                arcname = f"{af.original_name}"
-                if af.version and af.version > 1:
-                    # append version before extension
-                    if "." in arcname:
-                        base, ext = arcname.rsplit(".", 1)
-                        arcname = f"{base}_v{af.version}.{ext}"
-                    else:
-                        arcname = f"{arcname}_v{af.version}"
-                with default_storage.open(path, "rb") as fh:
-                    zf.writestr(arcname, fh.read())
-            except Exception:
-                # skip any missing file but continue
-                continue
-
-    if not create_if_missing and buf.getbuffer().nbytes == 0:
+    have = {tuple(entry) for entry in archive.manifest or []}
+    manifest = zip_manifest(files)
+    if not have or not have <= {tuple(entry) for entry in manifest}:
         return None
+    new_files = [af for af, entry in zip(files, manifest) if tuple(entry) not in have]
+
+    failed = []
+    with tempfile.TemporaryFile() as tmp:
+        try:
+            with archive.zip_file.open("rb") as src:
+                shutil.copyfileobj(src, tmp, CHUNK_SIZE)
+            append_zip(tmp, activity_zip_members(a, new_files), failed=failed)
+        except Exception:
+            log.warning("Could not append to archive of activity %s; rebuilding", a.id, exc_info=True)
+            return None
+        if failed:
+            raise IncompleteZip(failed)
+        size = tmp.tell()
+        tmp.seek(0)
+        name = default_storage.get_available_name(_zip_key_for_activity(a))
+        stage([name])
+        name = default_storage.save(name, File(tmp))
+    return save_archive(a, name, size, manifest)
+
 
-    key = _zip_key_for_activity(a)
-    content = ContentFile(buf.getvalue())
-    saved_name = default_storage.save(key, content)
+def zip_activity(a: Activity, create_if_missing: bool = True):
+    """
+    Return the activity's ActivityZip, building it only when the set of files
+    changed: reuse on a fingerprint match, append when files were only added,
+    otherwise stream a full rebuild into storage (constant memory).
+
+    Raises IncompleteZip, keeping nothing, if a file could not be read: an
+    archive is only saved with every file of its manifest in it.
+    """
+    files = archived_files(a)
+    if not create_if_missing and not files:
+        return None
 
-    # Return a light wrapper with .zip_file.name and .zip_file.open()
-    class _ZipWrapper:
-        name = saved_name
+    archive = current_archive(a, files)
+    if archive:
+        return archive
 
-        def open(self, mode="rb"):
-            return default_storage.open(saved_name, mode)
+    existing = ActivityZip.objects.filter(activity=a).first()
+    if existing and existing.zip_file:
+        archive = _append_to_archive(a, existing, files)
+        if archive:
+            return archive
 
-    return SimpleNamespace(zip_file=_ZipWrapper())
+    tee = archive_tee(a)
+    failed = []
+    try:
+        for chunk in iter_zip(activity_zip_members(a, files), failed=failed):
+            tee.write(chunk)
+        if failed:
+            raise IncompleteZip(failed)
+    except BaseException:
+        tee.abort()
+        raise
+    return save_archive(a, tee.close(), tee.size, zip_manifest(files))
@@ -0,0 +1,123 @@
+from collections import Counter
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.signals import post_bulk_create
+from tenants.models import SupplierValidationRule
+
+from . import coverage, feed, rules
+from .models import ActivityFile, FileStatus
+from .services import COUNTER_FIELDS, bump_counters, counter_deltas
+
+
+# ---------- validation rules ----------
+
+
+@receiver(post_save, sender=SupplierValidationRule)
+def validation_rule_saved(sender, instance: SupplierValidationRule, raw=False, **kwargs):
+    rules.bump(instance.supplier_id)
+    if not raw:
+        coverage.rebuild_rule(instance)
+
+
+@receiver(post_delete, sender=SupplierValidationRule)
+def validation_rule_deleted(sender, instance: SupplierValidationRule, **kwargs):
+    rules.bump(instance.supplier_id)  # coverage rows cascade
+
+
+@receiver(post_bulk_create, sender=SupplierValidationRule)
+def validation_rules_bulk_created(sender, instances, **kwargs):
+    for supplier_id in {r.supplier_id for r in instances}:
+        rules.bump(supplier_id)
+    for rule in instances:
+        coverage.rebuild_rule(rule)
+
+
+# ---------- rule coverage ----------
+
+
+@receiver(post_save, sender=ActivityFile)
+def activity_file_coverage_saved(sender, instance: ActivityFile, created, raw=False, **kwargs):
+    if raw:
+        return
+    now_ok = instance.status == FileStatus.VALID_OK
+    if created:
+        delta = int(now_ok)
+    else:
+        previous = getattr(instance, "_loaded_status", None)
+        if previous is None:
+            return
+        delta = int(now_ok) - int(previous == FileStatus.VALID_OK)
+    if delta:
+        coverage.apply(coverage.deltas_for(instance, delta))
+
+
+@receiver(post_delete, sender=ActivityFile)
+def activity_file_coverage_deleted(sender, instance: ActivityFile, **kwargs):
+    if instance.status == FileStatus.VALID_OK:
+        coverage.apply(coverage.deltas_for(instance, -1))
+
+
+@receiver(post_bulk_create, sender=ActivityFile)
+def activity_file_coverage_bulk_created(sender, instances, **kwargs):
+    deltas = Counter()
+    for af in instances:
+        if af.status == FileStatus.VALID_OK:
+            deltas.update(coverage.deltas_for(af, 1))
+    coverage.apply(deltas)
+
+
+# ---------- file counters ----------
+
+
+@receiver(post_save, sender=ActivityFile)
+def activity_file_counters_saved(sender, instance: ActivityFile, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        deltas = counter_deltas(instance.status, instance.version, 1)
+    else:
+        previous = getattr(instance, "_loaded_status", None)
+        if previous is None or previous == instance.status:
+            return
+        old = counter_deltas(previous, instance.version, -1)
+        new = counter_deltas(instance.status, instance.version, 1)
+        deltas = {k: old[k] + new[k] for k in COUNTER_FIELDS}
+    bump_counters(instance.activity_id, **deltas)
+
+
+@receiver(post_delete, sender=ActivityFile)
+def activity_file_counters_deleted(sender, instance: ActivityFile, **kwargs):
+    bump_counters(instance.activity_id, **counter_deltas(instance.status, instance.version, -1))
+
+
+@receiver(post_bulk_create, sender=ActivityFile)
+def activity_file_counters_bulk_created(sender, instances, **kwargs):
+    per_activity = {}
+    for af in instances:
+        totals = per_activity.setdefault(af.activity_id, Counter())
+        totals.update(counter_deltas(af.status, af.version, 1))
+    for activity_id, deltas in per_activity.items():
+        bump_counters(activity_id, **deltas)
+
+
+# ---------- change feed ----------
+
+
+@receiver(post_save, sender=ActivityFile)
+def activity_file_feed_saved(sender, instance: ActivityFile, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or getattr(instance, "_loaded_status", instance.status) != instance.status:
+        feed.record_on_commit([instance])
+
+
+@receiver(post_delete, sender=ActivityFile)
+def activity_file_feed_deleted(sender, instance: ActivityFile, **kwargs):
+    feed.record_on_commit([instance], status=feed.DELETED)
+
+
+@receiver(post_bulk_create, sender=ActivityFile)
+def activity_file_feed_bulk_created(sender, instances, **kwargs):
+    feed.record_on_commit(instances)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from jobs.services import register
+from notifications.models import Level
+from notifications.services import notify
+
+from .models import Activity
+from .services import zip_activity
+
+try:
+    from auditlog.services import log_event
+except Exception:
+
+    def log_event(*args, **kwargs):  # no-op if audit not wired yet
+        return None
+
+
+FINALIZE = "activities.finalize"
+
+
+@register(FINALIZE)
+def finalize_activity(payload: dict):
+    """Build (or reuse) the archive of an ended activity and notify whoever ended it."""
+    a = Activity.objects.select_related("supplier", "ended_by").get(pk=payload["activity_id"])
+    archive = zip_activity(a)
+
+    counters = a.file_counters
+    log_event(
+        actor=a.ended_by,
+        verb="archived",
+        action="activity.archive",
+        target=a,
+        evaluator_id=a.evaluator_id,
+        supplier_id=a.supplier_id,
+        metadata={
+            "zip": archive.zip_file.name if archive else None,
+            "total": counters["total"],
+            "failed": counters["failed"],
+            "reuploads": counters["reuploads"],
+        },
+    )
+    if a.ended_by:
+        notify(
+            a.ended_by,
+            f"Activity completed — {a.supplier.name}",
+            body=f"Files: {counters['total']}, Re-uploads: {counters['reuploads']}",
+            level=Level.INFO,
+            link_url=f"/activities/{a.id}/",
+            email=True,
+        )
@@ -1,3 +1,882 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import tempfile
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from botocore.stub import ANY, Stubber
+from django.core.exceptions import SuspiciousOperation
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from storages.backends.s3 import S3Storage
+
+from accounts.models import Roles, User
+from core.signals import bulk_create
+from core.zipstream import IncompleteZip, StorageTee
+from filestore.models import StagedUpload, StoredBlob
+from tenants.models import Supplier, SupplierValidationRule as Rule
+from tenants.testing import TenantFixture, make_evaluator, make_supplier, supplier_user
+
+from . import coverage, direct_upload, feed, ingest, rules, services, views
+from .models import (
+    Activity,
+    ActivityFile,
+    ActivityFileEvent,
+    ActivityRuleCoverage,
+    ActivityStatus,
+    ActivityZip,
+    FileStatus,
+)
+
+LOCAL_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    "blobs": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+}
+
+
+def s3_storage():
+    return S3Storage(
+        bucket_name="lfras-test",
+        access_key="test",
+        secret_key="test",
+        region_name="us-east-1",
+        file_overwrite=True,  # no exists() HEAD in get_available_name
+    )
+
+
+@mock.patch.object(StorageTee, "PART_SIZE", 4)
+class StorageTeeS3Tests(SimpleTestCase):
+    def setUp(self):
+        self.storage = s3_storage()
+        self.stub = Stubber(self.storage.connection.meta.client)
+        self.stub.activate()
+        self.addCleanup(self.stub.deactivate)
+
+    def key(self, **params):
+        return {"Bucket": "lfras-test", "Key": "zips/a.zip", **params}
+
+    def expect_part(self, n, body):
+        self.stub.add_response(
+            "upload_part",
+            {"ETag": f'"e{n}"'},
+            self.key(UploadId="U1", PartNumber=n, Body=body),
+        )
+
+    def test_small_copy_is_one_put(self):
+        self.stub.add_response("put_object", {}, self.key(Body=b"abc", ContentType="application/zip"))
+        tee = StorageTee("zips/a.zip", storage=self.storage)
+        tee.write(b"abc")
+        self.assertEqual(tee.close(), "zips/a.zip")
+        self.assertEqual(tee.size, 3)
+        self.stub.assert_no_pending_responses()
+
+    def test_multipart_upload(self):
+        self.stub.add_response(
+            "create_multipart_upload", {"UploadId": "U1"}, self.key(ContentType="application/zip")
+        )
+        self.expect_part(1, b"abcde")
+        self.expect_part(2, b"f")
+        self.stub.add_response(
+            "complete_multipart_upload",
+            {},
+            self.key(
+                UploadId="U1",
+                MultipartUpload={"Parts": [{"PartNumber": 1, "ETag": '"e1"'}, {"PartNumber": 2, "ETag": '"e2"'}]},
+            ),
+        )
+        tee = StorageTee("zips/a.zip", storage=self.storage)
+        tee.write(b"abc")
+        tee.write(b"de")
+        tee.write(b"f")
+        tee.close()
+        self.stub.assert_no_pending_responses()
+
+    def test_abort_uses_own_upload_id(self):
+        self.stub.add_response(
+            "create_multipart_upload", {"UploadId": "U1"}, self.key(ContentType="application/zip")
+        )
+        self.expect_part(1, b"abcd")
+        self.stub.add_response("abort_multipart_upload", {}, self.key(UploadId="U1"))
+        tee = StorageTee("zips/a.zip", storage=self.storage)
+        tee.write(b"abcd")
+        tee.write(b"e")
+        tee.abort()
+        self.stub.assert_no_pending_responses()
+        self.assertIsNone(tee.upload_id)
+
+    def test_abort_before_first_part_touches_nothing(self):
+        tee = StorageTee("zips/a.zip", storage=self.storage)
+        tee.write(b"ab")
+        tee.abort()  # the stubber raises on any unexpected call
+        self.stub.assert_no_pending_responses()
+
+    def test_failed_abort_is_logged(self):
+        self.stub.add_response("create_multipart_upload", {"UploadId": "U1"}, self.key(ContentType=ANY))
+        self.expect_part(1, b"abcd")
+        self.stub.add_client_error("abort_multipart_upload", "NoSuchUpload")
+        tee = StorageTee("zips/a.zip", storage=self.storage)
+        tee.write(b"abcd")
+        with self.assertLogs("core.zipstream", "WARNING"):
+            tee.abort()
+
+
+@override_settings(STORAGES=LOCAL_STORAGES, MEDIA_ROOT=tempfile.mkdtemp(prefix="lfras-test-media-"))
+class ZipActivityTests(TenantFixture, TestCase):
+    def setUp(self):
+        self.activity = Activity.objects.create(evaluator=self.ev, supplier=self.sup)
+
+    def add(self, name, data, **kwargs):
+        return ActivityFile.objects.create(
+            activity=self.activity,
+            original_name=name,
+            file=ContentFile(data, name=name),
+            file_size=len(data),
+            **kwargs,
+        )
+
+    def entries(self, archive):
+        with archive.zip_file.open("rb") as fh:
+            with zipfile.ZipFile(io.BytesIO(fh.read())) as zf:
+                return {n: zf.read(n) for n in zf.namelist()}
+
+    def test_builds_archive_of_all_files(self):
+        self.add("a.txt", b"alpha")
+        self.add("a.txt", b"alpha two", version=2)
+        archive = services.zip_activity(self.activity)
+        self.assertEqual(self.entries(archive), {"a.txt": b"alpha", "a_v2.txt": b"alpha two"})
+        self.assertEqual(archive.file_size, archive.zip_file.size)
+        self.assertEqual(len(archive.manifest), 2)
+
+    def test_unchanged_files_reuse_the_stored_archive(self):
+        self.add("a.txt", b"alpha")
+        first = services.zip_activity(self.activity)
+        with mock.patch.object(services, "iter_zip") as iter_zip, \
+                mock.patch.object(services, "append_zip") as append:
+            again = services.zip_activity(self.activity)
+        iter_zip.assert_not_called()
+        append.assert_not_called()
+        self.assertEqual(again.zip_file.name, first.zip_file.name)
+
+    def test_added_files_are_appended(self):
+        self.add("a.txt", b"alpha")
+        first = services.zip_activity(self.activity)
+        old_name = first.zip_file.name
+        self.add("b.txt", b"beta")
+
+        with mock.patch.object(services, "iter_zip") as iter_zip:
+            archive = services.zip_activity(self.activity)
+        iter_zip.assert_not_called()
+        self.assertEqual(self.entries(archive), {"a.txt": b"alpha", "b.txt": b"beta"})
+        self.assertNotEqual(archive.zip_file.name, old_name)
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertEqual(ActivityZip.objects.filter(activity=self.activity).count(), 1)
+        manifest = services.zip_manifest(services.archived_files(self.activity))
+        self.assertEqual(archive.fingerprint, services.zip_fingerprint(manifest))
+
+    def test_removed_file_forces_a_rebuild(self):
+        a = self.add("a.txt", b"alpha")
+        self.add("b.txt", b"beta")
+        services.zip_activity(self.activity)
+        a.delete()
+
+        with mock.patch.object(services, "append_zip") as append:
+            archive = services.zip_activity(self.activity)
+        append.assert_not_called()
+        self.assertEqual(self.entries(archive), {"b.txt": b"beta"})
+
+    def test_nothing_to_archive(self):
+        self.assertIsNone(services.zip_activity(self.activity, create_if_missing=False))
+
+    def test_unreadable_file_keeps_no_archive(self):
+        self.add("a.txt", b"alpha")
+        gone = self.add("b.txt", b"beta")
+        default_storage.delete(gone.file.name)
+
+        with self.assertLogs("core.zipstream", "WARNING"), self.assertRaises(IncompleteZip) as ctx:
+            services.zip_activity(self.activity)
+        self.assertEqual(ctx.exception.failed, ["b.txt"])
+        self.assertFalse(ActivityZip.objects.filter(activity=self.activity).exists())
+
+    def test_unreadable_new_file_is_not_appended(self):
+        self.add("a.txt", b"alpha")
+        first = services.zip_activity(self.activity)
+        gone = self.add("b.txt", b"beta")
+        default_storage.delete(gone.file.name)
+
+        with self.assertLogs("core.zipstream", "WARNING"), self.assertRaises(IncompleteZip):
+            services.zip_activity(self.activity)
+        archive = ActivityZip.objects.get(activity=self.activity)
+        self.assertEqual((archive.zip_file.name, archive.fingerprint), (first.zip_file.name, first.fingerprint))
+
+    def download(self):
+        lad = User.objects.create_user("lad@lucid.test", "pw", role=Roles.LAD)
+        self.client.force_login(lad)
+        resp = self.client.get(reverse("activities:zip", args=[self.activity.pk]))
+        self.assertEqual(resp.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content))) as zf:
+            return {n: zf.read(n) for n in zf.namelist()}
+
+    def test_streamed_download_keeps_a_copy(self):
+        self.add("a.txt", b"alpha")
+        self.assertEqual(self.download(), {"a.txt": b"alpha"})
+        self.assertEqual(self.entries(ActivityZip.objects.get(activity=self.activity)), {"a.txt": b"alpha"})
+
+    def test_streamed_download_keeps_no_incomplete_copy(self):
+        self.add("a.txt", b"alpha")
+        gone = self.add("b.txt", b"beta")
+        default_storage.delete(gone.file.name)
+
+        with self.assertLogs("core.zipstream", "WARNING"):
+            self.assertEqual(self.download(), {"a.txt": b"alpha"})
+        self.assertFalse(ActivityZip.objects.filter(activity=self.activity).exists())
+
+
+@override_settings(STORAGES=LOCAL_STORAGES, MEDIA_ROOT=tempfile.mkdtemp(prefix="lfras-test-media-"))
+class DirectUploadTests(TenantFixture, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = supplier_user(cls.sup)
+        cls.activity = Activity.objects.create(evaluator=cls.ev, supplier=cls.sup, started_by=cls.user)
+
+    def setUp(self):
+        storage = s3_storage()
+        patcher = mock.patch.object(direct_upload, "default_storage", storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.stub = Stubber(storage.connection.meta.client)
+        self.stub.activate()
+        self.addCleanup(self.stub.deactivate)
+
+    def start(self, size=10):
+        self.stub.add_response(
+            "create_multipart_upload", {"UploadId": "U1"}, {"Bucket": "lfras-test", "Key": ANY}
+        )
+        data = direct_upload.initiate(self.activity, self.user, "report.pdf", size)
+        return direct_upload.read_token(data["token"], activity=self.activity, user=self.user)
+
+    def key(self, state, **params):
+        return {"Bucket": "lfras-test", "Key": state["name"], **params}
+
+    def expect_parts(self, state, parts):
+        self.stub.add_response(
+            "list_parts",
+            {"Parts": [{"PartNumber": n, "ETag": f'"e{n}"'} for n in parts], "IsTruncated": False},
+            self.key(state, UploadId="U1", PartNumberMarker=0),
+        )
+
+    def complete(self, state):
+        return direct_upload.complete(state, activity=self.activity, user=self.user, validate=lambda af: (True, ""))
+
+    def test_initiate_stages_the_key_and_signs_the_state(self):
+        self.stub.add_response(
+            "create_multipart_upload", {"UploadId": "U1"}, {"Bucket": "lfras-test", "Key": ANY}
+        )
+        data = direct_upload.initiate(self.activity, self.user, "report.pdf", 20 * 1024 * 1024)
+        self.assertEqual(data["part_size"], direct_upload.PART_SIZE)
+        self.assertEqual(data["part_count"], 3)
+        state = direct_upload.read_token(data["token"], activity=self.activity, user=self.user)
+        self.assertEqual(state["upload_id"], "U1")
+        self.assertNotIn("version", state)  # assigned at complete
+        self.assertTrue(StagedUpload.objects.filter(name=state["name"]).exists())
+
+    def test_initiate_rejects_bad_sizes(self):
+        for size in (0, direct_upload.MAX_BYTES + 1):
+            with self.subTest(size=size), self.assertRaises(direct_upload.DirectUploadError):
+                direct_upload.initiate(self.activity, self.user, "report.pdf", size)
+
+    def test_token_is_bound_to_user_and_activity(self):
+        self.stub.add_response(
+            "create_multipart_upload", {"UploadId": "U1"}, {"Bucket": "lfras-test", "Key": ANY}
+        )
+        token = direct_upload.initiate(self.activity, self.user, "report.pdf", 10)["token"]
+        other = Activity.objects.create(evaluator=self.ev, supplier=self.sup)
+        with self.assertRaises(direct_upload.DirectUploadError):
+            direct_upload.read_token(token, activity=other, user=self.user)
+        with self.assertRaises(direct_upload.DirectUploadError):
+            direct_upload.read_token(token + "x", activity=self.activity, user=self.user)
+
+    def test_part_urls(self):
+        state = self.start()
+        urls = direct_upload.part_urls(state, [1])
+        self.assertIn("uploadId=U1", urls[1])
+        self.assertIn("partNumber=1", urls[1])
+        with self.assertRaises(direct_upload.DirectUploadError):
+            direct_upload.part_urls(state, [2])
+
+    def test_complete_creates_the_file_row(self):
+        state = self.start(size=10)
+        self.expect_parts(state, [1])
+        self.stub.add_response(
+            "complete_multipart_upload",
+            {},
+            self.key(state, UploadId="U1", MultipartUpload={"Parts": [{"PartNumber": 1, "ETag": '"e1"'}]}),
+        )
+        self.stub.add_response("head_object", {"ContentLength": 10}, self.key(state))
+
+        af = self.complete(state)
+        self.stub.assert_no_pending_responses()
+        self.assertEqual((af.file.name, af.file_size, af.status), (state["name"], 10, FileStatus.VALID_OK))
+        self.assertFalse(StagedUpload.objects.filter(name=state["name"]).exists())
+
+    def finish(self, state):
+        self.expect_parts(state, [1])
+        self.stub.add_response("complete_multipart_upload", {}, self.key(state, UploadId="U1", MultipartUpload=ANY))
+        self.stub.add_response("head_object", {"ContentLength": 10}, self.key(state))
+        return self.complete(state)
+
+    def test_overlapping_uploads_of_one_name_get_distinct_versions(self):
+        first, second = self.start(), self.start()
+        with CaptureQueriesContext(connection) as ctx:
+            a = self.finish(second)
+        b = self.finish(first)
+
+        self.assertEqual((a.version, a.reupload_of_id), (1, None))
+        self.assertEqual((b.version, b.reupload_of_id), (2, a.pk))
+        if connection.features.has_select_for_update:
+            self.assertTrue(any("FOR UPDATE" in q["sql"] for q in ctx.captured_queries))
+
+    def test_keys_stay_under_the_storage_location(self):
+        storage = s3_storage()
+        storage.location = "media"
+        self.assertEqual(direct_upload._key(storage, "a/../b/c.pdf"), "media/b/c.pdf")
+        with self.assertRaises(SuspiciousOperation):
+            direct_upload._key(storage, "../../etc/passwd")
+
+    def test_size_mismatch_deletes_the_object(self):
+        state = self.start(size=10)
+        self.expect_parts(state, [1])
+        self.stub.add_response("complete_multipart_upload", {}, self.key(state, UploadId="U1", MultipartUpload=ANY))
+        self.stub.add_response("head_object", {"ContentLength": 11}, self.key(state))
+        self.stub.add_response("delete_object", {}, self.key(state))
+
+        with self.assertRaises(direct_upload.DirectUploadError):
+            self.complete(state)
+        self.stub.assert_no_pending_responses()
+        self.assertFalse(ActivityFile.objects.filter(activity=self.activity).exists())
+
+    def test_complete_after_complete_or_abort_is_rejected(self):
+        state = self.start()
+        self.stub.add_client_error("list_parts", "NoSuchUpload", http_status_code=404)
+        with self.assertRaisesMessage(direct_upload.DirectUploadError, "already completed or aborted"):
+            self.complete(state)
+
+    def test_complete_without_parts(self):
+        state = self.start()
+        self.expect_parts(state, [])
+        with self.assertRaisesMessage(direct_upload.DirectUploadError, "No parts"):
+            self.complete(state)
+
+    def test_abort(self):
+        state = self.start()
+        self.stub.add_response("abort_multipart_upload", {}, self.key(state, UploadId="U1"))
+        direct_upload.abort(state)
+        self.stub.add_client_error("abort_multipart_upload", "NoSuchUpload", http_status_code=404)
+        direct_upload.abort(state)  # repeat is harmless
+        self.stub.assert_no_pending_responses()
+        self.assertFalse(StagedUpload.objects.filter(name=state["name"]).exists())
+
+
+def zip_upload(name, entries):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for arcname, data in entries.items():
+            zf.writestr(arcname, data)
+    return SimpleUploadedFile(name, buf.getvalue(), content_type="application/zip")
+
+
+def accept(af):
+    return True, ""
+
+
+@override_settings(STORAGES=LOCAL_STORAGES, MEDIA_ROOT=tempfile.mkdtemp(prefix="lfras-test-media-"))
+class ZipIngestTests(TenantFixture, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = supplier_user(cls.sup)
+
+    def setUp(self):
+        self.activity = Activity.objects.create(evaluator=self.ev, supplier=self.sup, started_by=self.user)
+
+    def upload(self, *files):
+        return ingest.ingest_uploads(self.activity, self.user, files, validate=accept)
+
+    def test_zip_entries_are_stored_one_row_each(self):
+        archive = zip_upload("batch.zip", {"a.txt": b"alpha", "docs/b.txt": b"beta", "docs/": b""})
+        plain = SimpleUploadedFile("c.txt", b"gamma")
+        created, failures = self.upload(archive, plain)
+
+        self.assertEqual(failures, [])
+        stored = {af.original_name: af.file.read() for _, af in created}
+        self.assertEqual(stored, {"a.txt": b"alpha", "b.txt": b"beta", "c.txt": b"gamma"})
+        self.assertEqual([src.zip_entry for src, _ in created], [True, True, False])
+        self.assertTrue(all(af.status == FileStatus.VALID_OK for _, af in created))
+        self.assertFalse(StagedUpload.objects.exists())
+
+    def test_identical_entries_share_one_blob(self):
+        created, _ = self.upload(zip_upload("batch.zip", {"a.txt": b"same", "b.txt": b"same"}))
+        self.assertEqual(len({af.blob_id for _, af in created}), 1)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+
+    def test_archive_over_the_caps_is_refused(self):
+        archive = zip_upload("big.zip", {"a.txt": b"x" * 10, "b.txt": b"y" * 10})
+        with mock.patch.object(ingest, "MAX_ENTRIES", 1):
+            created, failures = self.upload(archive)
+        self.assertEqual((created, failures), ([], ["big.zip: more than 1 files"]))
+
+        archive.seek(0)
+        with mock.patch.object(ingest, "MAX_BYTES", 15):
+            created, failures = self.upload(archive)
+        self.assertEqual(created, [])
+        self.assertIn("larger than", failures[0])
+        self.assertFalse(ActivityFile.objects.filter(activity=self.activity).exists())
+
+    def test_invalid_zip(self):
+        created, failures = self.upload(SimpleUploadedFile("broken.zip", b"not a zip"))
+        self.assertEqual((created, failures), ([], ["broken.zip: invalid zip archive"]))
+
+    def test_unreadable_entry_fails_alone(self):
+        archive = zip_upload("batch.zip", {"a.txt": b"alpha", "b.txt": b"beta"})
+        real_open = zipfile.ZipFile.open
+
+        def open_(zf, name, *args, **kwargs):
+            if getattr(name, "filename", name) == "b.txt":
+                raise zipfile.BadZipFile("bad CRC")
+            return real_open(zf, name, *args, **kwargs)
+
+        with mock.patch.object(zipfile.ZipFile, "open", open_):
+            created, failures = self.upload(archive)
+        statuses = {af.original_name: af.status for _, af in created}
+        self.assertEqual(statuses["a.txt"], FileStatus.VALID_OK)
+        self.assertNotEqual(statuses["b.txt"], FileStatus.VALID_OK)
+        self.assertEqual(len(failures), 1)
+
+
+class RuleMatcherTests(TenantFixture, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Rule.objects.create(
+            supplier=cls.sup, expected_name="Insurance", allowed_extensions="pdf|.png", is_required=True
+        )
+        Rule.objects.create(supplier=cls.sup, expected_name="W9", required_keywords="signed|2026")
+        Rule.objects.create(supplier=cls.sup, expected_name="Sure", is_active=False)
+
+    def setUp(self):
+        rules._memo.clear()
+
+    def activity(self):
+        return Activity.objects.select_related("supplier").get(
+            pk=Activity.objects.create(evaluator=self.ev, supplier=self.sup).pk
+        )
+
+    def test_validate(self):
+        matcher = rules.matcher_for(self.sup.pk)
+        cases = [
+            ("insurance-2026.PDF", True),
+            ("insurance.docx", False),  # extension
+            ("w9 signed 2026.pdf", True),
+            ("w9 2026.pdf", False),  # keyword
+            ("invoice.pdf", False),  # a rule is required and none matched
+        ]
+        for name, ok in cases:
+            with self.subTest(name=name):
+                self.assertEqual(matcher.validate(name)[0], ok)
+
+    def test_matching_finds_every_rule_in_the_name(self):
+        matcher = rules.matcher_for(self.sup.pk)
+        found = [r.expected_name for r in matcher.matching("w9 and insurance.pdf")]
+        self.assertEqual(found, ["Insurance", "W9"])
+        self.assertEqual(matcher.match("w9 and insurance.pdf").expected_name, "Insurance")
+
+    def test_batch_validation_runs_no_rule_queries(self):
+        a = self.activity()
+        rules.for_activity(a)
+        with self.assertNumQueries(0):
+            for i in range(50):
+                rules.for_activity(a).validate(f"insurance {i}.pdf")
+
+    def test_rule_change_bumps_the_supplier_version(self):
+        seen = {rules.version(self.sup.pk)}
+        rule = Rule.objects.get(expected_name="Sure")
+        rule.is_active = True
+        rule.save()
+        seen.add(rules.version(self.sup.pk))
+        rule.delete()
+        seen.add(rules.version(self.sup.pk))
+        self.assertEqual(len(seen), 3)
+
+    def test_rolled_back_stamp_is_not_reused(self):
+        matcher = rules.matcher_for(self.sup.pk)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Rule.objects.filter(expected_name="Insurance").update(allowed_extensions="docx")
+            rules.bump(self.sup.pk)
+            rules.matcher_for(self.sup.pk)  # memoized at the doomed stamp
+            raise RuntimeError
+        rules.bump(self.sup.pk)
+        self.assertIsNot(rules.matcher_for(self.sup.pk), matcher)
+        self.assertFalse(rules.matcher_for(self.sup.pk).validate("insurance.docx")[0])
+
+    def test_supplier_save_keeps_the_current_stamp(self):
+        stale = Supplier.objects.get(pk=self.sup.pk)
+        rules.bump(self.sup.pk)
+        current = rules.version(self.sup.pk)
+        stale.notes = "edited in a form"
+        stale.save()
+        self.assertEqual(rules.version(self.sup.pk), current)
+
+    def test_change_from_another_process_is_seen(self):
+        self.assertFalse(rules.matcher_for(self.sup.pk).validate("insurance.docx")[0])
+        # what another process's signal handler writes: the rule and the stamp,
+        # with nothing of this process's memo touched
+        Rule.objects.filter(expected_name="Insurance").update(allowed_extensions="docx")
+        rules.bump(self.sup.pk)
+        self.assertTrue(rules.matcher_for(self.sup.pk).validate("insurance.docx")[0])
+        self.assertTrue(rules.for_activity(self.activity()).validate("insurance.docx")[0])
+
+
+class RuleCoverageTests(TenantFixture, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.insurance = Rule.objects.create(supplier=cls.sup, expected_name="Insurance", is_required=True)
+        cls.w9 = Rule.objects.create(supplier=cls.sup, expected_name="W9", is_required=True)
+
+    def setUp(self):
+        self.activity = Activity.objects.create(evaluator=self.ev, supplier=self.sup)
+
+    def add(self, name, status=FileStatus.VALID_OK):
+        return ActivityFile.objects.create(activity=self.activity, original_name=name, file="f.pdf", status=status)
+
+    def counts(self):
+        return dict(
+            ActivityRuleCoverage.objects.filter(activity=self.activity, valid_count__gt=0).values_list(
+                "rule__expected_name", "valid_count"
+            )
+        )
+
+    def test_valid_files_are_counted_per_rule(self):
+        self.add("insurance.pdf")
+        self.add("insurance and w9.pdf")
+        self.add("w9.pdf", status=FileStatus.VALID_FAILED)
+        self.assertEqual(self.counts(), {"Insurance": 2, "W9": 1})
+
+    def test_status_change_and_delete(self):
+        af = self.add("w9.pdf", status=FileStatus.VALID_FAILED)
+        self.assertEqual(self.counts(), {})
+
+        af = ActivityFile.objects.get(pk=af.pk)
+        af.status = FileStatus.VALID_OK
+        af.save()
+        self.assertEqual(self.counts(), {"W9": 1})
+
+        af.delete()
+        self.assertEqual(self.counts(), {})
+
+    def test_summary_reports_missing_required(self):
+        self.add("insurance.pdf")
+        summary = coverage.summary(Activity.objects.select_related("supplier").get(pk=self.activity.pk))
+        self.assertTrue(summary["any_active_rules"])
+        self.assertEqual(summary["required_missing"], ["W9"])
+        self.assertEqual(summary["matched_counts"], {"insurance": 1, "w9": 0})
+
+    def test_summary_is_one_query(self):
+        self.add("insurance.pdf")
+        a = Activity.objects.select_related("supplier").get(pk=self.activity.pk)
+        coverage.summary(a)
+        with self.assertNumQueries(1):
+            coverage.summary(a)
+
+    def test_rule_change_recomputes_its_rows(self):
+        self.add("insurance-cert.pdf")
+        self.insurance.expected_name = "cert"
+        self.insurance.save()
+        self.assertEqual(self.counts(), {"cert": 1})
+
+        self.insurance.is_active = False
+        self.insurance.save()
+        self.assertEqual(self.counts(), {})
+
+    def test_rebuild_repairs_drift(self):
+        self.add("insurance.pdf")
+        ActivityRuleCoverage.objects.all().update(valid_count=7)
+        coverage.rebuild()
+        self.assertEqual(self.counts(), {"Insurance": 1})
+
+
+class ActivityCounterTests(TenantFixture, TestCase):
+    def setUp(self):
+        self.activity = Activity.objects.create(evaluator=self.ev, supplier=self.sup)
+
+    def add(self, status=FileStatus.VALID_OK, version=1):
+        return ActivityFile.objects.create(
+            activity=self.activity, original_name="f.pdf", file="f.pdf", status=status, version=version
+        )
+
+    def counters(self):
+        self.activity.refresh_from_db()
+        return {f: getattr(self.activity, f) for f in services.COUNTER_FIELDS}
+
+    def assertCounters(self, total, valid, failed, reuploaded):
+        self.assertEqual(
+            self.counters(),
+            {"total_files": total, "valid_files": valid, "failed_files": failed, "reuploaded_files": reuploaded},
+        )
+
+    def test_create_status_change_delete(self):
+        ok = self.add()
+        failed = self.add(status=FileStatus.VALID_FAILED, version=2)
+        self.assertCounters(2, 1, 1, 1)
+
+        failed = ActivityFile.objects.get(pk=failed.pk)
+        failed.status = FileStatus.VALID_OK
+        failed.save()
+        self.assertCounters(2, 2, 0, 1)
+
+        ok.delete()
+        self.assertCounters(1, 1, 0, 1)
+
+    def test_bulk_create_is_counted(self):
+        bulk_create(
+            ActivityFile,
+            [
+                ActivityFile(activity=self.activity, original_name=f"{i}.pdf", file="f.pdf", status=status)
+                for i, status in enumerate([FileStatus.VALID_OK, FileStatus.VALID_OK, FileStatus.VALID_FAILED])
+            ],
+        )
+        self.assertCounters(3, 2, 1, 0)
+
+    def test_counters_never_go_negative(self):
+        services.bump_counters(self.activity.pk, total_files=-5, valid_files=-1)
+        self.assertCounters(0, 0, 0, 0)
+
+    def test_repair_command(self):
+        self.add()
+        self.add(status=FileStatus.VALID_FAILED, version=2)
+        Activity.objects.filter(pk=self.activity.pk).update(total_files=9, valid_files=0)
+        out = io.StringIO()
+        call_command("rebuild_activity_counters", activity=[self.activity.pk], stdout=out)
+        self.assertIn("1 activities", out.getvalue())
+        self.assertCounters(2, 1, 1, 1)
+        self.assertEqual(services.rebuild_counters(), 0)
+
+
+@mock.patch.object(feed, "SETTLE_SECONDS", 0)
+class ChangeFeedTests(TenantFixture, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = make_supplier(cls.ev, "s2")
+        cls.user = supplier_user(cls.sup)
+        cls.outsider = User.objects.create_user(
+            "sus@other.test", "pw", role=Roles.SUS, evaluator=cls.ev, supplier=cls.other
+        )
+        User.objects.filter(pk__in=[cls.user.pk, cls.outsider.pk]).update(must_change_password=False)
+
+    def setUp(self):
+        self.activity = Activity.objects.create(evaluator=self.ev, supplier=self.sup, started_by=self.user)
+
+    def add(self, name="f.pdf", status=FileStatus.VALID_OK):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ActivityFile.objects.create(activity=self.activity, original_name=name, file="f.pdf", status=status)
+
+    def test_events_follow_file_changes(self):
+        af = self.add(status=FileStatus.VALID_FAILED)
+        af = ActivityFile.objects.get(pk=af.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            af.failure_reason = "renamed"
+            af.save()  # same status: no event
+            af.status = FileStatus.VALID_OK
+            af.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            af.delete()
+
+        changes = feed.changes_since(self.activity.pk, 0)
+        self.assertEqual(
+            [(c["status"], c["deleted"]) for c in changes],
+            [(FileStatus.VALID_FAILED, False), (FileStatus.VALID_OK, False), (feed.DELETED, True)],
+        )
+        self.assertEqual(feed.changes_since(self.activity.pk, changes[1]["cursor"]), changes[2:])
+
+    def test_rolled_back_changes_leave_no_event(self):
+        ActivityFile.objects.create(activity=self.activity, original_name="f.pdf", file="f.pdf")
+        self.assertFalse(ActivityFileEvent.objects.exists())
+
+    def test_unsettled_events_wait(self):
+        self.add()
+        with mock.patch.object(feed, "SETTLE_SECONDS", 60):
+            self.assertEqual(feed.changes_since(self.activity.pk, 0), [])
+
+    def test_json_fallback(self):
+        self.client.force_login(self.user)
+        url = f"/activities/{self.activity.pk}/changes.json"
+        first = self.add("a.pdf")
+
+        body = self.client.get(url).json()
+        self.assertEqual(body["changes"], [])
+        cursor = body["cursor"]
+        self.add("b.pdf")
+
+        body = self.client.get(url, {"cursor": cursor}).json()
+        self.assertEqual([c["name"] for c in body["changes"]], ["b.pdf"])
+        self.assertGreater(body["cursor"], cursor)
+        self.assertEqual(self.client.get(url, {"cursor": 0}).json()["changes"][0]["id"], first.pk)
+
+    def test_json_fallback_is_scoped(self):
+        self.client.force_login(self.outsider)
+        response = self.client.get(f"/activities/{self.activity.pk}/changes.json", {"cursor": 0})
+        self.assertEqual(response.status_code, 404)
+
+    @mock.patch.object(views, "FEED_POLL_SECONDS", 0.01)
+    async def test_sse_stream(self):
+        await self.async_client.aforce_login(self.user)
+        af = await sync_to_async(self.add)("a.pdf")
+        response = await self.async_client.get(f"/activities/{self.activity.pk}/events/", {"cursor": 0})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 3000\nid: 0\n\n")
+        event = (await anext(stream)).decode()
+        await stream.aclose()
+        head, _, data = event.partition("data: ")
+        change = json.loads(data)
+        self.assertEqual(head, f"id: {change['cursor']}\nevent: file\n")
+        self.assertEqual((change["id"], change["status"]), (af.pk, FileStatus.VALID_OK))
+
+    async def test_sse_requires_access(self):
+        response = await self.async_client.get(f"/activities/{self.activity.pk}/events/")
+        self.assertEqual(response.status_code, 403)
+        await self.async_client.aforce_login(self.outsider)
+        response = await self.async_client.get(f"/activities/{self.activity.pk}/events/")
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(STORAGES=LOCAL_STORAGES, MEDIA_ROOT=tempfile.mkdtemp(prefix="lfras-test-media-"))
+class BatchIngestTests(TenantFixture, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Rule.objects.create(supplier=cls.sup, expected_name="report", allowed_extensions="pdf")
+        cls.user = supplier_user(cls.sup)
+
+    def setUp(self):
+        self.activity = Activity.objects.create(evaluator=self.ev, supplier=self.sup, started_by=self.user)
+
+    def ingest(self, *names, reupload_of=None):
+        sources = [
+            ingest.upload_source(SimpleUploadedFile(name, name.encode()), reupload_of=reupload_of) for name in names
+        ]
+        return ingest.ingest(self.activity, self.user, sources, validate=views._validate_activity_file)
+
+    def test_versions_continue_from_stored_files(self):
+        (v1,) = self.ingest("report.pdf")
+        v2, other, v3 = self.ingest("report.pdf", "other.pdf", "report.pdf")
+        self.assertEqual([v1.version, v2.version, other.version, v3.version], [1, 2, 1, 3])
+        self.assertEqual(ActivityFile.objects.get(pk=v2.pk).reupload_of_id, v1.pk)
+        self.assertEqual(ActivityFile.objects.get(pk=v3.pk).reupload_of_id, v2.pk)
+        self.assertIsNone(ActivityFile.objects.get(pk=other.pk).reupload_of_id)
+
+    def test_explicit_reupload(self):
+        (first,) = self.ingest("report.pdf")
+        (again,) = self.ingest("report-fixed.pdf", reupload_of=first)
+        self.assertEqual((again.version, again.reupload_of_id), (2, first.pk))
+
+    def test_rows_are_inserted_validated(self):
+        ok, bad = self.ingest("report.pdf", "report.docx")
+        self.assertEqual(ActivityFile.objects.get(pk=ok.pk).status, FileStatus.VALID_OK)
+        bad = ActivityFile.objects.get(pk=bad.pk)
+        self.assertEqual(bad.status, FileStatus.VALID_FAILED)
+        self.assertIn("Extension", bad.failure_reason)
+        self.assertEqual(bad.file.read(), b"report.docx")
+
+    def test_query_count_does_not_grow_with_files(self):
+        def queries(n):
+            names = [f"report {n}-{i}.pdf" for i in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                rows = self.ingest(*names)
+            self.assertEqual(len(rows), n)
+            return len(ctx.captured_queries)
+
+        self.activity = Activity.objects.select_related("supplier").get(pk=self.activity.pk)
+        queries(1)  # compile the rules
+        self.assertEqual(queries(2), queries(25))
+
+
+@override_settings(STORAGES=LOCAL_STORAGES, MEDIA_ROOT=tempfile.mkdtemp(prefix="lfras-test-media-"))
+class UploadManifestTests(TestCase):
+    DATA = b"insurance certificate"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ev = make_evaluator()
+        cls.users = {}
+        for slug in ("s1", "s2"):
+            cls.users[slug] = supplier_user(make_supplier(cls.ev, slug), f"sus@{slug}.test")
+        User.objects.filter(role=Roles.SUS).update(must_change_password=False)
+
+    def activity(self, slug):
+        user = self.users[slug]
+        return Activity.objects.create(
+            evaluator=self.ev, supplier_id=user.supplier_id, started_by=user, status=ActivityStatus.IN_PROGRESS
+        )
+
+    def upload_bytes(self, slug):
+        a = self.activity(slug)
+        (af,) = ingest.ingest(
+            a, self.users[slug], [ingest.upload_source(SimpleUploadedFile("cert.pdf", self.DATA))], validate=accept
+        )
+        return af
+
+    def manifest(self, slug, attach=True):
+        a = self.activity(slug)
+        self.client.force_login(self.users[slug])
+        body = {
+            "files": [{"name": "cert.pdf", "sha256": hashlib.sha256(self.DATA).hexdigest(), "size": len(self.DATA)}],
+            "attach": attach,
+        }
+        response = self.client.post(
+            f"/activities/{a.pk}/upload/manifest/", json.dumps(body), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return a, response.json()
+
+    def test_own_content_is_attached_without_bytes(self):
+        af = self.upload_bytes("s1")
+        a, body = self.manifest("s1")
+        self.assertEqual((len(body["known"]), body["missing"]), (1, []))
+        attached = ActivityFile.objects.get(activity=a)
+        self.assertEqual(attached.blob_id, af.blob_id)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+
+    def test_other_suppliers_content_is_not_revealed_or_attached(self):
+        self.upload_bytes("s1")
+        a, body = self.manifest("s2")
+        self.assertEqual(body["known"], [])
+        self.assertEqual(body["missing"], [hashlib.sha256(self.DATA).hexdigest()])
+        self.assertEqual(body["files"], [])
+        self.assertFalse(ActivityFile.objects.filter(activity=a).exists())
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+
+    def test_byteless_source_needs_held_content(self):
+        self.upload_bytes("s1")
+        a = self.activity("s2")
+        sha = hashlib.sha256(self.DATA).hexdigest()
+        source = ingest.Source(original_name="cert.pdf", size=len(self.DATA), open=None, sha256=sha)
+        (af,) = ingest.ingest(a, self.users["s2"], [source], validate=accept)
+        self.assertEqual(af.status, FileStatus.UPLOAD_FAILED)
+        self.assertIsNone(af.blob_id)
+
+    def test_uploaded_bytes_still_deduplicate_across_suppliers(self):
+        first = self.upload_bytes("s1")
+        second = self.upload_bytes("s2")
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
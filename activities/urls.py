@@ -8,11 +8,18 @@ urlpatterns = [
     path("start/", views.start_activity, name="start"),
     path("<int:pk>/", views.activity_detail, name="detail"),
     path("<int:pk>/upload/", views.upload_file, name="upload"),
+    path("<int:pk>/upload/direct/", views.direct_upload_initiate, name="direct_upload_initiate"),
+    path("<int:pk>/upload/direct/parts/", views.direct_upload_parts, name="direct_upload_parts"),
+    path("<int:pk>/upload/direct/complete/", views.direct_upload_complete, name="direct_upload_complete"),
+    path("<int:pk>/upload/direct/abort/", views.direct_upload_abort, name="direct_upload_abort"),
+    path("<int:pk>/upload/manifest/", views.upload_manifest, name="upload_manifest"),
     path("reupload/<int:file_id>/", views.reupload_file, name="reupload"),
     path("<int:pk>/end/", views.end_activity, name="end"),
     path("<int:pk>/zip/", views.download_zip, name="zip"),
     path("file/<int:file_id>/status/", views.file_status, name="file_status"),
     path("file/<int:file_id>/download/", views.download_file, name="download_file"),
     path("<int:pk>/status.json", views.activity_status_json, name="status_json"),
+    path("<int:pk>/changes.json", views.file_changes, name="file_changes"),
+    path("<int:pk>/events/", views.file_events, name="file_events"),
     path("<int:pk>/file/<int:file_id>/delete/", views.delete_file, name="delete_file"),
 ]
@@ -4,22 +4,38 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.db import transaction
 from django.db.models import Q, Count
-from django.http import FileResponse, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.utils import timezone
 from django.views.decorators.http import require_POST
 from django.http import FileResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404
-import io, zipfile
-from django.core.files.base import ContentFile
+import asyncio
+import json
+import re
+
+from asgiref.sync import sync_to_async
 
 from accounts.models import Roles, User
 from .forms import ActivityFileUploadForm, ActivityStartForm
 from .models import Activity, ActivityFile, ActivityStatus, FileStatus
+from core.zipstream import IncompleteZip, zip_response
+from . import coverage, direct_upload, feed, rules
+from .ingest import MAX_ENTRIES as MAX_MANIFEST_FILES, Source, ingest, ingest_uploads, upload_source
+from filestore.services import lookup as blob_lookup
+from jobs.services import enqueue
 from .services import (
+    activity_zip_filename,
+    activity_zip_members,
+    archive_tee,
+    archived_files,
+    current_archive,
+    save_archive,
     visible_activities_qs,
     zip_activity,
+    zip_manifest,
 )
+from .tasks import FINALIZE
 from django.http import JsonResponse, HttpResponseForbidden
 from django.views.decorators.http import require_POST
 from django.utils import timezone
@@ -37,12 +53,15 @@ def _can_manage_files(user, activity: Activity) -> bool:
 
 # If your audit + notifications helpers live elsewhere, adjust imports:
 try:
-    from auditlog.services import log_event
+    from auditlog.services import log_event, log_events
 except Exception:
 
     def log_event(*args, **kwargs):  # no-op if audit not wired yet
         return None
 
+    def log_events(*args, **kwargs):
+        return []
+
 
 try:
     from notifications.services import notify, Level
@@ -149,15 +168,12 @@ def activity_detail(request, pk: int):
 
     files = a.files.select_related("uploaded_by").order_by("-uploaded_at")
 
-    # Counters for files
-    failed_statuses = [FileStatus.VALID_FAILED]
-    if hasattr(FileStatus, "UPLOAD_FAILED"):
-        failed_statuses.append(FileStatus.UPLOAD_FAILED)
-
-    total_files = a.files.count()
-    valid_count = a.files.filter(status=FileStatus.VALID_OK).count()
-    failed_count = a.files.filter(status__in=failed_statuses).count()
-    reupload_count = a.files.exclude(reupload_of=None).count()
+    # Counters for files (maintained on the activity row)
+    counters = a.file_counters
+    total_files = counters["total"]
+    valid_count = counters["valid"]
+    failed_count = counters["failed"]
+    reupload_count = counters["reuploads"]
 
     # Supplier validation rule coverage (summary)
     coverage = _rule_coverage(a)
@@ -169,7 +185,7 @@ def activity_detail(request, pk: int):
     )
     can_end = (
         a.status == ActivityStatus.IN_PROGRESS
-        and not a.files.filter(status__in=failed_statuses).exists()
+        and not failed_count
         and (not any_active_rules or not required_missing)
     )
 
@@ -185,12 +201,8 @@ def activity_detail(request, pk: int):
             "valid_count": valid_count,
             "failed_count": failed_count,
             "reupload_count": reupload_count,
-            "counters": {
-                "total": total_files,
-                "valid": valid_count,
-                "failed": failed_count,
-                "reuploads": reupload_count,
-            },
+            "counters": counters,
+            "feed_cursor": feed.latest_cursor(a.id),
         },
     )
 
@@ -200,7 +212,6 @@ def activity_detail(request, pk: int):
 
 @login_required
 @require_POST
-@transaction.atomic
 def upload_file(request, pk: int):
     a = get_object_or_404(visible_activities_qs(request.user), pk=pk)
     if not _can_upload(request.user, a):
@@ -220,58 +231,30 @@ def upload_file(request, pk: int):
         messages.error(request, "No files received.")
         return redirect("activities:detail", pk=a.id)
 
-    total = 0
-    ok_count = 0
-    failures = []
-
-    for f in files_list:
-        name = getattr(f, "name", None) or "upload.bin"
-        # If a zip, expand and process entries
-        if name.lower().endswith(".zip"):
-            try:
-                zbuf = io.BytesIO(f.read())
-                with zipfile.ZipFile(zbuf) as z:
-                    for info in z.infolist():
-                        if info.is_dir():
-                            continue
-                        inner_bytes = z.read(info.filename)
-                        inner_name = info.filename.split("/")[-1]
-                        cf = ContentFile(inner_bytes, name=inner_name)
-                        af, ok, reason = _handle_single_file_upload(a, request.user, cf, inner_name)
-                        total += 1
-                        if ok:
-                            ok_count += 1
-                            log_event(
-                                request=request,
-                                actor=request.user,
-                                verb="uploaded",
-                                action="activity.file.upload",
-                                target=af,
-                                evaluator_id=a.evaluator_id,
-                                supplier_id=a.supplier_id,
-                                metadata={"original_name": inner_name, "version": af.version, "ok": True, "zip_entry": True},
-                            )
-                        else:
-                            failures.append(f"{inner_name}: {reason}")
-            except zipfile.BadZipFile:
-                failures.append(f"{name}: invalid zip archive")
-        else:
-            af, ok, reason = _handle_single_file_upload(a, request.user, f, name)
-            total += 1
-            if ok:
-                ok_count += 1
-                log_event(
-                    request=request,
-                    actor=request.user,
-                    verb="uploaded",
-                    action="activity.file.upload",
-                    target=af,
-                    evaluator_id=a.evaluator_id,
-                    supplier_id=a.supplier_id,
-                    metadata={"original_name": name, "version": af.version, "ok": True},
-                )
-            else:
-                failures.append(f"{name}: {reason}")
+    # Storage writes run outside any transaction; only the inserts are atomic.
+    created, failures = ingest_uploads(a, request.user, files_list, validate=_validate_activity_file)
+    uploaded = [(src, af) for src, af in created if af.status == FileStatus.VALID_OK]
+    ok_count = len(uploaded)
+    log_events(
+        [
+            dict(
+                actor=request.user,
+                verb="uploaded",
+                action="activity.file.upload",
+                target=af,
+                evaluator_id=a.evaluator_id,
+                supplier_id=a.supplier_id,
+                metadata={
+                    "original_name": af.original_name,
+                    "version": af.version,
+                    "ok": True,
+                    **({"zip_entry": True} if src.zip_entry else {}),
+                },
+            )
+            for src, af in uploaded
+        ],
+        request=request,
+    )
 
     if ok_count:
         messages.success(request, f"Uploaded {ok_count} file(s) successfully.")
@@ -281,12 +264,199 @@ def upload_file(request, pk: int):
     return redirect("activities:detail", pk=a.id)
 
 
+# ---------- direct upload (presigned multipart) ----------
+
+
+def _json_body(request) -> dict:
+    if request.content_type == "application/json":
+        try:
+            return json.loads(request.body or b"{}")
+        except ValueError:
+            return {}
+    return request.POST.dict()
+
+
+def _upload_target(request, pk: int):
+    """(activity, error response) for the JSON upload endpoints."""
+    a = get_object_or_404(visible_activities_qs(request.user), pk=pk)
+    if not _can_upload(request.user, a):
+        return a, JsonResponse({"ok": False, "error": "Only Supplier users can upload files to this activity."}, status=403)
+    if a.status != ActivityStatus.IN_PROGRESS:
+        return a, JsonResponse({"ok": False, "error": "Activity is not in progress."}, status=409)
+    return a, None
+
+
+@login_required
+@require_POST
+def direct_upload_initiate(request, pk: int):
+    a, error = _upload_target(request, pk)
+    if error:
+        return error
+    body = _json_body(request)
+    try:
+        size = int(body.get("size") or 0)
+        data = direct_upload.initiate(
+            a, request.user, body.get("name", ""), size, body.get("content_type", "")
+        )
+    except (ValueError, direct_upload.DirectUploadError) as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    return JsonResponse({"ok": True, **data})
+
+
+@login_required
+@require_POST
+def direct_upload_parts(request, pk: int):
+    a, error = _upload_target(request, pk)
+    if error:
+        return error
+    body = _json_body(request)
+    parts = body.get("parts") or [1]
+    if not isinstance(parts, list):
+        parts = str(parts).split(",")
+    try:
+        state = direct_upload.read_token(body.get("token"), activity=a, user=request.user)
+        urls = direct_upload.part_urls(state, parts)
+    except (ValueError, direct_upload.DirectUploadError) as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    return JsonResponse({"ok": True, "urls": {str(n): url for n, url in urls.items()}})
+
+
+@login_required
+@require_POST
+def direct_upload_complete(request, pk: int):
+    a, error = _upload_target(request, pk)
+    if error:
+        return error
+    body = _json_body(request)
+    try:
+        state = direct_upload.read_token(body.get("token"), activity=a, user=request.user)
+        af = direct_upload.complete(state, activity=a, user=request.user, validate=_validate_activity_file)
+    except direct_upload.DirectUploadError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+    log_event(
+        request=request,
+        actor=request.user,
+        verb="uploaded",
+        action="activity.file.upload",
+        target=af,
+        evaluator_id=a.evaluator_id,
+        supplier_id=a.supplier_id,
+        metadata={
+            "original_name": af.original_name,
+            "version": af.version,
+            "ok": af.status == FileStatus.VALID_OK,
+            "direct": True,
+        },
+    )
+    return JsonResponse(
+        {
+            "ok": True,
+            "file": {
+                "id": af.id,
+                "status": af.status,
+                "failure_reason": af.failure_reason,
+                "version": af.version,
+                "size": af.file_size,
+            },
+        }
+    )
+
+
+@login_required
+@require_POST
+def direct_upload_abort(request, pk: int):
+    a, error = _upload_target(request, pk)
+    if error:
+        return error
+    body = _json_body(request)
+    try:
+        state = direct_upload.read_token(body.get("token"), activity=a, user=request.user)
+        direct_upload.abort(state)
+    except direct_upload.DirectUploadError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    return JsonResponse({"ok": True})
+
+
+# ---------- upload manifest (content dedup) ----------
+
+SHA256_RE = re.compile(r"[0-9a-f]{64}")
+
+
+@login_required
+@require_POST
+def upload_manifest(request, pk: int):
+    """
+    Which of the client's files the supplier already stores, by SHA-256 and size:
+      {"files": [{"name", "sha256", "size"}, ...], "attach": true|false}
+    With `attach`, the known ones are added to the activity straight away, so
+    the client only sends the bytes of the files listed under `missing`.
+    """
+    a, error = _upload_target(request, pk)
+    if error:
+        return error
+    body = _json_body(request)
+    files = body.get("files")
+    if not isinstance(files, list) or len(files) > MAX_MANIFEST_FILES:
+        return JsonResponse({"ok": False, "error": f"Send 1..{MAX_MANIFEST_FILES} files."}, status=400)
+    try:
+        entries = [
+            (str(f.get("name") or "").strip()[:255], str(f.get("sha256") or "").lower(), int(f.get("size") or 0))
+            for f in files
+        ]
+    except (AttributeError, TypeError, ValueError):
+        return JsonResponse({"ok": False, "error": "Each file needs a name, sha256 and size."}, status=400)
+
+    # Only content this supplier already references counts as known: anything
+    # else must be uploaded, or a digest alone would reveal and grant access
+    # to other suppliers' files.
+    stored = blob_lookup(
+        a.evaluator_id,
+        (sha for _, sha, _ in entries if SHA256_RE.fullmatch(sha)),
+        supplier_id=a.supplier_id,
+    )
+    known = [(n, sha, size) for n, sha, size in entries if n and sha in stored and stored[sha].size == size]
+    known_shas = {sha for _, sha, _ in known}
+    missing = sorted({sha for _, sha, _ in entries if sha not in known_shas})
+
+    attached = []
+    if known and str(body.get("attach", "")).lower() in ("1", "true", "yes"):
+        sources = [Source(original_name=n, size=size, open=None, sha256=sha) for n, sha, size in known]
+        rows = ingest(a, request.user, sources, validate=_validate_activity_file)
+        log_events(
+            [
+                dict(
+                    actor=request.user,
+                    verb="uploaded",
+                    action="activity.file.upload",
+                    target=af,
+                    evaluator_id=a.evaluator_id,
+                    supplier_id=a.supplier_id,
+                    metadata={"original_name": af.original_name, "version": af.version, "ok": True, "deduplicated": True},
+                )
+                for af in rows
+                if af.status == FileStatus.VALID_OK
+            ],
+            request=request,
+        )
+        attached = [
+            {
+                "id": af.id,
+                "name": af.original_name,
+                "status": af.status,
+                "failure_reason": af.failure_reason,
+                "version": af.version,
+            }
+            for af in rows
+        ]
+    return JsonResponse({"ok": True, "known": sorted(known_shas), "missing": missing, "files": attached})
+
+
 # ---------- reupload ----------
 
 
 @login_required
 @require_POST
-@transaction.atomic
 def reupload_file(request, file_id: int):
     prior = get_object_or_404(ActivityFile, pk=file_id)
     a = prior.activity
@@ -305,9 +475,14 @@ def reupload_file(request, file_id: int):
 
     f = form.cleaned_data["file"]
     original_name = prior.original_name
-    # next_version = prior.version + 1  # Now handled by helper
 
-    af, ok, reason = _handle_single_file_upload(a, request.user, f, original_name, base_version_from=prior)
+    (af,) = ingest(
+        a,
+        request.user,
+        [upload_source(f, original_name, reupload_of=prior)],
+        validate=_validate_activity_file,
+    )
+    ok = af.status == FileStatus.VALID_OK
 
     log_event(
         request=request,
@@ -347,6 +522,72 @@ def file_status(request, file_id: int):
     return JsonResponse(data)
 
 
+# ---------- change feed (SSE + JSON fallback) ----------
+
+FEED_POLL_SECONDS = 1.0
+FEED_HEARTBEAT_SECONDS = 15.0
+FEED_MAX_SECONDS = 300.0  # EventSource reconnects with Last-Event-ID
+
+
+def _feed_cursor(request) -> int | None:
+    # Last-Event-ID first: an EventSource reconnect repeats the original ?cursor=
+    raw = request.headers.get("Last-Event-ID") or request.GET.get("cursor")
+    try:
+        return max(int(raw), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+@login_required
+def file_changes(request, pk: int):
+    """File status changes after ?cursor=N, for clients that can't hold a stream open."""
+    a = get_object_or_404(visible_activities_qs(request.user), pk=pk)
+    if not _can_view(request.user, a):
+        return HttpResponseForbidden("Not allowed")
+    cursor = _feed_cursor(request)
+    if cursor is None:
+        return JsonResponse({"ok": True, "cursor": feed.latest_cursor(a.id), "changes": []})
+    changes = feed.changes_since(a.id, cursor)
+    return JsonResponse(
+        {"ok": True, "cursor": changes[-1]["cursor"] if changes else cursor, "changes": changes}
+    )
+
+
+async def file_events(request, pk: int):
+    """Server-sent events: one `file` event per status change, id = cursor."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden("Login required")
+    a = await visible_activities_qs(user).filter(pk=pk).afirst()
+    if a is None or not _can_view(user, a):
+        return HttpResponseForbidden("Not allowed")
+    cursor = _feed_cursor(request)
+    if cursor is None:
+        cursor = await sync_to_async(feed.latest_cursor)(a.id)
+
+    async def stream():
+        nonlocal cursor
+        loop = asyncio.get_running_loop()
+        started = last_sent = loop.time()
+        yield f"retry: 3000\nid: {cursor}\n\n"
+        while loop.time() - started < FEED_MAX_SECONDS:
+            changes = await feed.achanges_since(a.id, cursor)
+            for c in changes:
+                cursor = c["cursor"]
+                yield f"id: {cursor}\nevent: file\ndata: {json.dumps(c)}\n\n"
+            if changes:
+                last_sent = loop.time()
+            elif loop.time() - last_sent >= FEED_HEARTBEAT_SECONDS:
+                last_sent = loop.time()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(FEED_POLL_SECONDS)
+
+    resp = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"  # nginx: don't buffer the stream
+    return resp
+
+
 # ---------- end activity ----------
 
 
@@ -366,7 +607,7 @@ def end_activity(request, pk: int):
         messages.info(request, "Activity already ended.")
         return redirect("activities:detail", pk=a.id)
 
-    if a.files.filter(status=FileStatus.VALID_FAILED).exists():
+    if a.failed_files:
         messages.error(
             request, "Resolve failed files or re‑upload before ending the activity."
         )
@@ -383,7 +624,9 @@ def end_activity(request, pk: int):
     a.ended_at = timezone.now()
     a.save(update_fields=["status", "ended_by", "ended_at"])
 
-    archive = zip_activity(a)  # implement to place zip under .../Files/zipped/
+    counters = a.file_counters
+    # Archive + notification run in a worker once this commits (activities.tasks).
+    enqueue(FINALIZE, {"activity_id": a.id}, key=f"{FINALIZE}:{a.id}")
 
     log_event(
         request=request,
@@ -394,23 +637,13 @@ def end_activity(request, pk: int):
         evaluator_id=a.evaluator_id,
         supplier_id=a.supplier_id,
         metadata={
-            "zip": getattr(archive, "zip_file", None) and archive.zip_file.name,
-            "total": a.files.count(),
-            "failed": a.files.filter(status=FileStatus.VALID_FAILED).count(),
-            "reuploads": a.files.exclude(reupload_of=None).count(),
+            "total": counters["total"],
+            "failed": counters["failed"],
+            "reuploads": counters["reuploads"],
         },
     )
 
-    notify(
-        request.user,
-        f"Activity completed — {a.supplier.name}",
-        body=f"Files: {a.files.count()}, Re-uploads: {a.files.exclude(reupload_of=None).count()}",
-        level=Level.INFO,
-        link_url=f"/activities/{a.id}/",
-        email=True,
-    )
-
-    messages.success(request, "Activity ended and zipped.")
+    messages.success(request, "Activity ended. The archive is being prepared.")
     return redirect("activities:detail", pk=a.id)
 
 
@@ -423,17 +656,28 @@ def download_zip(request, pk: int):
     if not _can_view(request.user, a):
         return HttpResponseForbidden("Not allowed")
 
-    archive = zip_activity(a, create_if_missing=True)
-    if not archive or not getattr(archive, "zip_file", None):
-        messages.error(request, "ZIP not available.")
-        return redirect("activities:detail", pk=a.id)
+    files = archived_files(a)
+    archive = current_archive(a, files)
+    if not archive and getattr(a, "archive", None) is not None:
+        # files were only added since the last build: append instead of rebuilding
+        try:
+            archive = zip_activity(a)
+        except IncompleteZip:
+            archive = None  # stream what can be read; nothing is kept
+    if archive:
+        return FileResponse(
+            archive.zip_file.open("rb"),
+            as_attachment=True,
+            filename=activity_zip_filename(a),
+        )
 
-    response = FileResponse(
-        archive.zip_file.open("rb"),
-        as_attachment=True,
-        filename=archive.zip_file.name.split("/")[-1],
+    # First build: stream to the client and keep a copy for the next download.
+    return zip_response(
+        activity_zip_members(a, files),
+        activity_zip_filename(a),
+        tee=archive_tee(a),
+        on_complete=lambda name, size: save_archive(a, name, size, zip_manifest(files)),
     )
-    return response
 
 
 # ---------- helpers: validation & coverage ----------
@@ -441,111 +685,24 @@ def download_zip(request, pk: int):
 
 def _validate_activity_file(af: ActivityFile) -> tuple[bool, str]:
     """
-    Validate ActivityFile against SupplierValidationRule for the activity's supplier.
-    Rules model fields (assumed):
-      - supplier (FK)
-      - expected_name (str, e.g., "w9" or "insurance_certificate.pdf")
-      - required (bool)
-      - required_keywords (pipe-separated, e.g., "policy|insurance|liability")
-      - allowed_extensions (pipe-separated, e.g., "pdf|png|jpg")
-      - active (bool)
+    Validate ActivityFile against the SupplierValidationRules of the activity's supplier.
     Logic:
       - If no active rules exist: accept.
-      - Find a rule whose expected_name is contained in the original filename (case-insensitive).
-      - Enforce extension and required_keywords if rule matched.
+      - Find the first rule whose expected_name is contained in the original filename (case-insensitive).
+      - Enforce allowed_extensions and required_keywords (pipe-separated) if a rule matched.
       - If no rule matched but there ARE required rules: fail; else accept.
+    Rules are compiled and cached per supplier (see activities.rules), so this
+    runs no rule queries while the supplier's rules are unchanged.
     """
-    try:
-        from tenants.models import SupplierValidationRule as Rule
-    except Exception:
-        return True, ""  # rules not available → accept
-
-    rules = Rule.objects.filter(supplier=a.supplier, is_active=True)
-    if not rules.exists():
-        return True, ""
-
-    name = (af.original_name or "").lower()
-
-    # match by inclusion of expected_name
-    matched = None
-    for r in rules:
-        exp = (r.expected_name or "").strip().lower()
-        if exp and exp in name:
-            matched = r
-            break
-
-    if not matched:
-        if rules.filter(required=True).exists():
-            return False, "No matching expected file for this upload."
-        return True, ""
-
-    # extension check
-    if matched.allowed_extensions:
-        exts = [
-            e.strip().lower().lstrip(".")
-            for e in matched.allowed_extensions.split("|")
-            if e.strip()
-        ]
-        fname_ext = name.rsplit(".", 1)[-1] if "." in name else ""
-        if exts and fname_ext not in exts:
-            return (
-                False,
-                f"Extension '.{fname_ext}' not allowed. Expected: {', '.join(exts)}.",
-            )
-
-    # keywords check
-    if matched.required_keywords:
-        kws = [
-            k.strip().lower() for k in matched.required_keywords.split("|") if k.strip()
-        ]
-        missing = [kw for kw in kws if kw not in name]
-        if missing:
-            return False, f"Missing required keywords: {', '.join(missing)}."
-
-    return True, ""
+    return rules.for_activity(af.activity).validate(af.original_name)
 
 
 def _rule_coverage(a: Activity) -> dict:
     """
     Return summary about rule coverage and missing required docs.
+    Reads the persisted per-rule counts (see activities.coverage).
     """
-    try:
-        from tenants.models import SupplierValidationRule as Rule
-    except Exception:
-        return {"any_active_rules": False, "required_missing": [], "matched_counts": {}}
-
-    rules = list(Rule.objects.filter(supplier=a.supplier, is_active=True))
-    if not rules:
-        return {"any_active_rules": False, "required_missing": [], "matched_counts": {}}
-
-    files = a.files.all()
-    matched_counts = {}
-    for r in rules:
-        exp = (r.expected_name or "").strip().lower()
-        if not exp:
-            continue
-        count = sum(
-            1
-            for f in files
-            if exp in (f.original_name or "").lower()
-            and f.status == FileStatus.VALID_OK
-        )
-        matched_counts[exp] = count
-
-    required_missing = []
-    for r in rules:
-        if r.required:
-            exp = (r.expected_name or "").strip().lower()
-            if not exp:
-                continue
-            if matched_counts.get(exp, 0) == 0:
-                required_missing.append(r.expected_name)
-
-    return {
-        "any_active_rules": True,
-        "required_missing": required_missing,
-        "matched_counts": matched_counts,
-    }
+    return coverage.summary(a)
 
 
 @login_required
@@ -583,82 +740,6 @@ def activity_status_json(request, pk: int):
 
 
 
-def _handle_single_file_upload(
-    a: Activity,
-    user: User,
-    fobj,
-    original_name: str,
-    base_version_from: ActivityFile | None = None,
-) -> tuple[ActivityFile, bool, str]:
-    """
-    Create an ActivityFile record, transition UPLOADING -> VALIDATING, run validation,
-    and persist result. Any exception during save/validation marks the record as
-    UPLOAD_FAILED (or VALID_FAILED if UPLOAD_FAILED does not exist) with a reason.
-    Returns (ActivityFile, ok, reason).
-    """
-    # compute next version / reupload linkage
-    if base_version_from is not None:
-        next_version = base_version_from.version + 1
-        reupload_of = base_version_from
-    else:
-        last = (
-            a.files.filter(original_name=original_name)
-            .order_by("-version", "-uploaded_at")
-            .first()
-        )
-        next_version = (last.version + 1) if last else 1
-        reupload_of = last if last else None
-
-    af: ActivityFile | None = None
-    failed_status = getattr(FileStatus, "UPLOAD_FAILED", FileStatus.VALID_FAILED)
-
-    try:
-        # Create + persist file. If storage backend errors here, we'll catch below.
-        af = ActivityFile.objects.create(
-            activity=a,
-            uploaded_by=user,
-            original_name=original_name,
-            file=fobj,
-            status=FileStatus.UPLOADING,
-            version=next_version,
-            reupload_of=reupload_of,
-        )
-
-        # Move to validating
-        af.status = FileStatus.VALIDATING
-        af.save(update_fields=["status"])
-
-        ok, reason = _validate_activity_file(af)
-
-        af.status = FileStatus.VALID_OK if ok else FileStatus.VALID_FAILED
-        af.failure_reason = "" if ok else (reason or "Validation failed")
-        af.validated_at = timezone.now()
-        af.save(update_fields=["status", "failure_reason", "validated_at"])
-        return af, ok, reason or ""
-
-    except Exception as e:
-        # Either object creation failed (af is None) or later steps blew up
-        reason = f"Upload/validation error: {e}"
-        if af is None:
-            # Create a minimal failed record so the UI has a row to show
-            af = ActivityFile.objects.create(
-                activity=a,
-                uploaded_by=user,
-                original_name=original_name,
-                status=failed_status,
-                version=next_version,
-                reupload_of=reupload_of,
-                failure_reason=reason,
-            )
-        else:
-            af.status = failed_status
-            af.failure_reason = reason
-            af.validated_at = timezone.now()
-            af.save(update_fields=["status", "failure_reason", "validated_at"])
-        return af, False, reason
-
-
-
 @require_POST
 @login_required
 def delete_file(request, pk: int, file_id: int):
@@ -669,9 +750,10 @@ def delete_file(request, pk: int, file_id: int):
     if not _can_upload(request.user, a) or a.status != ActivityStatus.IN_PROGRESS:
         return HttpResponseForbidden("Not allowed")
 
-    # Try to remove blob from storage first; ignore errors so DB row is still removed
+    # Try to remove blob from storage first; ignore errors so DB row is still removed.
+    # Shared (deduplicated) objects are released by filestore.signals instead.
     try:
-        if f.file and hasattr(f.file, "storage") and f.file.name:
+        if f.file and hasattr(f.file, "storage") and f.file.name and not f.blob_id:
             f.file.storage.delete(f.file.name)
     except Exception:
         pass
@@ -44,3 +44,28 @@ def log_event(
         ev.target_id = str(getattr(target, "pk", None))
     ev.save()
     return ev
+
+
+def log_events(events: list[dict], *, request=None) -> list[AuditEvent]:
+    """
+    Bulk variant of log_event: one INSERT for many events. Each dict takes
+    log_event's keyword arguments (except `request`, shared by all).
+    """
+    ctx = _ctx(request)
+    rows = []
+    for e in events:
+        ev = AuditEvent(
+            actor=e.get("actor"),
+            verb=e["verb"],
+            action=e["action"],
+            evaluator_id=e.get("evaluator_id"),
+            supplier_id=e.get("supplier_id"),
+            metadata=e.get("metadata") or {},
+            **ctx,
+        )
+        target = e.get("target")
+        if target is not None:
+            ev.target_ct = ContentType.objects.get_for_model(target.__class__)
+            ev.target_id = str(getattr(target, "pk", None))
+        rows.append(ev)
+    return AuditEvent.objects.bulk_create(rows, batch_size=500)
@@ -0,0 +1,21 @@
+"""
+Whether the default cache is shared between processes.
+
+Gunicorn workers, `run_workers`, cron and `send_outbox` are separate
+processes. Cached state that one of them invalidates (dashboard generations,
+notification counters) is only coherent if they all talk to the same cache
+backend. A per-process backend (LocMemCache) or DummyCache is not shared,
+so callers that rely on cross-process invalidation skip caching there.
+"""
+
+from django.core.cache import caches
+
+PER_PROCESS_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def is_shared(alias: str = "default") -> bool:
+    backend = type(caches[alias])
+    return f"{backend.__module__}.{backend.__qualname__}" not in PER_PROCESS_BACKENDS
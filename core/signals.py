@@ -0,0 +1,21 @@
+"""
+Signals shared across apps.
+
+`bulk_create()` skips save() and post_save, so denormalized state kept by
+post_save receivers (dashboard rollups and cache, storage ledger) would
+drift. Code that batches inserts goes through `bulk_create()` below, and
+those receivers also listen to `post_bulk_create` to apply one aggregated
+update per batch.
+"""
+
+from django.dispatch import Signal
+
+# sender=model, instances=[saved objects with pks]
+post_bulk_create = Signal()
+
+
+def bulk_create(model, objs, **kwargs) -> list:
+    objs = model._default_manager.bulk_create(objs, **kwargs)
+    if objs:
+        post_bulk_create.send(sender=model, instances=objs)
+    return objs
@@ -0,0 +1,317 @@
+# core/zipstream.py
+"""
+Constant-memory ZIP streaming.
+
+`iter_zip(members)` yields the archive as byte chunks while reading each
+member in `chunk_size` pieces, so memory stays at roughly one chunk no matter
+how large the activity is. zipfile writes to an unseekable sink here, which
+makes it emit data descriptors instead of seeking back to patch headers.
+
+Already-compressed formats are STORED; everything else is DEFLATED.
+`StorageTee` mirrors the chunks into default storage (a multipart upload on
+S3) so a streamed download can also leave a persisted copy behind. A member
+that can't be read is skipped (or left truncated) in the stream. The
+builders report it through their `failed` list, and a tee is aborted rather
+than keeping an incomplete copy.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import zipfile
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional
+
+from django.core.exceptions import SuspiciousOperation
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+# Formats that are compressed already; deflating them again only burns CPU.
+STORED_EXTENSIONS = {
+    "pdf", "jpg", "jpeg", "png", "gif", "webp", "heic",
+    "zip", "gz", "tgz", "7z", "rar", "docx", "xlsx", "pptx", "mp4",
+}
+
+
+class IncompleteZip(Exception):
+    """Some members could not be written; `failed` lists their arcnames."""
+
+    def __init__(self, failed):
+        self.failed = list(failed)
+        super().__init__("could not archive: " + ", ".join(self.failed))
+
+
+@dataclass
+class ZipMember:
+    arcname: str
+    open: Callable  # () -> binary file-like
+    date_time: Optional[tuple] = None  # (Y, m, d, H, M, S); defaults to now
+
+
+def unique_arcnames(names: Iterable[str]) -> Iterator[str]:
+    """
+    Yield `names`, renaming repeats "name (2).ext", "name (3).ext", ...
+    Set lookups plus a per-name counter, so n entries cost O(n).
+    """
+    taken: set = set()
+    next_n: dict = {}
+    for name in names:
+        if name in taken:
+            base, ext = os.path.splitext(name)
+            i = next_n.get(name, 2)
+            while f"{base} ({i}){ext}" in taken:
+                i += 1
+            next_n[name] = i + 1
+            name = f"{base} ({i}){ext}"
+        taken.add(name)
+        yield name
+
+
+def compress_type_for(arcname: str) -> int:
+    ext = arcname.rsplit(".", 1)[-1].lower() if "." in arcname else ""
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+class _Sink:
+    """Write-only, unseekable buffer that hands back what was written so far."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(
+    members: Iterable[ZipMember], *, chunk_size: int = CHUNK_SIZE, failed: list | None = None
+) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of `members` chunk by chunk. Members that cannot be
+    opened or read are skipped (logged), like the old in-memory builder did,
+    and their arcnames appended to `failed`.
+    """
+    failed = [] if failed is None else failed
+    sink = _Sink()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as zf:
+        for m in members:
+            try:
+                src = m.open()
+            except Exception:
+                log.warning("zipstream: cannot open %s, skipping", m.arcname, exc_info=True)
+                failed.append(m.arcname)
+                continue
+            try:
+                with src, zf.open(_zipinfo(m), mode="w", force_zip64=True) as dest:
+                    while True:
+                        block = src.read(chunk_size)
+                        if not block:
+                            break
+                        dest.write(block)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            except Exception:
+                # The local header is already out; the entry stays (truncated)
+                # but the central directory is still written correctly.
+                log.warning("zipstream: read failed for %s", m.arcname, exc_info=True)
+                failed.append(m.arcname)
+            data = sink.drain()
+            if data:
+                yield data
+    data = sink.drain()  # central directory
+    if data:
+        yield data
+
+
+def append_zip(
+    fileobj, members: Iterable[ZipMember], *, chunk_size: int = CHUNK_SIZE, failed: list | None = None
+) -> int:
+    """
+    Append `members` to the ZIP in the seekable `fileobj`. Returns entries
+    written; members that cannot be opened are skipped and listed in `failed`.
+    """
+    failed = [] if failed is None else failed
+    written = 0
+    with zipfile.ZipFile(fileobj, mode="a", allowZip64=True) as zf:
+        for m in members:
+            try:
+                src = m.open()
+            except Exception:
+                log.warning("zipstream: cannot open %s, skipping", m.arcname, exc_info=True)
+                failed.append(m.arcname)
+                continue
+            with src, zf.open(_zipinfo(m), mode="w", force_zip64=True) as dest:
+                shutil.copyfileobj(src, dest, chunk_size)
+            written += 1
+    return written
+
+
+def _zipinfo(m: ZipMember) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(m.arcname, date_time=m.date_time or _now_tuple())
+    info.compress_type = compress_type_for(m.arcname)
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def _now_tuple():
+    from django.utils import timezone
+
+    return timezone.localtime().timetuple()[:6]
+
+
+class StorageTee:
+    """
+    Copy streamed chunks into `storage` under `name` (or the next available
+    name). On S3 this is a multipart upload driven on the boto3 client, so
+    the UploadId is ours to abort; other storages get a plain file handle.
+    """
+
+    # S3 parts must be at least 5 MiB, except the last one.
+    PART_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, name: str, storage=None):
+        self.storage = storage or default_storage
+        self.name = self.storage.get_available_name(name)
+        self.size = 0
+        self._s3 = _s3_target(self.storage, self.name)
+        if self._s3 is not None:
+            self._buffer = bytearray()
+            self._parts = []
+            self.upload_id = None
+            return
+        if hasattr(self.storage, "path"):
+            try:
+                os.makedirs(os.path.dirname(self.storage.path(self.name)), exist_ok=True)
+            except NotImplementedError:
+                pass
+        self._fh = self.storage.open(self.name, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self._s3 is None:
+            self._fh.write(chunk)
+            return
+        self._buffer += chunk
+        if len(self._buffer) >= self.PART_SIZE:
+            self._upload_part()
+
+    def _upload_part(self) -> None:
+        client, bucket, key = self._s3
+        if self.upload_id is None:
+            params = {"ContentType": "application/zip", **self.storage.get_object_parameters(self.name)}
+            self.upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, **params)["UploadId"]
+        n = len(self._parts) + 1
+        etag = client.upload_part(
+            Bucket=bucket, Key=key, UploadId=self.upload_id, PartNumber=n, Body=bytes(self._buffer)
+        )["ETag"]
+        self._parts.append({"PartNumber": n, "ETag": etag})
+        self._buffer.clear()
+
+    def close(self) -> str:
+        if self._s3 is None:
+            self._fh.close()
+            return self.name
+        client, bucket, key = self._s3
+        if self.upload_id is None:
+            # smaller than one part: a single PUT
+            params = {"ContentType": "application/zip", **self.storage.get_object_parameters(self.name)}
+            client.put_object(Bucket=bucket, Key=key, Body=bytes(self._buffer), **params)
+            self._buffer.clear()
+            return self.name
+        if self._buffer:
+            self._upload_part()
+        client.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=self.upload_id, MultipartUpload={"Parts": self._parts}
+        )
+        return self.name
+
+    def abort(self) -> None:
+        """Drop the partial copy (client went away or the build failed)."""
+        if self._s3 is None:
+            try:
+                self._fh.close()
+                self.storage.delete(self.name)
+            except Exception:
+                pass
+            return
+        self._buffer.clear()
+        if self.upload_id is None:
+            return  # nothing reached the bucket
+        client, bucket, key = self._s3
+        try:
+            client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=self.upload_id)
+        except Exception:
+            log.warning("zipstream: multipart abort failed for %s", self.name, exc_info=True)
+        self.upload_id = None
+
+
+def _s3_target(storage, name: str):
+    """(client, bucket, key) when `storage` is S3, else None."""
+    connection = getattr(storage, "connection", None)
+    bucket = getattr(storage, "bucket_name", None)
+    if connection is None or not bucket:
+        return None
+    return connection.meta.client, bucket, s3_key(storage, name)
+
+
+def s3_key(storage, name: str) -> str:
+    """Bucket key of storage name `name`, as S3Storage itself builds it."""
+    from storages.utils import clean_name, safe_join
+
+    try:
+        return safe_join(getattr(storage, "location", ""), clean_name(name))
+    except ValueError:
+        raise SuspiciousOperation(f"Attempted access to '{name}' denied.")
+
+
+def tee_chunks(
+    chunks: Iterable[bytes], tee: StorageTee, on_complete: Callable | None = None, failed: list | None = None
+) -> Iterator[bytes]:
+    """
+    Pass `chunks` through while writing them to `tee`; abort on early exit,
+    or when `failed` (filled by the builder) lists a member at the end.
+    """
+    try:
+        for chunk in chunks:
+            tee.write(chunk)
+            yield chunk
+    except BaseException:  # includes GeneratorExit on client disconnect
+        tee.abort()
+        raise
+    if failed:
+        log.warning("zipstream: not keeping %s, missing %s", tee.name, ", ".join(failed))
+        tee.abort()
+        return
+    name = tee.close()
+    if on_complete:
+        on_complete(name, tee.size)
+
+
+def zip_response(members: Iterable[ZipMember], filename: str, *, tee: StorageTee | None = None, on_complete=None):
+    failed = []
+    chunks = iter_zip(members, failed=failed)
+    if tee is not None:
+        chunks = tee_chunks(chunks, tee, on_complete, failed)
+    resp = StreamingHttpResponse(chunks, content_type="application/zip")
+    resp["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
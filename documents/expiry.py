@@ -0,0 +1,342 @@
+"""
+Batched expiry reminders for documents and activity files.
+
+Every expirable row carries `next_reminder_on`, the day its next reminder
+is due (see documents.utils.next_reminder_on for the schedule); rows keep
+it current when saved. `run()` walks the rows with `next_reminder_on` on
+or before today in primary-key chunks. For each chunk it:
+
+- resolves recipients with two queries (evaluator staff and supplier users),
+  memoized across chunks;
+- renders each reminder once per row and clones the email per recipient;
+- in one transaction, bulk-inserts the emails into the notifications outbox
+  and the EmailEvent rows, then stamps `last_expiry_notified_at` and moves
+  `next_reminder_on` forward with one bulk UPDATE.
+
+Rows are only stamped together with their queued emails, so a re-run on the
+same day finds nothing left to send and a failed run loses nothing. Delivery
+(pooled SMTP, per-domain throttling, retries) is `manage.py send_outbox`'s job.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from typing import Callable, Iterator
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.template.loader import get_template
+from django.utils import timezone
+
+from accounts.models import Roles, User
+from activities.models import ActivityFile
+from core.signals import bulk_create
+from notifications import outbox
+from notifications.models import EmailEvent
+
+from .models import Document
+from .utils import reminder_kind
+
+SITE_URL = getattr(settings, "SITE_URL", "https://lfras.lucidcompliances.com")
+
+CHUNK_SIZE = int(getattr(settings, "LUCID_EXPIRY_CHUNK_SIZE", 1000))
+
+
+@dataclass
+class Reminder:
+    obj: Document | ActivityFile
+    label: str  # "Document" | "File"
+    title: str
+    path: str  # where the email links to
+    expires_on: date
+    days: int  # days until expiry, negative once expired
+    evaluator_id: int | None
+    supplier_id: int | None
+    evaluator_name: str
+    supplier_name: str
+
+    @property
+    def kind(self) -> str:
+        return reminder_kind(self.days)
+
+    @property
+    def url(self) -> str:
+        return SITE_URL + self.path
+
+    @property
+    def subject(self) -> str:
+        if self.kind == "pre":
+            return f"[Lucid] {self.label} expiring in {self.days} day(s): {self.title}"
+        if self.kind == "on":
+            return f"[Lucid] {self.label} expires today: {self.title}"
+        return f"[Lucid] {self.label} expired {-self.days} day(s) ago: {self.title}"
+
+    @property
+    def meta(self) -> dict:
+        key = "document_id" if isinstance(self.obj, Document) else "activity_file_id"
+        if self.kind == "post":
+            return {key: self.obj.pk, "phase": "post", "days_since": -self.days}
+        return {key: self.obj.pk, "phase": self.kind, "days": self.days}
+
+
+# ---------- selection ----------
+
+
+def _documents(today: date):
+    return (
+        Document.objects.filter(next_reminder_on__lte=today)
+        .select_related("evaluator", "supplier")
+        .only(
+            "id",
+            "title",
+            "expires_at",
+            "is_active",
+            "last_expiry_notified_at",
+            "next_reminder_on",
+            "evaluator_id",
+            "supplier_id",
+            "evaluator__name",
+            "supplier__name",
+        )
+    )
+
+
+def _activity_files(today: date):
+    newer = ActivityFile.objects.filter(reupload_of=OuterRef("pk"))
+    return (
+        ActivityFile.objects.filter(next_reminder_on__lte=today)
+        .annotate(superseded=Exists(newer))
+        .select_related("activity__evaluator", "activity__supplier")
+        .only(
+            "id",
+            "original_name",
+            "expires_on",
+            "status",
+            "last_expiry_notified_at",
+            "next_reminder_on",
+            "activity_id",
+            "activity__evaluator_id",
+            "activity__supplier_id",
+            "activity__evaluator__name",
+            "activity__supplier__name",
+        )
+    )
+
+
+def _document_reminder(doc: Document, today: date) -> Reminder:
+    expires_on = timezone.localdate(doc.expires_at)
+    return Reminder(
+        obj=doc,
+        label="Document",
+        title=doc.title or f"#{doc.pk}",
+        path=f"/documents/{doc.pk}/",
+        expires_on=expires_on,
+        days=(expires_on - today).days,
+        evaluator_id=doc.evaluator_id,
+        supplier_id=doc.supplier_id,
+        evaluator_name=doc.evaluator.name if doc.evaluator_id else "",
+        supplier_name=doc.supplier.name if doc.supplier_id else "",
+    )
+
+
+def _file_reminder(af: ActivityFile, today: date) -> Reminder | None:
+    if af.superseded:  # a newer version replaces it
+        return None
+    a = af.activity
+    return Reminder(
+        obj=af,
+        label="File",
+        title=f"{af.original_name} (Activity #{a.pk})",
+        path=f"/activities/{a.pk}/",
+        expires_on=af.expires_on,
+        days=(af.expires_on - today).days,
+        evaluator_id=a.evaluator_id,
+        supplier_id=a.supplier_id,
+        evaluator_name=a.evaluator.name,
+        supplier_name=a.supplier.name,
+    )
+
+
+# (model, due rows, reminder builder, stats key)
+SOURCES = (
+    (Document, _documents, _document_reminder, "documents"),
+    (ActivityFile, _activity_files, _file_reminder, "files"),
+)
+
+
+def _chunks(qs) -> Iterator[list]:
+    """Keyset pages by primary key; rows updated meanwhile never shift a page."""
+    last = 0
+    while True:
+        rows = list(qs.filter(pk__gt=last).order_by("pk")[:CHUNK_SIZE])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1].pk
+
+
+# ---------- recipients ----------
+
+
+class Recipients:
+    """
+    Evaluator users (EAD + EVS) and supplier users (SUS) per reminder,
+    loaded with one query per side for each batch of new tenants.
+    """
+
+    def __init__(self):
+        self.evaluators: dict = {}
+        self.suppliers: dict = {}
+
+    def load(self, reminders) -> None:
+        ev_ids = {r.evaluator_id for r in reminders if r.evaluator_id} - self.evaluators.keys()
+        sup_ids = {r.supplier_id for r in reminders if r.supplier_id} - self.suppliers.keys()
+        active = User.objects.filter(is_active=True).exclude(email="")
+        if ev_ids:
+            for pk in ev_ids:
+                self.evaluators[pk] = set()
+            rows = active.filter(evaluator_id__in=ev_ids, role__in=[Roles.EAD, Roles.EVS])
+            for pk, email in rows.values_list("evaluator_id", "email"):
+                self.evaluators[pk].add(email)
+        if sup_ids:
+            for pk in sup_ids:
+                self.suppliers[pk] = set()
+            rows = active.filter(supplier_id__in=sup_ids, role=Roles.SUS)
+            for pk, email in rows.values_list("supplier_id", "email"):
+                self.suppliers[pk].add(email)
+
+    def for_reminder(self, r: Reminder) -> list:
+        emails = set()
+        if r.evaluator_id:
+            emails |= self.evaluators.get(r.evaluator_id, set())
+        if r.supplier_id:
+            emails |= self.suppliers.get(r.supplier_id, set())
+        return sorted(emails)
+
+
+# ---------- rendering ----------
+
+
+class Renderer:
+    """Templates are loaded once per run; each reminder renders once."""
+
+    def __init__(self):
+        try:
+            self.txt = get_template("emails/expiry_reminder.txt")
+            self.html = get_template("emails/expiry_reminder.html")
+        except Exception:
+            self.txt = self.html = None
+
+    def render(self, r: Reminder) -> tuple[str, str]:
+        """(text_body, html_body); plain text only if the templates are missing."""
+        ctx = {"item": r, "subject": r.subject, "site_url": SITE_URL}
+        if self.txt is not None:
+            try:
+                return self.txt.render(ctx), self.html.render(ctx)
+            except Exception:
+                pass
+        txt = (
+            f"{r.subject}\n\n"
+            f"{r.label}: {r.title}\n"
+            f"Expires on: {r.expires_on}\n"
+            f"Evaluator: {r.evaluator_name or '-'}\n"
+            f"Supplier: {r.supplier_name or '-'}\n\n"
+            f"Open: {r.url}\n"
+            f"— Lucid Compliances"
+        )
+        return txt, ""
+
+
+# ---------- run ----------
+
+
+def _stamp(model, notified, dropped, today: date, now) -> None:
+    """Record the reminders queued and move each row to its next due day."""
+    for obj in notified:
+        obj.last_expiry_notified_at = now
+        obj.schedule_reminder(today)
+    for obj in dropped:
+        obj.next_reminder_on = None
+    rows = notified + dropped
+    if rows:
+        model.objects.bulk_update(rows, ["last_expiry_notified_at", "next_reminder_on"], batch_size=CHUNK_SIZE)
+
+
+def run(
+    today: date | None = None,
+    *,
+    dry_run: bool = False,
+    echo: Callable[[str], None] | None = None,
+) -> dict:
+    """
+    Queue the reminders due by `today`. Returns {"documents": n, "files": n,
+    "emails": queued}. With `dry_run`, nothing is queued or logged and `echo`
+    receives one line per reminder.
+    """
+    now = timezone.now()
+    if today is not None and today != timezone.localdate(now):
+        now = timezone.make_aware(datetime.combine(today, time(12)))  # keep the schedule consistent
+    today = today or timezone.localdate(now)
+    recipients = Recipients()
+    renderer = Renderer()
+    stats = {"documents": 0, "files": 0, "emails": 0}
+
+    for model, due, build, key in SOURCES:
+        for rows in _chunks(due(today)):
+            reminders, dropped = [], []
+            for obj in rows:
+                # rows changed by queryset.update() may no longer qualify
+                r = build(obj, today) if obj.schedule_reminder(today) else None
+                if r is None:
+                    dropped.append(obj)
+                else:
+                    reminders.append(r)
+            recipients.load(reminders)
+            emails, events = [], []
+            for r in reminders:
+                to = recipients.for_reminder(r)
+                stats[key] += 1
+                stats["emails"] += len(to)
+                if dry_run:
+                    if echo:
+                        echo(
+                            f"DRY-RUN {r.kind}-expiry: {r.label.lower()} {r.obj.pk} "
+                            f"→ {len(to)} recipients ({r.days}d)"
+                        )
+                    continue
+                text_body, html_body = renderer.render(r)
+                for em in to:
+                    emails.append(outbox.build(em, r.subject, text_body, html=html_body))
+                    events.append(
+                        EmailEvent(category="expiry", subject=r.subject[:255], recipient_email=em, meta=r.meta)
+                    )
+            if dry_run:
+                continue
+            # a row is stamped only together with its queued emails
+            with transaction.atomic():
+                outbox.bulk_queue(emails)
+                # Log each queued recipient for LAD dashboard counts
+                bulk_create(EmailEvent, events, batch_size=1000)
+                _stamp(model, [r.obj for r in reminders], dropped, today, now)
+    return stats
+
+
+def rebuild_schedule(today: date | None = None) -> int:
+    """Recompute next_reminder_on for every row (backfill). Returns rows changed."""
+    changed = 0
+    for model, fields in (
+        (Document, ["expires_at", "is_active", "last_expiry_notified_at", "next_reminder_on"]),
+        (ActivityFile, ["expires_on", "status", "last_expiry_notified_at", "next_reminder_on"]),
+    ):
+        for rows in _chunks(model.objects.only(*fields)):
+            stale = []
+            for obj in rows:
+                before = obj.next_reminder_on
+                if obj.schedule_reminder(today) != before:
+                    stale.append(obj)
+            if stale:
+                model.objects.bulk_update(stale, ["next_reminder_on"], batch_size=CHUNK_SIZE)
+            changed += len(stale)
+    return changed
@@ -0,0 +1,17 @@
+# documents/management/commands/rebuild_reminder_schedule.py
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from documents import expiry
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute next_reminder_on for all documents and activity files "
+        "(backfill, or after changing LUCID_EXPIRY_* settings)."
+    )
+
+    def handle(self, *args, **options):
+        changed = expiry.rebuild_schedule()
+        self.stdout.write(self.style.SUCCESS(f"Reminder schedule rebuilt — rows updated: {changed}"))
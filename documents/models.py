@@ -1,6 +1,12 @@
+import os
+
 from django.db import models
 from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
 from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .utils import next_reminder_on
 
 User = settings.AUTH_USER_MODEL
 
@@ -28,8 +34,16 @@ class Document(models.Model):
     category = models.CharField(
         max_length=20, choices=DocCategory.choices, default=DocCategory.GENERAL
     )
-    file = models.FileField(upload_to="docs/%Y/%m/")
+    file = models.FileField(upload_to="docs/%Y/%m/", max_length=255)
     file_size = models.BigIntegerField(default=0)
+    # shared content-addressed object `file` points at (None: own object)
+    blob = models.ForeignKey(
+        "filestore.StoredBlob",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="documents",
+    )
     uploaded_by = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, related_name="uploaded_documents"
     )
@@ -39,10 +53,31 @@ class Document(models.Model):
     expires_at = models.DateTimeField(null=True, blank=True)
     remind_days_before = models.PositiveIntegerField(default=30)
     last_expiry_notified_at = models.DateTimeField(null=True, blank=True)
+    # Due date of the next expiry reminder; kept by save() and the nightly run
+    next_reminder_on = models.DateField(null=True, blank=True, editable=False)
 
     is_active = models.BooleanField(default=True)
 
+    # fields next_reminder_on is derived from
+    REMINDER_FIELDS = {"expires_at", "is_active", "last_expiry_notified_at"}
+
+    def schedule_reminder(self, today=None):
+        """Recompute next_reminder_on (not saved)."""
+        self.next_reminder_on = None
+        if self.is_active and self.expires_at:
+            last = self.last_expiry_notified_at
+            self.next_reminder_on = next_reminder_on(
+                timezone.localdate(self.expires_at),
+                today=today,
+                last_notified=timezone.localdate(last) if last else None,
+            )
+        return self.next_reminder_on
+
     def save(self, *args, **kwargs):
+        self.schedule_reminder()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and self.REMINDER_FIELDS.intersection(update_fields):
+            kwargs["update_fields"] = {*update_fields, "next_reminder_on"}
         super().save(*args, **kwargs)
         # ensure file_size is captured once file exists
         if self.file and (not self.file_size or self.file_size <= 0):
@@ -60,11 +95,27 @@ class Document(models.Model):
 
     class Meta:
         ordering = ["-uploaded_at"]
+        indexes = [
+            models.Index(fields=["is_active", "expires_at"]),
+            models.Index(fields=["next_reminder_on"]),
+        ]
 
     @property
     def is_expired(self):
         return bool(self.expires_at and timezone.now() > self.expires_at)
 
+    @property
+    def download_name(self) -> str:
+        """Filename offered on download; shared (blob) keys are content hashes."""
+        base = os.path.basename(self.file.name or "")
+        if not self.blob_id:
+            return base
+        try:
+            stem = get_valid_filename(self.title)
+        except SuspiciousFileOperation:  # title has no usable characters
+            stem = "document"
+        return stem + os.path.splitext(base)[1]
+
     @property
     def days_to_expiry(self):
         if not self.expires_at:
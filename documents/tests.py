@@ -1,3 +1,343 @@
-from django.test import TestCase
+import io
+import zipfile
+from datetime import date, datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db.models.functions import TruncDate
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Roles, User
+from activities.models import Activity, ActivityFile, FileStatus
+from notifications.models import EmailEvent, OutboundEmail
+from tenants.testing import TenantFixture, make_evaluator
+
+from . import expiry
+from .models import Document
+from .utils import forecast, next_reminder_on, triggers_on, will_trigger_on, with_schedule
+
+
+def _at(day):
+    return timezone.make_aware(datetime.combine(day, time(12)))
+
+
+class NextReminderTests(SimpleTestCase):
+    expires = date(2025, 6, 30)
+
+    def next(self, today, last=None):
+        return next_reminder_on(self.expires, today=today, last_notified=last)
+
+    def test_pre_expiry_offsets_and_expiry_day(self):
+        self.assertEqual(self.next(date(2025, 1, 1)), date(2025, 5, 31))  # 30 days before
+        self.assertEqual(self.next(date(2025, 5, 31)), date(2025, 5, 31))
+        self.assertEqual(self.next(date(2025, 6, 1)), date(2025, 6, 16))  # 14
+        self.assertEqual(self.next(date(2025, 6, 17)), date(2025, 6, 23))  # 7
+        self.assertEqual(self.next(date(2025, 6, 24)), date(2025, 6, 29))  # 1
+        self.assertEqual(self.next(date(2025, 6, 30)), date(2025, 6, 30))  # on the day
+
+    def test_never_twice_on_the_same_day(self):
+        self.assertEqual(self.next(date(2025, 5, 31), last=date(2025, 5, 31)), date(2025, 6, 16))
+        self.assertEqual(self.next(date(2025, 6, 30), last=date(2025, 6, 30)), date(2025, 7, 7))
+
+    def test_post_expiry(self):
+        # expired and never reminded since: right away
+        self.assertEqual(self.next(date(2025, 7, 3)), date(2025, 7, 3))
+        self.assertEqual(self.next(date(2025, 7, 3), last=date(2025, 6, 29)), date(2025, 7, 3))
+        # then every interval after the last reminder
+        self.assertEqual(self.next(date(2025, 7, 3), last=date(2025, 7, 1)), date(2025, 7, 8))
+        # an overdue reminder is due today, not in the past
+        self.assertEqual(self.next(date(2025, 8, 1), last=date(2025, 7, 1)), date(2025, 8, 1))
+
+    def test_post_reminders_can_be_disabled(self):
+        with mock.patch("documents.utils.POST_EXPIRE_INTERVAL", 0):
+            self.assertIsNone(self.next(date(2025, 7, 3)))
+            self.assertEqual(self.next(date(2025, 6, 30)), date(2025, 6, 30))
+
+    def test_no_expiry(self):
+        self.assertIsNone(next_reminder_on(None, today=date(2025, 1, 1)))
+
+
+class ReminderScheduleTests(TenantFixture, TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+
+    def test_document_save_keeps_it_current(self):
+        doc = Document.objects.create(evaluator=self.ev, title="d", file="docs/a.pdf")
+        self.assertIsNone(doc.next_reminder_on)
+
+        doc.expires_at = _at(self.today + timedelta(days=3))
+        doc.save(update_fields=["expires_at"])  # next_reminder_on is saved along
+        doc.refresh_from_db()
+        self.assertEqual(doc.next_reminder_on, self.today + timedelta(days=2))
+
+        doc.is_active = False
+        doc.save()
+        doc.refresh_from_db()
+        self.assertIsNone(doc.next_reminder_on)
+
+    def test_failed_activity_files_get_no_reminders(self):
+        activity = Activity.objects.create(evaluator=self.ev, supplier=self.sup)
+        af = ActivityFile.objects.create(
+            activity=activity, original_name="a.pdf", file="f/a.pdf", expires_on=self.today + timedelta(days=7)
+        )
+        self.assertEqual(af.next_reminder_on, self.today)
+
+        af.status = FileStatus.VALID_FAILED
+        af.save(update_fields=["status"])
+        af.refresh_from_db()
+        self.assertIsNone(af.next_reminder_on)
+
+    def test_rebuild_schedule(self):
+        doc = Document.objects.create(
+            evaluator=self.ev, title="d", file="docs/a.pdf", expires_at=_at(self.today + timedelta(days=7))
+        )
+        Document.objects.filter(pk=doc.pk).update(next_reminder_on=None)  # bypasses save()
+
+        self.assertEqual(expiry.rebuild_schedule(), 1)
+        doc.refresh_from_db()
+        self.assertEqual(doc.next_reminder_on, self.today)
+        self.assertEqual(expiry.rebuild_schedule(), 0)
+
+
+class ExpiryRunTests(TenantFixture, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        User.objects.create_user("ead@acme.test", "pw", role=Roles.EAD, evaluator=cls.ev)
+        User.objects.create_user("evs@acme.test", "pw", role=Roles.EVS, evaluator=cls.ev)
+        User.objects.create_user("sus@s1.test", "pw", role=Roles.SUS, supplier=cls.sup)
+        User.objects.create_user("off@s1.test", "pw", role=Roles.SUS, supplier=cls.sup, is_active=False)
+
+    def setUp(self):
+        self.today = timezone.localdate()
+
+    def _doc(self, days, **kwargs):
+        return Document.objects.create(
+            evaluator=self.ev,
+            supplier=self.sup,
+            title="Insurance",
+            file="docs/a.pdf",
+            expires_at=_at(self.today + timedelta(days=days)),
+            **kwargs,
+        )
+
+    def test_due_reminders_are_queued_logged_and_stamped(self):
+        doc = self._doc(7)
+        self._doc(8)  # nothing due today
+
+        stats = expiry.run(self.today)
+
+        self.assertEqual(stats, {"documents": 1, "files": 0, "emails": 3})
+        self.assertCountEqual(
+            OutboundEmail.objects.values_list("to_email", flat=True), ["ead@acme.test", "evs@acme.test", "sus@s1.test"]
+        )
+        email = OutboundEmail.objects.first()
+        self.assertEqual(email.subject, "[Lucid] Document expiring in 7 day(s): Insurance")
+        self.assertIn("/documents/%d/" % doc.pk, email.body)
+        self.assertEqual(EmailEvent.objects.filter(category="expiry").count(), 3)
+        self.assertEqual(EmailEvent.objects.first().meta, {"document_id": doc.pk, "phase": "pre", "days": 7})
+
+        doc.refresh_from_db()
+        self.assertIsNotNone(doc.last_expiry_notified_at)
+        self.assertEqual(doc.next_reminder_on, self.today + timedelta(days=6))  # the 1-day reminder
+
+        # a re-run the same day finds nothing left
+        self.assertEqual(expiry.run(self.today)["emails"], 0)
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+
+    def test_failed_queueing_leaves_rows_due(self):
+        doc = self._doc(0)
+        with mock.patch.object(expiry.outbox, "bulk_queue", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                expiry.run(self.today)
+
+        doc.refresh_from_db()
+        self.assertIsNone(doc.last_expiry_notified_at)
+        self.assertEqual(doc.next_reminder_on, self.today)
+        self.assertFalse(EmailEvent.objects.exists())
+
+        expiry.run(self.today)
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+
+    def test_rows_that_no_longer_qualify_are_dropped(self):
+        doc = self._doc(0)
+        Document.objects.filter(pk=doc.pk).update(is_active=False)  # bypasses save()
+
+        self.assertEqual(expiry.run(self.today)["documents"], 0)
+        doc.refresh_from_db()
+        self.assertIsNone(doc.next_reminder_on)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_activity_files_and_superseded_versions(self):
+        activity = Activity.objects.create(evaluator=self.ev, supplier=self.sup)
+        old = ActivityFile.objects.create(
+            activity=activity, original_name="w9.pdf", file="f/1.pdf", expires_on=self.today
+        )
+        ActivityFile.objects.create(
+            activity=activity, original_name="w9.pdf", file="f/2.pdf", expires_on=self.today, reupload_of=old
+        )
+
+        stats = expiry.run(self.today)
+
+        self.assertEqual((stats["files"], stats["emails"]), (1, 3))
+        self.assertTrue(all("expires today" in s for s in OutboundEmail.objects.values_list("subject", flat=True)))
+        old.refresh_from_db()
+        self.assertIsNone(old.next_reminder_on)
+
+    def test_dry_run_queues_nothing(self):
+        doc = self._doc(7)
+        lines = []
+        stats = expiry.run(self.today, dry_run=True, echo=lines.append)
+
+        self.assertEqual(stats["emails"], 3)
+        self.assertEqual(len(lines), 1)
+        self.assertFalse(OutboundEmail.objects.exists())
+        self.assertFalse(EmailEvent.objects.exists())
+        doc.refresh_from_db()
+        self.assertIsNone(doc.last_expiry_notified_at)
+
+    def test_command(self):
+        self._doc(7)
+        call_command("send_expiry_notifications", stdout=mock.Mock())
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+
+
+class ZipDownloadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ev = make_evaluator()
+        cls.other = make_evaluator("other")
+        cls.user = User.objects.create_user("ead@acme.test", "pw", role=Roles.EAD, evaluator=cls.ev)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _doc(self, name, data, evaluator=None):
+        return Document.objects.create(
+            evaluator=evaluator or self.ev, title=name, file=ContentFile(data, name=name), file_size=len(data)
+        )
+
+    def download(self, docs):
+        resp = self.client.post(reverse("documents:download_zip"), {"ids": [d.pk for d in docs]})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp["Content-Type"], "application/zip")
+        with zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content))) as zf:
+            return {n: zf.read(n) for n in zf.namelist()}
+
+    def test_streams_the_selected_documents(self):
+        a = self._doc("a.txt", b"alpha")
+        b = self._doc("b.pdf", b"%PDF bravo")
+        self._doc("c.txt", b"not selected")
+
+        entries = self.download([a, b])
+        self.assertEqual(entries, {a.download_name: b"alpha", b.download_name: b"%PDF bravo"})
+
+    def test_repeated_names_are_renamed(self):
+        docs = [self._doc("a.txt", b"one"), self._doc("a.txt", b"two")]
+        Document.objects.filter(pk=docs[1].pk).update(file=docs[0].file.name)  # same stored name
+        docs[1].refresh_from_db()
+
+        name = docs[0].download_name
+        stem, ext = name.rsplit(".", 1)
+        self.assertEqual(self.download(docs), {name: b"one", f"{stem} (2).{ext}": b"one"})
+
+    def test_other_tenants_and_missing_files_are_skipped(self):
+        mine = self._doc("a.txt", b"alpha")
+        theirs = self._doc("b.txt", b"secret", evaluator=self.other)
+        gone = self._doc("c.txt", b"gone")
+        gone.file.storage.delete(gone.file.name)
+
+        with self.assertLogs("core.zipstream", "WARNING"):
+            entries = self.download([mine, theirs, gone])
+        self.assertEqual(entries, {mine.download_name: b"alpha"})
+
+    def test_nothing_selected(self):
+        theirs = self._doc("b.txt", b"secret", evaluator=self.other)
+        resp = self.client.post(reverse("documents:download_zip"), {"ids": [theirs.pk]})
+        self.assertRedirects(resp, reverse("documents:list"), fetch_redirect_response=False)
+
+    def test_post_only(self):
+        self.assertEqual(self.client.get(reverse("documents:download_zip")).status_code, 403)
+
+
+class TriggerParityTests(TestCase):
+    """The DB-side schedule (documents.utils.triggers_on) agrees with will_trigger_on."""
+
+    WINDOW = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ev = make_evaluator()
+        cls.staff = User.objects.create_user("staff@lucid.test", "pw", role=Roles.LAD, is_staff=True)
+        today = timezone.localdate()
+        docs = []
+        for offset in range(-40, 45):
+            for since in (None, 0, 1, 3, 10):
+                expires_on = today + timedelta(days=offset)
+                last = None if since is None else _at(min(today, expires_on) - timedelta(days=since))
+                docs.append(
+                    Document(
+                        evaluator=cls.ev,
+                        title=f"d{offset}/{since}",
+                        file="docs/a.pdf",
+                        expires_at=_at(expires_on),
+                        last_expiry_notified_at=last,
+                    )
+                )
+        docs.append(
+            Document(evaluator=cls.ev, title="inactive", file="docs/a.pdf", expires_at=_at(today), is_active=False)
+        )
+        docs.append(Document(evaluator=cls.ev, title="no expiry", file="docs/a.pdf"))
+        for d in docs:
+            d.schedule_reminder(today)
+        Document.objects.bulk_create(docs)
+
+    def setUp(self):
+        self.today = timezone.localdate()
+
+    def simulate(self):
+        """{day: ids} from will_trigger_on, stamping each reminder on its day like the nightly run."""
+        fired = {}
+        docs = list(Document.objects.all())
+        for i in range(self.WINDOW):
+            day = self.today + timedelta(days=i)
+            fired[day] = set()
+            for d in docs:
+                if will_trigger_on(d, day):
+                    fired[day].add(d.pk)
+                    d.last_expiry_notified_at = _at(day)
+        return fired
+
+    def test_triggers_on_matches_will_trigger_on(self):
+        expected = self.simulate()
+        qs = with_schedule(Document.objects.filter(is_active=True), TruncDate("expires_at"), self.today)
+        for day, ids in expected.items():
+            with self.subTest(day=day):
+                self.assertEqual(set(qs.filter(triggers_on(day)).values_list("pk", flat=True)), ids)
+
+    def test_forecast_matches_will_trigger_on(self):
+        expected = self.simulate()
+        counts = forecast(Document.objects.all(), TruncDate("expires_at"), self.today, self.WINDOW)
+        self.assertEqual(counts, [(day, len(ids)) for day, ids in expected.items()])
+
+    def test_preview_lists_the_same_documents(self):
+        self.client.force_login(self.staff)
+        day = self.today + timedelta(days=7)
+        resp = self.client.get(reverse("documents:reminders_preview"), {"date": f"{day:%Y-%m-%d}"})
+        self.assertEqual(resp.context["run_date"], day)
+        self.assertEqual(sum(resp.context["summary"].values()), len(self.simulate()[day]))
+
+    def test_past_date_is_reported(self):
+        self.client.force_login(self.staff)
+        past = self.today - timedelta(days=3)
+        resp = self.client.get(reverse("documents:reminders_preview"), {"date": f"{past:%Y-%m-%d}"})
+        self.assertEqual(resp.context["run_date"], self.today)
+        self.assertContains(resp, "Past dates cannot be previewed")
+
+        resp = self.client.get(reverse("documents:reminders_preview"), {"date": "tomorrow"})
+        self.assertEqual(resp.context["run_date"], self.today)
+        self.assertContains(resp, "Invalid date")
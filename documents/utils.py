@@ -2,6 +2,10 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import date, timedelta
 from django.conf import settings
+from django.db.models import Case, Count, DateField, F, Func, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest, Mod
+from django.db.models.lookups import Exact
+from django.utils import timezone
 
 REMINDER_OFFSETS = getattr(settings, "LUCID_EXPIRY_REMINDER_OFFSETS", [30, 14, 7, 1])
 POST_EXPIRE_INTERVAL = int(getattr(settings, "LUCID_EXPIRY_POST_INTERVAL_DAYS", 7))
@@ -13,38 +17,145 @@ class TriggerResult:
     days: int  # days_to_expiry (negative when post)
 
 
+def reminder_kind(days_to_expiry: int) -> str:
+    if days_to_expiry > 0:
+        return "pre"
+    return "on" if days_to_expiry == 0 else "post"
+
+
+def next_reminder_on(
+    expires_on: date | None, *, today: date | None = None, last_notified: date | None = None
+) -> date | None:
+    """
+    First day on or after `today` that a reminder is due for something
+    expiring on `expires_on`, last reminded on `last_notified` (if ever).
+    Fixed schedule:
+      - PRE: 30/14/7/1 days before (LUCID_EXPIRY_REMINDER_OFFSETS)
+      - ON:  expiry day (0)
+      - POST: right away if not reminded since expiry, then every N days
+    Never returns a day already reminded ('max once per day').
+    """
+    if expires_on is None:
+        return None
+    floor = today or timezone.localdate()
+    if last_notified is not None and last_notified >= floor:
+        floor = last_notified + timedelta(days=1)
+
+    for offset in sorted({0, *(int(d) for d in REMINDER_OFFSETS if int(d) > 0)}, reverse=True):
+        day = expires_on - timedelta(days=offset)
+        if day >= floor:
+            return day
+
+    if POST_EXPIRE_INTERVAL <= 0:
+        return None
+    if last_notified is not None and last_notified >= expires_on:
+        return max(floor, last_notified + timedelta(days=POST_EXPIRE_INTERVAL))
+    return floor
+
+
 def will_trigger_on(doc, run_date: date) -> TriggerResult | None:
     """
     Returns a TriggerResult if the given document would trigger a reminder
-    on run_date (date), otherwise None. Uses the fixed schedule:
-      - PRE: 30/14/7/1 days before
-      - ON:  expiry day (0)
-      - POST: every N days after expiry (weekly by default)
-    Also enforces the 'max once per day' rule via doc.last_expiry_notified_at.
+    on run_date (date), otherwise None. See next_reminder_on() for the schedule.
     """
     if not doc.is_active or not doc.expires_at:
         return None
-    # already notified earlier this run_date?
-    if doc.last_expiry_notified_at and doc.last_expiry_notified_at.date() == run_date:
+    expires_on = timezone.localdate(doc.expires_at)
+    last = doc.last_expiry_notified_at
+    last = timezone.localdate(last) if last else None
+    if next_reminder_on(expires_on, today=run_date, last_notified=last) != run_date:
         return None
-
-    expires_on = doc.expires_at.date()
     days_to_expiry = (expires_on - run_date).days
+    return TriggerResult(kind=reminder_kind(days_to_expiry), days=days_to_expiry)
+
+
+# ---------- set-based (DB-side) ----------
+#
+# The same schedule as an annotated query, for previews and forecasts over
+# many rows. Rows carry next_reminder_on (the first pending reminder); every
+# later reminder follows from the fixed schedule, assuming each one is sent
+# on its day:
+#   - PRE/ON: days_to_expiry IN (offsets, 0)
+#   - POST: (day - anchor) % interval == 0, where the anchor is the expiry
+#     day if that reminder is still pending, else the pending post reminder.
+
 
-    # PRE
-    if days_to_expiry in REMINDER_OFFSETS:
-        return TriggerResult(kind="pre", days=days_to_expiry)
+class DaysBetween(Func):
+    """Whole days from the second date expression to the first."""
 
-    # ON
-    if days_to_expiry == 0:
-        return TriggerResult(kind="on", days=0)
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = IntegerField()
 
-    # POST (weekly or configured)
-    if days_to_expiry < 0:
-        if not doc.last_expiry_notified_at:
-            return TriggerResult(kind="post", days=days_to_expiry)
-        delta_days = (run_date - doc.last_expiry_notified_at.date()).days
-        if delta_days >= POST_EXPIRE_INTERVAL:
-            return TriggerResult(kind="post", days=days_to_expiry)
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
 
-    return None
+
+def _date(day: date) -> Value:
+    return Value(day, output_field=DateField())
+
+
+def with_schedule(qs, expires, today: date | None = None):
+    """
+    Annotate rows of a model with next_reminder_on for triggers_on():
+    `expires` is an expression giving the expiry as a date.
+    """
+    today = today or timezone.localdate()
+    return (
+        qs.filter(next_reminder_on__isnull=False)
+        .annotate(
+            expires_day=expires,
+            # overdue reminders go out today
+            reminder_from=Greatest(F("next_reminder_on"), _date(today)),
+        )
+        .annotate(
+            post_anchor=Case(
+                When(reminder_from__lte=F("expires_day"), then=F("expires_day")),
+                default=F("reminder_from"),
+                output_field=DateField(),
+            )
+        )
+    )
+
+
+def triggers_on(day: date) -> Q:
+    """Condition on with_schedule() rows: a reminder goes out on `day`."""
+    offsets = {0, *(int(d) for d in REMINDER_OFFSETS if int(d) > 0)}
+    fires = Q(reminder_from=day) | Q(expires_day__in=[day + timedelta(days=d) for d in offsets])
+    if POST_EXPIRE_INTERVAL > 0:
+        since_anchor = DaysBetween(_date(day), F("post_anchor"))
+        post_due = Exact(Mod(since_anchor, POST_EXPIRE_INTERVAL, output_field=IntegerField()), 0)
+        fires |= Q(expires_day__lt=day) & Q(post_due)
+    return Q(reminder_from__lte=day) & fires
+
+
+def days_to_expiry(day: date) -> DaysBetween:
+    """Annotation for with_schedule() rows; negative once expired."""
+    return DaysBetween(F("expires_day"), _date(day))
+
+
+def kind_counts(qs) -> dict:
+    """{"pre": n, "on": n, "post": n} for rows annotated with days_to_expiry (one query)."""
+    return qs.aggregate(
+        pre=Count("pk", filter=Q(days__gt=0)),
+        on=Count("pk", filter=Q(days=0)),
+        post=Count("pk", filter=Q(days__lt=0)),
+    )
+
+
+def forecast(qs, expires, start: date, days: int = 60) -> list:
+    """
+    [(day, reminders)] for `days` days from `start`, in one aggregate query.
+    Only rows whose first pending reminder falls in the window can fire in it.
+    """
+    end = start + timedelta(days=days - 1)
+    qs = with_schedule(qs.filter(next_reminder_on__lte=end), expires, start)
+    window = [start + timedelta(days=i) for i in range(days)]
+    counts = qs.aggregate(**{f"d{i}": Count("pk", filter=triggers_on(d)) for i, d in enumerate(window)})
+    return [(d, counts[f"d{i}"]) for i, d in enumerate(window)]
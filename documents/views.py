@@ -1,17 +1,22 @@
+from collections import Counter
 from datetime import datetime, timedelta
-from django.db.models import Q
-import io
-import os
-import zipfile
+from django.db.models import Case, F, When
+from django.db.models.functions import TruncDate
 
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.http import FileResponse, HttpResponse, HttpResponseForbidden
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import FileResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 
 from accounts.models import Roles
+from activities.models import ActivityFile
+from core.zipstream import ZipMember, unique_arcnames, zip_response
+from filestore.services import acquire, write_file
+from search.services import matching
 from tenants.models import Supplier
 from .forms import DocumentUploadForm
 from .models import Document
@@ -19,10 +24,10 @@ from .models import Document
 # Audit + notifications
 from auditlog.services import log_event
 from notifications.models import Level
-from notifications.services import notify
+from notifications.services import notify_many
 
 # Reminders preview helper
-from .utils import will_trigger_on
+from .utils import days_to_expiry, forecast, kind_counts, reminder_kind, triggers_on, with_schedule
 
 
 # ---------- helpers ----------
@@ -77,7 +82,7 @@ def list_documents(request):
 
     q = request.GET.get("q") or ""
     if q:
-        qs = qs.filter(Q(title__icontains=q) | Q(description__icontains=q))
+        qs = matching(qs, q)
 
     return render(
         request, "documents/list.html", {"docs": qs, "q": q, "expiring": expiring}
@@ -131,7 +136,42 @@ def upload_document(request):
             doc.evaluator = doc.supplier.evaluator
 
         doc.uploaded_by = request.user
-        doc.save()
+        # Store the bytes once per evaluator (identical uploads share the
+        # object), outside the transaction; only the row writes are atomic.
+        sha, written = write_file(doc.evaluator_id, form.cleaned_data["file"])
+        with transaction.atomic():
+            blob = acquire(doc.evaluator_id, written, Counter({sha: 1})).get(sha)
+            if blob:
+                doc.blob = blob
+                doc.file = blob.file.name
+                doc.file_size = blob.size
+                doc.save()
+        if blob is None:  # the stored copy was swept meanwhile
+            messages.error(request, "The upload could not be stored. Please try again.")
+            return render(request, "documents/upload.html", {"form": form})
+
+        # Notifications
+        notified = {"notifications": 0}
+        if request.user.role == Roles.SUS:
+            # Supplier uploaded -> notify all EADs of evaluator
+            notified = notify_many(
+                role=Roles.EAD,
+                evaluator=request.user.evaluator_id,
+                title=f"New supplier document: {doc.title}",
+                body=f"{request.user.supplier.name} uploaded a document.",
+                level=Level.INFO,
+                link_url="/documents/",
+            )
+        elif request.user.role in (Roles.EAD, Roles.EVS) and doc.supplier_id:
+            # Evaluator uploaded for a supplier -> notify SUS users
+            notified = notify_many(
+                role=Roles.SUS,
+                supplier=doc.supplier_id,
+                title=f"New document from Evaluator: {doc.title}",
+                body=f"{doc.evaluator.name} uploaded a document.",
+                level=Level.INFO,
+                link_url="/documents/",
+            )
 
         # Audit
         log_event(
@@ -142,35 +182,9 @@ def upload_document(request):
             target=doc,
             evaluator_id=doc.evaluator_id,
             supplier_id=doc.supplier_id,
-            metadata={"title": doc.title, "category": doc.category},
+            metadata={"title": doc.title, "category": doc.category, "notified": notified["notifications"]},
         )
 
-        # Notifications
-        if request.user.role == Roles.SUS:
-            # Supplier uploaded -> notify all EADs of evaluator
-            for ead in request.user.evaluator.users.filter(
-                role=Roles.EAD, is_active=True
-            ):
-                notify(
-                    ead,
-                    f"New supplier document: {doc.title}",
-                    body=f"{request.user.supplier.name} uploaded a document.",
-                    level=Level.INFO,
-                    link_url="/documents/",
-                    email=True,
-                )
-        elif request.user.role in (Roles.EAD, Roles.EVS) and doc.supplier_id:
-            # Evaluator uploaded for a supplier -> notify SUS users
-            for sus in doc.supplier.users.filter(role=Roles.SUS, is_active=True):
-                notify(
-                    sus,
-                    f"New document from Evaluator: {doc.title}",
-                    body=f"{doc.evaluator.name} uploaded a document.",
-                    level=Level.INFO,
-                    link_url="/documents/",
-                    email=True,
-                )
-
         messages.success(request, "Document uploaded.")
         return redirect("documents:list")
 
@@ -185,6 +199,11 @@ def download_document(request, pk: int):
     """
     doc = get_object_or_404(_scope_qs(request.user), pk=pk)
     try:
+        url = doc.file.storage.url(
+            doc.file.name,
+            parameters={"ResponseContentDisposition": f'attachment; filename="{doc.download_name}"'},
+        )
+    except TypeError:  # storage without per-URL parameters
         url = doc.file.url
     except Exception:
         url = None
@@ -193,8 +212,7 @@ def download_document(request, pk: int):
         return redirect(url)
 
     f = doc.file.open("rb")
-    filename = os.path.basename(doc.file.name)
-    return FileResponse(f, as_attachment=True, filename=filename)
+    return FileResponse(f, as_attachment=True, filename=doc.download_name)
 
 
 @login_required
@@ -207,79 +225,110 @@ def download_zip(request):
 
     # Accept both ids and ids[] styles
     ids = request.POST.getlist("ids") or request.POST.getlist("ids[]")
-    docs = list(_scope_qs(request.user).filter(pk__in=ids))
+    docs = [
+        d
+        for d in _scope_qs(request.user).filter(pk__in=ids).only("id", "title", "file", "blob_id", "uploaded_at")
+        if d.file
+    ]
     if not docs:
         messages.warning(request, "No documents selected.")
         return redirect("documents:list")
 
-    mem = io.BytesIO()
-    with zipfile.ZipFile(mem, "w", zipfile.ZIP_DEFLATED) as zf:
-        for d in docs:
-            try:
-                with d.file.open("rb") as fh:
-                    arcname = os.path.basename(d.file.name)
-                    # avoid duplicate names in archive
-                    if zf.namelist().count(arcname):
-                        base, ext = os.path.splitext(arcname)
-                        i = 2
-                        newname = f"{base} ({i}){ext}"
-                        while newname in zf.namelist():
-                            i += 1
-                            newname = f"{base} ({i}){ext}"
-                        arcname = newname
-                    zf.writestr(arcname, fh.read())
-            except Exception:
-                # skip unreadable/missing files
-                continue
-
-    mem.seek(0)
-    resp = HttpResponse(mem.read(), content_type="application/zip")
-    resp["Content-Disposition"] = 'attachment; filename="documents.zip"'
-    return resp
+    # Streamed: each file is read from storage in chunks straight into the
+    # response; unreadable/missing files are skipped.
+    names = unique_arcnames(d.download_name for d in docs)
+    members = (
+        ZipMember(
+            arcname=arcname,
+            open=lambda f=d.file: f.storage.open(f.name, "rb"),
+            date_time=timezone.localtime(d.uploaded_at).timetuple()[:6],
+        )
+        for d, arcname in zip(docs, names)
+    )
+    return zip_response(members, "documents.zip")
 
 
 # ---------- reminders preview (staff/LAD) ----------
 
 
+PREVIEW_PAGE_SIZE = 50
+FORECAST_DAYS = 60
+
+
 @staff_member_required
 def reminders_preview(request):
     """
     Staff preview: which docs would trigger reminders on a chosen date (default: today).
     Uses fixed schedule: 30/14/7/1 pre-expiry, on-day, weekly post-expiry.
+    The schedule is evaluated in the database (see documents.utils) and the
+    matches are paginated; a past ?date= falls back to today with a warning.
+    ?forecast=1 shows reminder volume (documents and activity files) per day
+    for the next FORECAST_DAYS days instead.
     """
+    today = timezone.localdate()
     qd = request.GET.get("date")
+    run_date = today
     if qd:
         try:
             run_date = datetime.strptime(qd, "%Y-%m-%d").date()
         except ValueError:
-            run_date = timezone.localdate()
-    else:
-        run_date = timezone.localdate()
-
-    qs = Document.objects.filter(
-        is_active=True, expires_at__isnull=False
-    ).select_related("evaluator", "supplier", "uploaded_by")
-
-    rows = []
-    summary = {"pre": 0, "on": 0, "post": 0}
-
-    for d in qs:
-        trig = will_trigger_on(d, run_date)
-        if not trig:
-            continue
-        summary[trig.kind] += 1
-        rows.append(
+            messages.warning(request, f"Invalid date “{qd}”; showing {today:%Y-%m-%d} instead.")
+        else:
+            # rows only know their next pending reminder, not the ones already sent
+            if run_date < today:
+                messages.warning(
+                    request, f"Past dates cannot be previewed; showing {today:%Y-%m-%d} instead of {qd}."
+                )
+                run_date = today
+
+    if request.GET.get("forecast"):
+        docs = forecast(Document.objects.all(), TruncDate("expires_at"), run_date, FORECAST_DAYS)
+        files = forecast(ActivityFile.objects.all(), F("expires_on"), run_date, FORECAST_DAYS)
+        days = [
+            {"date": day, "documents": nd, "files": nf, "total": nd + nf}
+            for (day, nd), (_, nf) in zip(docs, files)
+        ]
+        peak = max([d["total"] for d in days] + [1])
+        for d in days:
+            d["pct"] = round(100 * d["total"] / peak)
+        return render(
+            request,
+            "documents/reminders_preview.html",
             {
-                "doc": d,
-                "kind": trig.kind,
-                "days": trig.days,
-                "expires": d.expires_at,
-            }
+                "run_date": run_date,
+                "forecast": days,
+                "forecast_days": FORECAST_DAYS,
+                "forecast_total": sum(d["total"] for d in days),
+            },
+        )
+
+    qs = (
+        with_schedule(
+            Document.objects.filter(is_active=True, expires_at__isnull=False),
+            TruncDate("expires_at"),
+            today,
         )
+        .filter(triggers_on(run_date))
+        .annotate(days=days_to_expiry(run_date))
+    )
+    summary = kind_counts(qs)
 
-    # sort by type then days
-    kind_order = {"pre": 0, "on": 1, "post": 2}
-    rows.sort(key=lambda r: (kind_order[r["kind"]], r["days"]))
+    # pre, then on-day, then post; soonest first within each
+    page_obj = Paginator(
+        qs.select_related("evaluator", "supplier").order_by(
+            Case(When(days__gt=0, then=0), When(days=0, then=1), default=2), "days", "pk"
+        ),
+        PREVIEW_PAGE_SIZE,
+    ).get_page(request.GET.get("page"))
+    rows = [
+        {
+            "doc": d,
+            "kind": reminder_kind(d.days),
+            "days": d.days,
+            "expires": d.expires_at,
+        }
+        for d in page_obj
+    ]
 
     return render(
         request,
@@ -287,6 +336,7 @@ def reminders_preview(request):
         {
             "run_date": run_date,
             "rows": rows,
+            "page_obj": page_obj,
             "summary": summary,
         },
     )
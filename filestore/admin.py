@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from .models import StagedUpload, StoredBlob
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ("sha256", "evaluator", "size", "ref_count", "created_at", "updated_at")
+    list_filter = ("evaluator",)
+    search_fields = ("sha256",)
+    readonly_fields = ("sha256", "size", "file", "ref_count", "created_at", "updated_at")
+
+
+@admin.register(StagedUpload)
+class StagedUploadAdmin(admin.ModelAdmin):
+    list_display = ("name", "created_at")
+    search_fields = ("name",)
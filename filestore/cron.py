@@ -0,0 +1,17 @@
+# filestore/cron.py
+from django.core.management import call_command
+from django_cron import CronJobBase, Schedule
+
+
+class SweepBlobsCron(CronJobBase):
+    """
+    Remove unreferenced blobs and orphaned uploads at 3:00 AM US/Central.
+    Calls the sweep_blobs management command.
+    """
+
+    RUN_AT_TIMES = ["03:00"]
+    schedule = Schedule(run_at_times=RUN_AT_TIMES)
+    code = "filestore.sweep_blobs_cron"
+
+    def do(self):
+        call_command("sweep_blobs")
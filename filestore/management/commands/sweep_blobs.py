@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from filestore import services
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stored blobs unreferenced for FILESTORE_SWEEP_GRACE_SECONDS and objects "
+        "whose upload never committed (staged over FILESTORE_STAGED_TTL_SECONDS ago)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recount",
+            action="store_true",
+            help="Recompute reference counts from activity files and documents first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            fixed = services.recount()
+            self.stdout.write(f"Corrected reference counts on {fixed} blobs.")
+        orphans = services.sweep_staged()
+        n = services.sweep()
+        self.stdout.write(
+            self.style.SUCCESS(f"Removed {orphans} orphaned uploads and {n} unreferenced blobs.")
+        )
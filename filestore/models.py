@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.files.storage import default_storage, storages
+from django.db import models
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+TENANT_BASE = getattr(settings, "LUCID_S3_BASE_PREFIX", "lucid/").strip("/")
+TENANT_BASE = (TENANT_BASE + "/") if TENANT_BASE else ""
+
+
+def blob_storage():
+    """STORAGES["blobs"] when configured (same bucket, no overwrite checks), else default."""
+    if "blobs" in settings.STORAGES:
+        return storages["blobs"]
+    return default_storage
+
+
+def blob_upload_path(instance, filename):
+    """
+    evaluators/<EID>/blobs/<sha[:2]>/<sha>-<token>.<ext>
+
+    The random token gives every blob row its own key: two concurrent uploads
+    of the same content never write to one object, so removing the loser's
+    (or a swept blob's) object cannot take bytes another row points at.
+    """
+    sha = instance.sha256
+    ext = filename.rsplit(".", 1)[-1].lower()[:10] if "." in filename else ""
+    token = get_random_string(8).lower()
+    name = f"{TENANT_BASE}evaluators/{instance.evaluator_id}/blobs/{sha[:2]}/{sha}-{token}"
+    return f"{name}.{ext}" if ext else name
+
+
+class StoredBlob(models.Model):
+    """
+    One stored object per distinct content (SHA-256) per evaluator.
+
+    ActivityFile and Document rows point at a blob (and share its storage
+    key) instead of storing their own copy; `ref_count` counts those rows.
+    Blobs that drop to zero references are removed by `sweep_blobs` after a
+    grace period, so a re-upload shortly after a delete still deduplicates.
+    """
+
+    evaluator = models.ForeignKey(
+        "tenants.Evaluator", on_delete=models.CASCADE, related_name="blobs"
+    )
+    sha256 = models.CharField(max_length=64)
+    size = models.BigIntegerField(default=0)
+    file = models.FileField(upload_to=blob_upload_path, storage=blob_storage, max_length=255)
+    ref_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    # last time ref_count changed; the sweeper's grace period counts from here
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = [("evaluator", "sha256")]
+        indexes = [models.Index(fields=["ref_count", "updated_at"])]
+
+    def __str__(self):
+        return f"{self.sha256[:12]}… ({self.size} bytes, {self.ref_count} refs)"
+
+
+class StagedUpload(models.Model):
+    """
+    A storage object written before the row that references it commits.
+
+    Uploads insert this (outside any transaction) before writing bytes, and
+    the short commit phase deletes it together with inserting the row. Rows
+    older than FILESTORE_STAGED_TTL_SECONDS belong to writes whose commit
+    never happened; `sweep_blobs` deletes their objects.
+    """
+
+    name = models.CharField(max_length=255, db_index=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,257 @@
+"""
+Content-addressed file storage.
+
+Uploads are identified by the SHA-256 of their bytes (computed while the
+request body is received, see filestore.uploadhandler). Per evaluator, each
+distinct content is stored once as a StoredBlob; ActivityFile and Document
+rows reference it and share its storage key.
+
+The write path is split so storage I/O never runs inside a transaction:
+
+1. `lookup()` the digests that are already stored (byte-less attaches
+   only see the blobs the uploading supplier already references);
+2. `reserve()` keys for the missing ones, `stage()` them, `put()` the bytes;
+3. `acquire()` inside the caller's (short) transaction: insert the new
+   blobs, take the references in bulk and unstage the keys.
+
+Any upload that writes an object before its row commits stages the key the
+same way; `sweep_staged()` deletes objects whose commit never happened.
+filestore.signals releases a reference when a row is deleted; `sweep()`
+removes blobs that have had no references for GRACE_SECONDS.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import StagedUpload, StoredBlob, blob_storage, blob_upload_path
+
+CHUNK_SIZE = 1024 * 1024
+GRACE_SECONDS = int(getattr(settings, "FILESTORE_SWEEP_GRACE_SECONDS", 24 * 3600))
+# Must outlive the slowest legitimate upload (direct uploads: ACTIVITY_UPLOAD_TOKEN_MAX_AGE).
+STAGED_TTL_SECONDS = int(getattr(settings, "FILESTORE_STAGED_TTL_SECONDS", 2 * 24 * 3600))
+
+
+def digest(fh) -> tuple[str, int]:
+    """(sha256 hex, byte count) of a readable file object, read in chunks."""
+    h = hashlib.sha256()
+    n = 0
+    for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+        h.update(chunk)
+        n += len(chunk)
+    return h.hexdigest(), n
+
+
+def file_digest(f) -> str:
+    """Digest of an uploaded file: the one taken on receipt, else read it once."""
+    sha = getattr(f, "sha256", None)
+    if sha:
+        return sha
+    f.seek(0)
+    sha = digest(f)[0]
+    f.seek(0)
+    return sha
+
+
+def lookup(evaluator_id, shas, *, supplier_id=None) -> dict:
+    """
+    {sha256: StoredBlob} for the digests the evaluator already stores. With
+    `supplier_id`, only blobs one of that supplier's own ActivityFiles or
+    Documents references: knowing a digest is not proof of holding the bytes,
+    so byte-less attaches must not reach other suppliers' content.
+    """
+    shas = set(shas)
+    if not shas:
+        return {}
+    qs = StoredBlob.objects.filter(evaluator_id=evaluator_id, sha256__in=shas)
+    if supplier_id is not None:
+        from activities.models import ActivityFile
+        from documents.models import Document
+
+        qs = qs.filter(
+            Exists(ActivityFile.objects.filter(blob=OuterRef("pk"), activity__supplier_id=supplier_id))
+            | Exists(Document.objects.filter(blob=OuterRef("pk"), supplier_id=supplier_id))
+        )
+    return {b.sha256: b for b in qs}
+
+
+# ---------- staged writes ----------
+
+
+def stage(names) -> None:
+    """Record keys about to be written, before any bytes go out (autocommit)."""
+    rows = [StagedUpload(name=n) for n in names]
+    if rows:
+        StagedUpload.objects.bulk_create(rows)
+
+
+def unstage(names) -> None:
+    """Forget staged keys; call in the transaction that commits their rows."""
+    names = list(names)
+    if names:
+        StagedUpload.objects.filter(name__in=names).delete()
+
+
+# ---------- blobs ----------
+
+
+def reserve(evaluator_id, sha256: str, size: int, original_name: str) -> StoredBlob:
+    """An unsaved blob with its key chosen; `stage()` the key, then `put()`."""
+    blob = StoredBlob(evaluator_id=evaluator_id, sha256=sha256, size=size)
+    blob.file.name = blob_upload_path(blob, original_name)
+    return blob
+
+
+def put(blob: StoredBlob, fh) -> StoredBlob:
+    """Write `fh` to the blob's reserved key. The row is inserted by `acquire()`."""
+    content = File(fh, name=blob.file.name)
+    content.size = blob.size
+    name = blob.file.storage.save(blob.file.name, content)
+    if name != blob.file.name:  # the storage picked another key
+        stage([name])
+        unstage([blob.file.name])
+        blob.file.name = name
+    return blob
+
+
+def _delete_objects(names, storage=None) -> None:
+    storage = storage or blob_storage()
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception:
+            pass
+
+
+def _add_refs(by_pk: dict) -> None:
+    """Apply {blob pk: delta} with one UPDATE per distinct delta."""
+    groups = defaultdict(list)
+    for pk, n in by_pk.items():
+        if n:
+            groups[n].append(pk)
+    now = timezone.now()
+    for n, pks in groups.items():
+        StoredBlob.objects.filter(pk__in=pks).update(
+            ref_count=Greatest(F("ref_count") + n, 0), updated_at=now
+        )
+
+
+def acquire(evaluator_id, written, counts: Counter) -> dict:
+    """
+    In the caller's transaction: insert the blobs `put()` wrote and add
+    `counts[sha]` references. A concurrent upload of the same content may
+    have inserted first; our copy is then deleted after commit and its row
+    used instead. Returns {sha256: StoredBlob} for the digests in `counts`.
+    """
+    if written:
+        StoredBlob.objects.bulk_create(written, ignore_conflicts=True)
+        unstage(b.file.name for b in written)
+    blobs = lookup(evaluator_id, counts)
+    ours = {b.file.name for b in blobs.values()}
+    lost = [b.file.name for b in written if b.file.name not in ours]
+    if lost:
+        transaction.on_commit(lambda: _delete_objects(lost))
+    _add_refs({blobs[sha].pk: n for sha, n in counts.items() if sha in blobs})
+    return blobs
+
+
+def write_file(evaluator_id, f, original_name: str | None = None) -> tuple[str, list]:
+    """
+    Storage phase for one uploaded file: (sha256, blobs written). Run it
+    outside any transaction, then `acquire()` in the one that saves the row
+    pointing at the blob.
+    """
+    sha = file_digest(f)
+    if sha in lookup(evaluator_id, [sha]):
+        return sha, []
+    blob = reserve(evaluator_id, sha, f.size, original_name or getattr(f, "name", "") or "upload.bin")
+    stage([blob.file.name])
+    f.seek(0)
+    return sha, [put(blob, f)]
+
+
+def release(blob_ids) -> None:
+    """Drop one reference per blob id (repeat an id to drop several)."""
+    _add_refs({pk: -n for pk, n in Counter(pk for pk in blob_ids if pk).items()})
+
+
+# ---------- maintenance ----------
+
+
+def sweep(*, grace_seconds: int = GRACE_SECONDS, batch: int = 500) -> int:
+    """Delete blobs unreferenced for `grace_seconds`, rows first. Returns blobs removed."""
+    cutoff = timezone.now() - timedelta(seconds=grace_seconds)
+    removed = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                StoredBlob.objects.select_for_update(skip_locked=True)
+                .filter(ref_count=0, updated_at__lt=cutoff)
+                .values_list("pk", "file")[:batch]
+            )
+            if not rows:
+                return removed
+            StoredBlob.objects.filter(pk__in=[pk for pk, _ in rows], ref_count=0).delete()
+        _delete_objects(name for _, name in rows)
+        removed += len(rows)
+
+
+def _referenced(names) -> set:
+    """The subset of storage keys some committed row points at."""
+    from activities.models import ActivityFile, ActivityZip
+    from documents.models import Document
+
+    names = set(names)
+    found = set(StoredBlob.objects.filter(file__in=names).values_list("file", flat=True))
+    found |= set(ActivityFile.objects.filter(file__in=names).values_list("file", flat=True))
+    found |= set(Document.objects.filter(file__in=names).values_list("file", flat=True))
+    found |= set(ActivityZip.objects.filter(zip_file__in=names).values_list("zip_file", flat=True))
+    return found
+
+
+def sweep_staged(*, ttl_seconds: int = STAGED_TTL_SECONDS, batch: int = 500) -> int:
+    """Delete objects staged over `ttl_seconds` ago that no row took. Returns objects removed."""
+    cutoff = timezone.now() - timedelta(seconds=ttl_seconds)
+    removed = 0
+    while True:
+        rows = list(
+            StagedUpload.objects.filter(created_at__lt=cutoff).order_by("id").values_list("pk", "name")[:batch]
+        )
+        if not rows:
+            return removed
+        keep = _referenced(name for _, name in rows)
+        orphans = [name for _, name in rows if name not in keep]
+        _delete_objects(orphans, default_storage)
+        StagedUpload.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+        removed += len(orphans)
+
+
+def recount() -> int:
+    """Recompute ref_count from the referencing tables. Returns blobs corrected."""
+    from activities.models import ActivityFile
+    from documents.models import Document
+
+    refs = Counter()
+    for model in (ActivityFile, Document):
+        rows = model.objects.filter(blob__isnull=False).values("blob_id").annotate(n=Count("pk")).order_by()
+        for r in rows:
+            refs[r["blob_id"]] += r["n"]
+
+    fixed = 0
+    now = timezone.now()
+    with transaction.atomic():
+        for pk, current in StoredBlob.objects.select_for_update().values_list("pk", "ref_count"):
+            if current != refs.get(pk, 0):
+                StoredBlob.objects.filter(pk=pk).update(ref_count=refs.get(pk, 0), updated_at=now)
+                fixed += 1
+    return fixed
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from activities.models import ActivityFile
+from documents.models import Document
+
+from . import services
+
+
+# ---------- blob references ----------
+
+
+@receiver(post_delete, sender=ActivityFile)
+@receiver(post_delete, sender=Document)
+def blob_reference_deleted(sender, instance, **kwargs):
+    if instance.blob_id:
+        services.release([instance.blob_id])
@@ -0,0 +1,97 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.utils import timezone
+
+from activities.models import Activity, ActivityFile
+from documents.models import Document
+from tenants.testing import TenantFixture, make_evaluator
+
+from . import services
+from .models import StagedUpload, StoredBlob, blob_storage
+
+
+class BlobTests(TenantFixture, TestCase):
+    def store(self, data=b"content"):
+        """What an upload view does: write outside the transaction, then acquire + insert."""
+        f = SimpleUploadedFile("a.pdf", data)
+        sha, written = services.write_file(self.ev.pk, f)
+        blob = services.acquire(self.ev.pk, written, Counter({sha: 1}))[sha]
+        doc = Document.objects.create(
+            evaluator=self.ev, supplier=self.sup, title="doc", blob=blob, file=blob.file.name, file_size=blob.size
+        )
+        return blob, doc
+
+    def age(self, blob, seconds=services.GRACE_SECONDS + 1):
+        StoredBlob.objects.filter(pk=blob.pk).update(updated_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_same_content_is_stored_once(self):
+        first, _ = self.store()
+        second, _ = self.store()
+        self.assertEqual(first.pk, second.pk)
+        blob = StoredBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob_storage().open(blob.file.name).read(), b"content")
+        self.assertFalse(StagedUpload.objects.exists())
+
+    def test_other_evaluators_do_not_share(self):
+        blob, _ = self.store()
+        other = make_evaluator("other")
+        _, written = services.write_file(other.pk, SimpleUploadedFile("a.pdf", b"content"))
+        self.assertEqual(len(written), 1)
+        self.assertNotEqual(written[0].file.name, blob.file.name)
+
+    def test_delete_releases_and_sweep_removes_unreferenced(self):
+        blob, doc = self.store()
+        _, doc2 = self.store()
+        doc.delete()
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        doc2.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 0)
+
+        # still in its grace period: a re-upload would reuse it
+        self.assertEqual(services.sweep(), 0)
+        self.age(blob)
+        self.assertEqual(services.sweep(), 1)
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(blob_storage().exists(blob.file.name))
+
+    def test_referenced_blobs_are_never_swept(self):
+        blob, _ = self.store()
+        self.age(blob)
+        self.assertEqual(services.sweep(grace_seconds=0), 0)
+        self.assertTrue(blob_storage().exists(blob.file.name))
+
+    def test_release_never_goes_below_zero(self):
+        blob, _ = self.store()
+        services.release([blob.pk, blob.pk, blob.pk])
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 0)
+
+    def test_recount_fixes_drift(self):
+        blob, _ = self.store()
+        activity = Activity.objects.create(evaluator=self.ev, supplier=self.sup)
+        ActivityFile.objects.create(activity=activity, original_name="a.pdf", file=blob.file.name, blob=blob)
+        StoredBlob.objects.filter(pk=blob.pk).update(ref_count=9)
+        self.assertEqual(services.recount(), 1)
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(services.recount(), 0)
+
+    def test_sweep_staged_removes_only_orphans(self):
+        orphan = default_storage.save("staged/orphan.bin", ContentFile(b"x"))
+        kept = default_storage.save("staged/kept.bin", ContentFile(b"y"))
+        services.stage([orphan, kept])
+        Document.objects.create(evaluator=self.ev, supplier=self.sup, title="doc", file=kept, file_size=1)
+
+        self.assertEqual(services.sweep_staged(), 0)  # too young
+        StagedUpload.objects.update(created_at=timezone.now() - timedelta(seconds=services.STAGED_TTL_SECONDS + 1))
+        self.assertEqual(services.sweep_staged(), 1)
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(kept))
+        self.assertFalse(StagedUpload.objects.exists())
@@ -0,0 +1,38 @@
+"""
+Upload handlers that hash files while Django receives them.
+
+Drop-in replacements for Django's default handlers (see FILE_UPLOAD_HANDLERS):
+the handler that ends up holding the file hashes each chunk as it stores it
+and sets `sha256` on the resulting UploadedFile, so deduplication never
+re-reads an upload.
+"""
+
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingMixin:
+    def new_file(self, *args, **kwargs):
+        self._sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        passed_on = super().receive_data_chunk(raw_data, start)
+        if passed_on is None:  # this handler kept the chunk
+            self._sha256.update(raw_data)
+        return passed_on
+
+    def file_complete(self, file_size):
+        f = super().file_complete(file_size)
+        if f is not None:
+            f.sha256 = self._sha256.hexdigest()
+        return f
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    pass
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "attempts", "run_at", "duration_ms", "created_at")
+    list_filter = ("status", "name")
+    search_fields = ("name", "key")
+    readonly_fields = ("last_error", "started_at", "finished_at", "duration_ms", "locked_by", "locked_at")
@@ -0,0 +1,18 @@
+# jobs/cron.py
+from django.core.management import call_command
+from django_cron import CronJobBase, Schedule
+
+
+class RunJobsCron(CronJobBase):
+    """
+    Run due background jobs every minute.
+    Calls run_workers --burst; run `manage.py run_workers` as a long-lived
+    process instead for lower latency.
+    """
+
+    RUN_EVERY_MINS = 1
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = "jobs.run_workers_cron"
+
+    def do(self):
+        call_command("run_workers", burst=True)
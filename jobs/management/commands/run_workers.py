@@ -0,0 +1,107 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+
+from jobs import services
+
+
+class Command(BaseCommand):
+    help = "Run background job workers against the database queue (Ctrl+C / SIGTERM to stop)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="Worker threads (default 1).")
+        parser.add_argument(
+            "--sleep", type=float, default=2.0, help="Seconds to wait when the queue is empty."
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Run until the queue is empty, then exit (for cron or tests).",
+        )
+        parser.add_argument(
+            "--only", action="append", default=None, help="Only run jobs with this name (repeatable)."
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        previous = {}
+        # a --burst run (cron, call_command) ends by itself; leave the
+        # caller's handlers alone
+        if not options["burst"] and threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                previous[sig] = signal.signal(sig, lambda *_: stop.set())
+        try:
+            self._run(stop, options)
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+    def _run(self, stop, options):
+        n = max(1, options["workers"])
+        base = f"{socket.gethostname()}:{os.getpid()}"
+        self._requeue_stale()
+
+        threads = [
+            threading.Thread(
+                target=self._loop,
+                args=(f"{base}:{i}", stop, options),
+                name=f"job-worker-{i}",
+                daemon=True,
+            )
+            for i in range(n)
+        ]
+        for t in threads:
+            t.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {n} job worker(s)."))
+        # jobs of workers that died elsewhere go back to the queue while we run
+        next_requeue = time.monotonic() + services.HEARTBEAT_SECONDS
+        try:
+            while any(t.is_alive() for t in threads):
+                for t in threads:
+                    t.join(timeout=0.5)
+                if time.monotonic() >= next_requeue:
+                    self._requeue_stale()
+                    next_requeue = time.monotonic() + services.HEARTBEAT_SECONDS
+        except KeyboardInterrupt:
+            stop.set()
+        for t in threads:
+            t.join()
+        self.stdout.write("Workers stopped.")
+
+    def _requeue_stale(self):
+        close_old_connections()
+        try:
+            stale = services.requeue_stale()
+        except DatabaseError as exc:
+            self.stderr.write(f"requeue of stale jobs failed: {exc}")
+            return
+        if stale:
+            self.stdout.write(f"Requeued {stale} stale jobs.")
+
+    def _loop(self, worker, stop, options):
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                try:
+                    job = services.claim_next(worker, options.get("only"))
+                except DatabaseError as exc:
+                    # e.g. SQLite "database is locked" with several workers
+                    self.stderr.write(f"[{worker}] claim failed: {exc}")
+                    stop.wait(options["sleep"])
+                    continue
+                if job is None:
+                    if options["burst"]:
+                        break
+                    stop.wait(options["sleep"])
+                    continue
+                ok = services.run_job(job)
+                self.stdout.write(
+                    f"[{worker}] {job.name} #{job.pk} {'done' if ok else 'failed'} in {job.duration_ms} ms"
+                )
+        finally:
+            connection.close()
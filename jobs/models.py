@@ -0,0 +1,55 @@
+from django.db import models
+from django.utils import timezone
+
+
+class JobStatus(models.TextChoices):
+    QUEUED = "queued", "Queued"
+    RUNNING = "running", "Running"
+    DONE = "done", "Done"
+    FAILED = "failed", "Failed"
+
+
+class Job(models.Model):
+    """
+    A unit of deferred work, stored in the main database (no broker).
+
+    Workers (`manage.py run_workers`, or its --burst run from
+    jobs.cron.RunJobsCron every minute) claim queued jobs whose `run_at` has
+    passed, run the handler registered under `name` with `payload`, and record
+    timing. A running job refreshes `locked_at` as a heartbeat; one that
+    stops beating is handed out again. Failures are retried with exponential backoff until `max_attempts`.
+    `key` makes enqueueing idempotent: a second enqueue with the same key
+    returns the existing job instead of creating another.
+    """
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+
+    status = models.CharField(
+        max_length=10, choices=JobStatus.choices, default=JobStatus.QUEUED
+    )
+    priority = models.SmallIntegerField(default=0)  # lower runs first
+    run_at = models.DateTimeField(default=timezone.now)
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    last_error = models.TextField(blank=True)
+
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "priority", "run_at"]),
+            models.Index(fields=["name", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
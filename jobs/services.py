@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job, JobStatus
+
+log = logging.getLogger(__name__)
+
+# name -> callable(payload: dict); filled by @register in each app's tasks module
+HANDLERS: dict = {}
+
+BACKOFF_BASE_SECONDS = int(getattr(settings, "JOBS_BACKOFF_BASE_SECONDS", 30))
+BACKOFF_MAX_SECONDS = int(getattr(settings, "JOBS_BACKOFF_MAX_SECONDS", 3600))
+# A RUNNING job whose worker went silent for this long is handed out again.
+LOCK_TIMEOUT_SECONDS = int(getattr(settings, "JOBS_LOCK_TIMEOUT_SECONDS", 1800))
+# How often a running job refreshes its lock; well inside the timeout.
+HEARTBEAT_SECONDS = int(getattr(settings, "JOBS_HEARTBEAT_SECONDS", max(LOCK_TIMEOUT_SECONDS // 5, 1)))
+
+
+def register(name: str):
+    """
+    Usage:
+        @register("activities.finalize")
+        def finalize(payload): ...
+    """
+
+    def deco(fn):
+        HANDLERS[name] = fn
+        return fn
+
+    return deco
+
+
+# ---------- enqueue ----------
+
+
+def enqueue(
+    name: str,
+    payload: dict | None = None,
+    *,
+    key: str | None = None,
+    run_at=None,
+    priority: int = 0,
+    max_attempts: int = 5,
+) -> Job:
+    """
+    Queue `name` with `payload`. Runs in the caller's transaction, so the job
+    only becomes visible to workers if the surrounding work commits.
+    With `key`, an existing job under that key is returned instead.
+    """
+    if name not in HANDLERS:
+        raise ValueError(f"No job handler registered for '{name}'")
+    fields = dict(
+        name=name,
+        payload=payload or {},
+        run_at=run_at or timezone.now(),
+        priority=priority,
+        max_attempts=max_attempts,
+    )
+    if not key:
+        return Job.objects.create(**fields)
+    existing = Job.objects.filter(key=key).first()
+    if existing:
+        return existing
+    try:
+        with transaction.atomic():
+            return Job.objects.create(key=key, **fields)
+    except IntegrityError:
+        return Job.objects.get(key=key)
+
+
+# ---------- workers ----------
+
+
+def backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS))
+
+
+def requeue_stale() -> int:
+    """Hand RUNNING jobs of dead workers back to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=LOCK_TIMEOUT_SECONDS)
+    return Job.objects.filter(status=JobStatus.RUNNING, locked_at__lt=cutoff).update(
+        status=JobStatus.QUEUED, locked_by="", locked_at=None
+    )
+
+
+def claim_next(worker: str, names=None) -> Job | None:
+    """
+    Claim the next due job. SKIP LOCKED keeps concurrent workers off each
+    other's rows on Postgres; the conditional UPDATE makes the claim safe on
+    backends without row locks (SQLite).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        qs = Job.objects.filter(status=JobStatus.QUEUED, run_at__lte=now)
+        if names:
+            qs = qs.filter(name__in=names)
+        job = (
+            qs.select_for_update(skip_locked=True)
+            .order_by("priority", "run_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        claimed = Job.objects.filter(pk=job.pk, status=JobStatus.QUEUED).update(
+            status=JobStatus.RUNNING,
+            locked_by=worker,
+            locked_at=now,
+            started_at=now,
+            attempts=F("attempts") + 1,
+        )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def heartbeat(job: Job) -> bool:
+    """Refresh the lock of a job this worker still holds. False once it lost it."""
+    return bool(
+        Job.objects.filter(pk=job.pk, status=JobStatus.RUNNING, locked_by=job.locked_by).update(
+            locked_at=timezone.now()
+        )
+    )
+
+
+class _Heartbeat:
+    """
+    Beat for `job` from a side thread while the handler runs. Not inside a
+    transaction: the claim is not visible to other workers yet, and the
+    thread's UPDATE would wait on the caller's own row lock.
+    """
+
+    def __init__(self, job: Job):
+        self.job = job
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"job-heartbeat-{job.pk}", daemon=True)
+
+    def _run(self):
+        try:
+            while not self.done.wait(HEARTBEAT_SECONDS):
+                try:
+                    if not heartbeat(self.job):
+                        log.warning("job %s #%s lost its lock", self.job.name, self.job.pk)
+                        return
+                except DatabaseError:
+                    log.warning("job %s #%s heartbeat failed", self.job.name, self.job.pk, exc_info=True)
+        finally:
+            connection.close()
+
+    def __enter__(self):
+        if not connection.in_atomic_block:
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.done.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+
+def _finish(job: Job, **fields) -> None:
+    """
+    Record the outcome and unlock, unless the worker lost the job (requeued
+    as stale) meanwhile; the outcome then belongs to whoever holds it now.
+    """
+    saved = Job.objects.filter(pk=job.pk, status=JobStatus.RUNNING, locked_by=job.locked_by).update(
+        locked_by="", locked_at=None, **fields
+    )
+    if not saved:
+        log.warning("job %s #%s lost its lock; outcome not recorded", job.name, job.pk)
+    for k, v in fields.items():
+        setattr(job, k, v)
+    job.locked_by, job.locked_at = "", None
+
+
+def run_job(job: Job) -> bool:
+    """Run a claimed job and record the outcome. Returns True on success."""
+    handler = HANDLERS.get(job.name)
+    started = time.monotonic()
+    try:
+        if handler is None:
+            raise LookupError(f"No job handler registered for '{job.name}'")
+        with _Heartbeat(job):
+            handler(job.payload or {})
+    except Exception:
+        fields = dict(
+            last_error=traceback.format_exc()[-5000:],
+            duration_ms=int((time.monotonic() - started) * 1000),
+        )
+        if job.attempts < job.max_attempts and handler is not None:
+            fields.update(status=JobStatus.QUEUED, run_at=timezone.now() + backoff(job.attempts))
+        else:
+            fields.update(status=JobStatus.FAILED, finished_at=timezone.now())
+        _finish(job, **fields)
+        log.warning("job %s #%s failed (attempt %s/%s)", job.name, job.pk, job.attempts, job.max_attempts)
+        return False
+
+    _finish(
+        job,
+        status=JobStatus.DONE,
+        finished_at=timezone.now(),
+        duration_ms=int((time.monotonic() - started) * 1000),
+    )
+    return True
+
+
+def run_pending(worker: str = "inline", *, limit: int | None = None, names=None) -> int:
+    """Run due jobs until the queue is empty (or `limit`). Returns jobs run."""
+    done = 0
+    while limit is None or done < limit:
+        job = claim_next(worker, names)
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
@@ -0,0 +1,196 @@
+import signal
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import services
+from .cron import RunJobsCron
+from .models import Job, JobStatus
+
+
+def _noop(payload):
+    pass
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        handlers = {"test.ok": _noop, "test.fail": mock.Mock(side_effect=RuntimeError("boom"))}
+        patcher = mock.patch.dict(services.HANDLERS, handlers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_enqueue_unknown_name(self):
+        with self.assertRaises(ValueError):
+            services.enqueue("test.missing")
+
+    def test_enqueue_with_key_is_idempotent(self):
+        first = services.enqueue("test.ok", {"n": 1}, key="k1")
+        again = services.enqueue("test.ok", {"n": 2}, key="k1")
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_claim_order_and_due_time(self):
+        now = timezone.now()
+        later = services.enqueue("test.ok", run_at=now + timedelta(hours=1))
+        low = services.enqueue("test.ok", priority=5)
+        high = services.enqueue("test.ok", priority=-1)
+
+        claimed = [services.claim_next("w1"), services.claim_next("w1"), services.claim_next("w1")]
+        self.assertEqual([j.pk if j else None for j in claimed], [high.pk, low.pk, None])
+        self.assertEqual(claimed[0].status, JobStatus.RUNNING)
+        self.assertEqual(claimed[0].locked_by, "w1")
+        self.assertEqual(claimed[0].attempts, 1)
+        later.refresh_from_db()
+        self.assertEqual(later.status, JobStatus.QUEUED)
+
+    def test_claim_filters_by_name(self):
+        services.enqueue("test.ok")
+        self.assertIsNone(services.claim_next("w1", names=["test.fail"]))
+        self.assertIsNotNone(services.claim_next("w1", names=["test.ok"]))
+
+    def test_success(self):
+        job = services.enqueue("test.ok")
+        self.assertEqual(services.run_pending("w1"), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.DONE)
+        self.assertEqual(job.locked_by, "")
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failure_is_retried_with_backoff(self):
+        job = services.enqueue("test.fail", max_attempts=2)
+        before = timezone.now()
+        with self.assertLogs("jobs.services", "WARNING"):
+            self.assertEqual(services.run_pending("w1"), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("boom", job.last_error)
+        self.assertGreaterEqual(job.run_at, before + services.backoff(1))
+        # not due yet
+        self.assertIsNone(services.claim_next("w1"))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs("jobs.services", "WARNING"):
+            services.run_pending("w1")
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        base = services.BACKOFF_BASE_SECONDS
+        self.assertEqual(services.backoff(1), timedelta(seconds=base))
+        self.assertEqual(services.backoff(3), timedelta(seconds=base * 4))
+        self.assertEqual(services.backoff(50), timedelta(seconds=services.BACKOFF_MAX_SECONDS))
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = services.enqueue("test.ok")
+        services.claim_next("w1")
+        stale = timezone.now() - timedelta(seconds=services.LOCK_TIMEOUT_SECONDS + 1)
+        fresh = services.enqueue("test.ok")
+        services.claim_next("w2")
+        Job.objects.filter(pk=job.pk).update(locked_at=stale)
+
+        self.assertEqual(services.requeue_stale(), 1)
+        job.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (JobStatus.QUEUED, ""))
+        self.assertEqual(fresh.status, JobStatus.RUNNING)
+
+    def test_heartbeat_refreshes_the_lock_of_its_holder_only(self):
+        services.enqueue("test.ok")
+        job = services.claim_next("w1")
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertTrue(services.heartbeat(job))
+        self.assertEqual(services.requeue_stale(), 0)
+        Job.objects.filter(pk=job.pk).update(locked_by="w2")
+        self.assertFalse(services.heartbeat(job))
+
+    def test_outcome_of_a_lost_job_is_not_recorded(self):
+        services.enqueue("test.ok")
+        job = services.claim_next("w1")
+        # requeued as stale and claimed again while w1 was still running it
+        Job.objects.filter(pk=job.pk).update(status=JobStatus.QUEUED, locked_by="", locked_at=None)
+        again = services.claim_next("w2")
+
+        with self.assertLogs("jobs.services", "WARNING"):
+            self.assertTrue(services.run_job(job))
+        again.refresh_from_db()
+        self.assertEqual((again.status, again.locked_by), (JobStatus.RUNNING, "w2"))
+
+    def test_cron_runs_a_burst(self):
+        with mock.patch("jobs.cron.call_command") as cmd:
+            RunJobsCron().do()
+        cmd.assert_called_once_with("run_workers", burst=True)
+
+
+class RunWorkersCommandTests(TransactionTestCase):
+    """Worker threads use their own connections, so rows must be committed."""
+
+    def setUp(self):
+        patcher = mock.patch.dict(services.HANDLERS, {"test.ok": _noop, "test.wait": self.wait_for_requeue})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def wait_for_requeue(payload):
+        # a job of a dead worker, gone stale while this one runs
+        stale = Job.objects.create(
+            name="test.ok",
+            status=JobStatus.RUNNING,
+            locked_by="dead",
+            locked_at=timezone.now() - timedelta(seconds=services.LOCK_TIMEOUT_SECONDS + 1),
+        )
+        deadline = time.monotonic() + 10
+        while Job.objects.filter(pk=stale.pk, status=JobStatus.RUNNING).exists():
+            if time.monotonic() > deadline:
+                raise AssertionError("stale job was not requeued")
+            time.sleep(0.05)
+
+    def test_burst_requeues_stale_jobs_while_running(self):
+        services.enqueue("test.wait")
+        before = signal.getsignal(signal.SIGTERM)
+        with mock.patch.object(services, "HEARTBEAT_SECONDS", 0.1):
+            call_command("run_workers", burst=True, stdout=mock.Mock())
+
+        self.assertEqual(list(Job.objects.values_list("status", flat=True)), [JobStatus.DONE] * 2)
+        self.assertIs(signal.getsignal(signal.SIGTERM), before)
+
+
+@skipUnless(connection.features.has_select_for_update_skip_locked, "needs SKIP LOCKED")
+class ConcurrentClaimTests(TransactionTestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(services.HANDLERS, {"test.ok": _noop})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_locked_row_is_skipped(self):
+        first = services.enqueue("test.ok")
+        second = services.enqueue("test.ok")
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    Job.objects.select_for_update().get(pk=first.pk)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        t = threading.Thread(target=hold_lock)
+        t.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            job = services.claim_next("w1")
+        finally:
+            release.set()
+            t.join()
+        self.assertEqual(job.pk, second.pk)
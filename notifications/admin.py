@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Notification
+from django.utils import timezone
+
+from .models import Notification, OutboundEmail, OutboxStatus
 
 
 @admin.register(Notification)
@@ -8,3 +10,19 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter = ("level",)
     search_fields = ("recipient__email", "title", "body", "link_url")
     readonly_fields = ("created_at", "read_at")
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ("to_email", "subject", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status", "domain")
+    search_fields = ("to_email", "subject")
+    readonly_fields = ("notification", "domain", "last_error", "locked_by", "locked_at", "created_at", "sent_at")
+    actions = ["retry"]
+
+    @admin.action(description="Retry selected emails now")
+    def retry(self, request, queryset):
+        n = queryset.exclude(status=OutboxStatus.SENT).update(
+            status=OutboxStatus.PENDING, attempts=0, next_attempt_at=timezone.now(), locked_by="", locked_at=None
+        )
+        self.message_user(request, f"Requeued {n} email(s).")
@@ -0,0 +1,106 @@
+"""
+Per-user notification summary for the page header.
+
+The unread count, the recent list and the rendered offcanvas panel are
+cached under a per-user generation counter that every change to the user's
+notifications bumps, so stale entries are simply never read again and age
+out. Nothing is adjusted in place: after a change the next read recounts.
+
+Bumps run after commit, so a concurrent reader can't cache pre-commit state
+under the new generation. They come from whichever process made the change
+(a web worker, run_workers, cron), so this only works on a shared cache
+backend; on a per-process one (see core.cache) every read hits the database.
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from core.cache import is_shared
+
+
+TIMEOUT = int(getattr(settings, "NOTIFICATIONS_CACHE_TIMEOUT", 300))
+
+RECENT_LIMIT = 10
+
+
+def _gen_key(user_id) -> str:
+    return f"notif:gen:{user_id}"
+
+
+def generation(user_id) -> int:
+    key = _gen_key(user_id)
+    # Seed from the clock so an evicted counter never reuses an old generation.
+    cache.add(key, time.time_ns() // 1000, timeout=None)
+    return cache.get(key) or 0
+
+
+def _bump(user_id) -> None:
+    try:
+        cache.incr(_gen_key(user_id))
+    except ValueError:
+        cache.add(_gen_key(user_id), time.time_ns() // 1000, timeout=None)
+
+
+# ---------- reads ----------
+
+
+def _cached(user_id, name: str, build):
+    if not is_shared():
+        return build()
+    key = f"notif:{name}:{user_id}:{generation(user_id)}"
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, TIMEOUT)
+    return value
+
+
+def unread_count(user_id) -> int:
+    from .models import Notification
+
+    return _cached(
+        user_id,
+        "unread",
+        lambda: Notification.objects.filter(recipient_id=user_id, read_at__isnull=True).count(),
+    )
+
+
+def recent(user_id) -> list:
+    """The user's latest notifications, newest first."""
+    from .models import Notification
+
+    return _cached(
+        user_id,
+        "recent",
+        lambda: list(Notification.objects.filter(recipient_id=user_id).order_by("-created_at")[:RECENT_LIMIT]),
+    )
+
+
+def panel_html(request) -> str:
+    """The rendered offcanvas panel for request.user."""
+    user_id = request.user.pk
+    return _cached(
+        user_id,
+        "panel",
+        lambda: render_to_string("notifications/panel.html", {"notifications": recent(user_id)}, request=request),
+    )
+
+
+# ---------- writes ----------
+
+
+def changed(*user_ids) -> None:
+    """Invalidate the users' cached summaries once the current transaction commits."""
+
+    def apply():
+        for user_id in set(user_ids):
+            _bump(user_id)
+
+    if user_ids:
+        transaction.on_commit(apply)
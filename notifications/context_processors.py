@@ -1,19 +1,20 @@
-from .models import Notification
+from functools import partial
+
+from . import cache
 
 
 def notifications_context(request):
-    """Provide recent notifications + unread count without filtering a sliced QS."""
+    """
+    Recent notifications + unread count for the header, served from
+    notifications.cache. Both are callables, which templates resolve on
+    first use, so pages (redirects, fragments) that never show the header
+    don't touch the cache or the database at all.
+    """
     user = getattr(request, "user", None)
     if not user or not user.is_authenticated:
         return {}
 
-    base_qs = Notification.objects.filter(recipient=user)
-    # Compute unread on the full queryset (no slice yet)
-    unread = base_qs.filter(read_at__isnull=True).count()
-    # Slice only after all filters are applied
-    recent = list(base_qs.order_by("-created_at")[:10])
-
     return {
-        "notifications_recent": recent,
-        "notifications_unread": unread,
+        "notifications_recent": partial(cache.recent, user.pk),
+        "notifications_unread": partial(cache.unread_count, user.pk),
     }
@@ -0,0 +1,18 @@
+# notifications/cron.py
+from django.core.management import call_command
+from django_cron import CronJobBase, Schedule
+
+
+class SendOutboxCron(CronJobBase):
+    """
+    Deliver queued notification emails every minute.
+    Calls send_outbox --burst; run `manage.py send_outbox` as a long-lived
+    process instead for lower latency.
+    """
+
+    RUN_EVERY_MINS = 1
+    schedule = Schedule(run_every_mins=RUN_EVERY_MINS)
+    code = "notifications.send_outbox_cron"
+
+    def do(self):
+        call_command("send_outbox", burst=True)
@@ -0,0 +1,77 @@
+# notifications/management/commands/send_outbox.py
+import os
+import signal
+import socket
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from notifications import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbox emails over a reused SMTP connection (Ctrl+C / SIGTERM to stop)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch", type=int, default=outbox.BATCH_SIZE, help="Rows claimed per round trip."
+        )
+        parser.add_argument(
+            "--sleep", type=float, default=5.0, help="Seconds to wait when nothing is due."
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Send everything due, then exit (for cron or tests).",
+        )
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        previous = {}
+        # a --burst run (cron, call_command) ends by itself; leave the
+        # caller's handlers alone
+        if not options["burst"] and threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                previous[sig] = signal.signal(sig, lambda *_: stop.set())
+        try:
+            totals = self._drain(stop, options)
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Outbox drained — sent: {totals['sent']}, failed: {totals['failed']}, "
+                f"deferred: {totals['deferred']}"
+            )
+        )
+
+    def _drain(self, stop, options) -> dict:
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        stale = outbox.requeue_stale()
+        if stale:
+            self.stdout.write(f"Requeued {stale} stale emails.")
+
+        totals = {"sent": 0, "failed": 0, "deferred": 0}
+        drainer = outbox.Drainer(worker)
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                try:
+                    rows = outbox.claim(worker, max(1, options["batch"]))
+                except DatabaseError as exc:
+                    self.stderr.write(f"[{worker}] claim failed: {exc}")
+                    stop.wait(options["sleep"])
+                    continue
+                if not rows:
+                    if options["burst"]:
+                        break
+                    drainer.close()  # don't hold an idle SMTP session
+                    stop.wait(options["sleep"])
+                    continue
+                for k, v in drainer.deliver(rows).items():
+                    totals[k] += v
+        finally:
+            drainer.close()
+        return totals
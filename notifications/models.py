@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 User = settings.AUTH_USER_MODEL
 
@@ -48,3 +49,57 @@ class EmailEvent(models.Model):
 
     def __str__(self):
         return f"[{self.category}] {self.subject} → {self.recipient_email}"
+
+
+class OutboxStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    SENDING = "sending", "Sending"
+    SENT = "sent", "Sent"
+    DEAD = "dead", "Dead"
+
+
+class OutboundEmail(models.Model):
+    """
+    An email waiting to be delivered (see notifications.outbox).
+
+    `notify` writes the row in the caller's transaction, so the email only
+    goes out if the work that triggered it commits. `manage.py send_outbox`
+    drains due rows over one reused SMTP connection, throttled per
+    recipient domain; failures are retried with backoff and rows that run
+    out of attempts are left DEAD for inspection/retry in the admin.
+    """
+
+    notification = models.ForeignKey(
+        Notification, null=True, blank=True, on_delete=models.SET_NULL, related_name="emails"
+    )
+    to_email = models.EmailField()
+    domain = models.CharField(max_length=255, editable=False)  # throttling key
+    from_email = models.CharField(max_length=255, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    html = models.TextField(blank=True)
+
+    status = models.CharField(
+        max_length=10, choices=OutboxStatus.choices, default=OutboxStatus.PENDING
+    )
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=6)
+    last_error = models.TextField(blank=True)
+
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def save(self, *args, **kwargs):
+        self.domain = self.to_email.rpartition("@")[2].lower()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.subject} → {self.to_email} ({self.status})"
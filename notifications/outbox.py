@@ -0,0 +1,227 @@
+"""
+Durable email outbox.
+
+`queue()` stores an OutboundEmail in the caller's transaction instead of
+talking SMTP inside the request. `drain()` (run by `manage.py send_outbox`)
+claims due rows in batches and sends them over a single SMTP connection
+that stays open for the whole run:
+
+- rows are claimed with SKIP LOCKED, so several drainers can share the table;
+- each recipient domain gets at most DOMAIN_RATE messages per minute from a
+  drainer; rows over the limit are pushed to when a slot frees up;
+- a failed send is retried with the job queue's exponential backoff, and a
+  row that runs out of attempts is marked DEAD (retry it from the admin).
+"""
+
+from __future__ import annotations
+
+import logging
+import smtplib
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from jobs.services import backoff
+
+from .models import OutboundEmail, OutboxStatus
+
+log = logging.getLogger(__name__)
+
+FROM_EMAIL = getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@lucidcompliances.com")
+
+BATCH_SIZE = int(getattr(settings, "NOTIFICATIONS_OUTBOX_BATCH", 100))
+DOMAIN_RATE = int(getattr(settings, "NOTIFICATIONS_OUTBOX_DOMAIN_RATE", 60))  # per minute
+MAX_ATTEMPTS = int(getattr(settings, "NOTIFICATIONS_OUTBOX_MAX_ATTEMPTS", 6))
+# A SENDING row whose drainer went silent for this long is handed out again.
+LOCK_TIMEOUT_SECONDS = int(getattr(settings, "NOTIFICATIONS_OUTBOX_LOCK_TIMEOUT_SECONDS", 900))
+
+
+def domain_of(email: str) -> str:
+    return email.rpartition("@")[2].lower()
+
+
+def build(to_email: str, subject: str, body: str = "", *, html: str = "", notification=None) -> OutboundEmail:
+    """An unsaved outbox row (for bulk_create)."""
+    return OutboundEmail(
+        notification=notification,
+        to_email=to_email,
+        domain=domain_of(to_email),
+        from_email=FROM_EMAIL,
+        subject=subject[:255],
+        body=body,
+        html=html,
+        max_attempts=MAX_ATTEMPTS,
+    )
+
+
+def queue(to_email: str, subject: str, body: str = "", *, html: str = "", notification=None) -> OutboundEmail:
+    """Store one email for delivery; it only goes out if the caller's transaction commits."""
+    row = build(to_email, subject, body, html=html, notification=notification)
+    row.save()
+    return row
+
+
+def bulk_queue(rows) -> list:
+    """Store many build() rows in one INSERT."""
+    return OutboundEmail.objects.bulk_create(rows, batch_size=BATCH_SIZE) if rows else []
+
+
+# ---------- draining ----------
+
+
+def requeue_stale() -> int:
+    """Hand SENDING rows of dead drainers back to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=LOCK_TIMEOUT_SECONDS)
+    return OutboundEmail.objects.filter(status=OutboxStatus.SENDING, locked_at__lt=cutoff).update(
+        status=OutboxStatus.PENDING, locked_by="", locked_at=None
+    )
+
+
+def claim(worker: str, limit: int = BATCH_SIZE) -> list:
+    """Claim up to `limit` due rows (oldest first) for `worker`."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects.filter(status=OutboxStatus.PENDING, next_attempt_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by("next_attempt_at", "id")
+            .values_list("id", flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        # conditional, so the claim is also safe without row locks (SQLite)
+        OutboundEmail.objects.filter(pk__in=ids, status=OutboxStatus.PENDING).update(
+            status=OutboxStatus.SENDING, locked_by=worker, locked_at=now
+        )
+    return list(OutboundEmail.objects.filter(pk__in=ids, locked_by=worker, status=OutboxStatus.SENDING).order_by("id"))
+
+
+class Throttle:
+    """At most `rate` sends per domain in any 60-second window (per drainer)."""
+
+    WINDOW = 60.0
+
+    def __init__(self, rate: int = DOMAIN_RATE):
+        self.rate = max(1, rate)
+        self._sent = defaultdict(deque)
+
+    def wait_for(self, domain: str) -> float:
+        """Seconds until `domain` may be sent to again (0 = now)."""
+        sent = self._sent[domain]
+        now = time.monotonic()
+        while sent and now - sent[0] >= self.WINDOW:
+            sent.popleft()
+        if len(sent) < self.rate:
+            return 0.0
+        return self.WINDOW - (now - sent[0])
+
+    def record(self, domain: str) -> None:
+        self._sent[domain].append(time.monotonic())
+
+
+def _message(row: OutboundEmail) -> EmailMultiAlternatives:
+    msg = EmailMultiAlternatives(row.subject, row.body, row.from_email or FROM_EMAIL, [row.to_email])
+    if row.html:
+        msg.attach_alternative(row.html, "text/html")
+    return msg
+
+
+def _release(rows, **fields) -> None:
+    OutboundEmail.objects.filter(pk__in=[r.pk for r in rows]).update(locked_by="", locked_at=None, **fields)
+
+
+def _failed(row: OutboundEmail, exc: Exception) -> None:
+    attempts = row.attempts + 1
+    fields = dict(attempts=attempts, last_error=repr(exc)[:5000], locked_by="", locked_at=None)
+    if attempts >= row.max_attempts:
+        fields["status"] = OutboxStatus.DEAD
+        log.warning("outbox email #%s to %s dead after %s attempts: %r", row.pk, row.to_email, attempts, exc)
+    else:
+        fields["status"] = OutboxStatus.PENDING
+        fields["next_attempt_at"] = timezone.now() + backoff(attempts)
+    OutboundEmail.objects.filter(pk=row.pk).update(**fields)
+
+
+class Drainer:
+    """
+    Sends claimed rows over one SMTP connection, opened lazily and kept
+    until close(); a dropped connection is reopened once per message.
+    """
+
+    def __init__(self, worker: str, *, throttle: Throttle | None = None):
+        self.worker = worker
+        self.throttle = throttle or Throttle()
+        self._connection = None
+
+    def _conn(self):
+        if self._connection is None:
+            self._connection = get_connection(fail_silently=False)
+            self._connection.open()
+        return self._connection
+
+    def _send(self, row: OutboundEmail) -> None:
+        msg = _message(row)
+        try:
+            self._conn().send_messages([msg])
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            self._conn().send_messages([msg])
+
+    def deliver(self, rows) -> dict:
+        """Send `rows`; returns {"sent", "failed", "deferred"}."""
+        stats = {"sent": 0, "failed": 0, "deferred": 0}
+        deferred = defaultdict(list)
+        for row in rows:
+            wait = self.throttle.wait_for(row.domain)
+            if wait:
+                deferred[int(wait) + 1].append(row)
+                continue
+            try:
+                self._send(row)
+            except Exception as exc:
+                _failed(row, exc)
+                stats["failed"] += 1
+                continue
+            self.throttle.record(row.domain)
+            # right away: if the drainer dies mid-batch, a sent row must not
+            # be handed out again by requeue_stale()
+            _release([row], status=OutboxStatus.SENT, sent_at=timezone.now(), attempts=F("attempts") + 1)
+            stats["sent"] += 1
+
+        for seconds, later in deferred.items():
+            _release(later, status=OutboxStatus.PENDING, next_attempt_at=timezone.now() + timedelta(seconds=seconds))
+        stats["deferred"] = sum(len(v) for v in deferred.values())
+        return stats
+
+    def close(self) -> None:
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+
+def drain(worker: str = "inline", *, batch: int = BATCH_SIZE, limit: int | None = None) -> dict:
+    """
+    Deliver due emails until none are left (or about `limit` have been
+    handled). Returns totals of {"sent", "failed", "deferred"}.
+    """
+    totals = {"sent": 0, "failed": 0, "deferred": 0}
+    drainer = Drainer(worker)
+    try:
+        while limit is None or sum(totals.values()) < limit:
+            rows = claim(worker, batch)
+            if not rows:
+                break
+            for k, v in drainer.deliver(rows).items():
+                totals[k] += v
+    finally:
+        drainer.close()
+    return totals
@@ -1,6 +1,10 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.utils import timezone
-from django.core.mail import send_mail
-from django.conf import settings
+
+from core.signals import bulk_create
+
+from . import cache, outbox
 from .models import Notification, Level
 
 
@@ -13,31 +17,103 @@ def notify(
     link_url: str = "",
     email: bool = True,
 ):
-    n = Notification.objects.create(
-        recipient=recipient,
-        title=title,
-        body=body,
-        level=level,
-        link_url=link_url or "",
-    )
-    if email and getattr(recipient, "email", None):
-        subject = f"[Lucid] {title}"
-        msg = f"{body}\n\n{link_url}" if link_url else body
-        send_mail(
-            subject,
-            msg,
-            getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@lucidcompliances.com"),
-            [recipient.email],
-            fail_silently=True,
+    """
+    Create an in-app notification and, with `email`, queue the matching
+    email in the outbox (same transaction; `manage.py send_outbox` sends it).
+    """
+    with transaction.atomic():
+        n = Notification.objects.create(
+            recipient=recipient,
+            title=title,
+            body=body,
+            level=level,
+            link_url=link_url or "",
         )
+        if email and getattr(recipient, "email", None):
+            subject = f"[Lucid] {title}"
+            msg = f"{body}\n\n{link_url}" if link_url else body
+            outbox.queue(recipient.email, subject, msg, notification=n)
     return n
 
 
-def mark_read(notification: Notification):
-    if not notification.read_at:
-        notification.read_at = timezone.now()
-        notification.save(update_fields=["read_at"])
+def recipients_for(role, *, evaluator=None, supplier=None):
+    """Active users of `role` (one role or several) in a tenant, as a queryset."""
+    qs = get_user_model().objects.filter(is_active=True)
+    qs = qs.filter(role__in=role) if isinstance(role, (list, tuple, set)) else qs.filter(role=role)
+    if evaluator is not None:
+        qs = qs.filter(evaluator=evaluator)
+    if supplier is not None:
+        qs = qs.filter(supplier=supplier)
+    return qs
+
+
+def notify_many(
+    recipients=None,
+    title: str = "",
+    body: str = "",
+    *,
+    role=None,
+    evaluator=None,
+    supplier=None,
+    level: Level = Level.INFO,
+    link_url: str = "",
+    email: bool = True,
+) -> dict:
+    """
+    notify() for many users at once: `recipients` (users or a user
+    queryset), or every active user of `role` in `evaluator`/`supplier`
+    (see recipients_for). Recipients are resolved in one query and the
+    Notification and outbox rows are bulk-inserted in one transaction.
+
+    Returns {"recipients": n, "notifications": n, "emails": n} for audit
+    metadata.
+    """
+    if recipients is None:
+        if role is None:
+            raise ValueError("notify_many() needs recipients or a role")
+        recipients = recipients_for(role, evaluator=evaluator, supplier=supplier)
+    if hasattr(recipients, "only"):
+        recipients = recipients.only("id", "email")
+    users = {u.pk: u for u in recipients}  # one query; de-duplicated
+
+    subject = f"[Lucid] {title}"
+    msg = f"{body}\n\n{link_url}" if link_url else body
+    with transaction.atomic():
+        notes = bulk_create(
+            Notification,
+            [
+                Notification(recipient_id=pk, title=title, body=body, level=level, link_url=link_url or "")
+                for pk in users
+            ],
+        )
+        emails = []
+        if email:
+            emails = outbox.bulk_queue(
+                [
+                    outbox.build(users[n.recipient_id].email, subject, msg, notification=n)
+                    for n in notes
+                    if users[n.recipient_id].email
+                ]
+            )
+    return {"recipients": len(users), "notifications": len(notes), "emails": len(emails)}
+
+
+def mark_read(notification: Notification) -> bool:
+    """Mark one notification read. Returns False if it already was."""
+    if notification.read_at:
+        return False
+    now = timezone.now()
+    # update() rather than save(), so the signals stay out of it
+    changed = Notification.objects.filter(pk=notification.pk, read_at__isnull=True).update(read_at=now)
+    notification.read_at = now
+    if changed:
+        cache.changed(notification.recipient_id)
+    return bool(changed)
 
 
-def mark_all_read(recipient):
-    recipient.notifications.filter(read_at__isnull=True).update(read_at=timezone.now())
+def mark_all_read(recipient) -> int:
+    """Mark all of `recipient`'s notifications read. Returns how many changed."""
+    updated = recipient.notifications.filter(read_at__isnull=True).update(read_at=timezone.now())
+    if updated:
+        cache.changed(recipient.pk)
+    return updated
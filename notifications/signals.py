@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.signals import post_bulk_create
+
+from . import cache
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance: Notification, created, raw=False, **kwargs):
+    if not raw:
+        cache.changed(instance.recipient_id)
+
+
+@receiver(post_bulk_create, sender=Notification)
+def notifications_bulk_created(sender, instances, **kwargs):
+    cache.changed(*{n.recipient_id for n in instances})
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance: Notification, **kwargs):
+    cache.changed(instance.recipient_id)
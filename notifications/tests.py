@@ -1,3 +1,276 @@
-from django.test import TestCase
+import signal
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import Roles, User
+from tenants.testing import make_evaluator, make_supplier, supplier_user
+
+from . import cache, outbox, services
+from .management.commands.send_outbox import Command as SendOutbox
+from .models import Notification, OutboundEmail, OutboxStatus
+
+
+SHARED_CACHE = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": tempfile.mkdtemp(prefix="lfras-test-cache-"),
+    }
+}
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class NotificationCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("u@acme.test", "pw", role=Roles.LUS)
+        cls.other = User.objects.create_user("o@acme.test", "pw", role=Roles.LUS)
+
+    def setUp(self):
+        cache.cache.clear()
+
+    def notify(self, user=None, title="Hi"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return services.notify(user or self.user, title, email=False)
+
+    def assertUnread(self, n, *, queries=0):
+        with self.assertNumQueries(queries):
+            self.assertEqual(cache.unread_count(self.user.pk), n)
+
+    def test_count_is_cached_until_a_change_commits(self):
+        self.assertUnread(0, queries=1)
+        self.assertUnread(0)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            services.notify(self.user, "Hi", email=False)
+        self.assertUnread(0)  # not committed yet
+        for fn in callbacks:
+            fn()
+        self.assertUnread(1, queries=1)
+        self.assertUnread(1)
+
+    def test_read_and_delete_recount(self):
+        first = self.notify()
+        second = self.notify()
+        self.notify()
+        self.assertUnread(3, queries=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.mark_read(first)
+        self.assertUnread(2, queries=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertUnread(1, queries=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.mark_all_read(self.user)
+        self.assertUnread(0, queries=1)
+
+    def test_edits_outside_the_services_recount(self):
+        n = self.notify()
+        with self.captureOnCommitCallbacks(execute=True):
+            services.mark_read(n)
+        self.assertUnread(0, queries=1)
+
+        n.read_at = None  # e.g. the admin
+        with self.captureOnCommitCallbacks(execute=True):
+            n.save()
+        self.assertUnread(1, queries=1)
+
+    def test_recent_list_follows_changes(self):
+        self.notify(title="one")
+        self.assertEqual([n.title for n in cache.recent(self.user.pk)], ["one"])
+        with self.assertNumQueries(0):
+            cache.recent(self.user.pk)
+
+        self.notify(title="two")
+        self.assertEqual([n.title for n in cache.recent(self.user.pk)], ["two", "one"])
+
+    def test_other_users_keep_their_entries(self):
+        self.notify()
+        self.assertUnread(1, queries=1)
+        self.notify(self.other)
+        self.assertUnread(1)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_per_process_cache_is_not_used(self):
+        self.notify()
+        self.assertUnread(1, queries=1)
+        # a change another process made, which this one never hears about
+        Notification.objects.filter(recipient=self.user).update(read_at=timezone.now())
+        self.assertUnread(0, queries=1)
+
+
+class OutboxTests(TestCase):
+    def queue(self, to="a@acme.test", **kwargs):
+        return outbox.queue(to, "Subject", "Body", **kwargs)
+
+    def test_queued_with_the_callers_transaction(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.queue()
+            raise RuntimeError
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_drain_sends_and_marks_rows(self):
+        row = self.queue(html="<p>Body</p>")
+        self.assertEqual(outbox.drain(), {"sent": 1, "failed": 0, "deferred": 0})
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["a@acme.test"])
+        self.assertEqual(mail.outbox[0].alternatives, [("<p>Body</p>", "text/html")])
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts, row.locked_by), (OutboxStatus.SENT, 1, ""))
+        self.assertIsNotNone(row.sent_at)
+        self.assertEqual(outbox.drain(), {"sent": 0, "failed": 0, "deferred": 0})
+
+    def test_each_row_is_marked_as_soon_as_it_is_sent(self):
+        first, second = self.queue(), self.queue()
+        drainer = outbox.Drainer("w1")
+        rows = outbox.claim("w1")
+        # the drainer dies after the first send
+        with mock.patch.object(drainer, "_send", side_effect=[None, SystemExit]), self.assertRaises(SystemExit):
+            drainer.deliver(rows)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, OutboxStatus.SENT)
+        self.assertEqual(second.status, OutboxStatus.SENDING)
+
+        OutboundEmail.objects.update(locked_at=timezone.now() - timedelta(seconds=outbox.LOCK_TIMEOUT_SECONDS + 1))
+        self.assertEqual(outbox.requeue_stale(), 1)  # only the unsent row goes out again
+        self.assertEqual([r.pk for r in outbox.claim("w2")], [second.pk])
+
+    def test_failures_back_off_then_die(self):
+        row = self.queue()
+        OutboundEmail.objects.update(max_attempts=2)
+        with mock.patch.object(outbox.Drainer, "_send", side_effect=OSError("refused")):
+            self.assertEqual(outbox.drain()["failed"], 1)
+            row.refresh_from_db()
+            self.assertEqual((row.status, row.attempts), (OutboxStatus.PENDING, 1))
+            self.assertGreater(row.next_attempt_at, timezone.now())
+            self.assertIn("refused", row.last_error)
+            self.assertEqual(outbox.drain()["failed"], 0)  # not due yet
+
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            with self.assertLogs("notifications.outbox", "WARNING"):
+                outbox.drain()
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (OutboxStatus.DEAD, 2))
+
+    def test_domains_are_throttled(self):
+        for to in ("a@slow.test", "b@slow.test", "c@other.test"):
+            self.queue(to)
+        drainer = outbox.Drainer("w1", throttle=outbox.Throttle(rate=1))
+        self.assertEqual(drainer.deliver(outbox.claim("w1")), {"sent": 2, "failed": 0, "deferred": 1})
+
+        deferred = OutboundEmail.objects.get(to_email="b@slow.test")
+        self.assertEqual((deferred.status, deferred.attempts), (OutboxStatus.PENDING, 0))
+        self.assertGreater(deferred.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+
+class SendOutboxCommandTests(TestCase):
+    def test_burst_sends_and_keeps_signal_handlers(self):
+        outbox.queue("a@acme.test", "Subject", "Body")
+        before = signal.getsignal(signal.SIGTERM)
+        # it would close the test transaction's connection
+        with mock.patch("notifications.management.commands.send_outbox.close_old_connections"):
+            call_command("send_outbox", burst=True, stdout=mock.Mock())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIs(signal.getsignal(signal.SIGTERM), before)
+
+    def test_long_running_mode_restores_signal_handlers(self):
+        before = signal.getsignal(signal.SIGTERM)
+        installed = []
+
+        def drain(cmd, stop, options):
+            installed.append(signal.getsignal(signal.SIGTERM))
+            signal.raise_signal(signal.SIGTERM)
+            self.assertTrue(stop.is_set())
+            return {"sent": 0, "failed": 0, "deferred": 0}
+
+        with mock.patch.object(SendOutbox, "_drain", drain):
+            call_command("send_outbox", stdout=mock.Mock())
+
+        self.assertIsNot(installed[0], before)
+        self.assertIs(signal.getsignal(signal.SIGTERM), before)
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class NotifyManyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ev = make_evaluator()
+        cls.other = make_evaluator("other")
+        cls.sup = make_supplier(cls.ev)
+        cls.ead = User.objects.create_user("ead@acme.test", "pw", role=Roles.EAD, evaluator=cls.ev)
+        cls.evs = User.objects.create_user("evs@acme.test", "pw", role=Roles.EVS, evaluator=cls.ev)
+        cls.sus = supplier_user(cls.sup, "sus@s1.test")
+        User.objects.create_user("off@acme.test", "pw", role=Roles.EAD, evaluator=cls.ev, is_active=False)
+        User.objects.create_user("ead@other.test", "pw", role=Roles.EAD, evaluator=cls.other)
+
+    def setUp(self):
+        cache.cache.clear()
+
+    def test_role_fan_out_is_tenant_scoped(self):
+        stats = services.notify_many(
+            title="Policy updated",
+            body="See the new policy.",
+            link_url="/documents/1/",
+            role=[Roles.EAD, Roles.EVS],
+            evaluator=self.ev,
+        )
+
+        self.assertEqual(stats, {"recipients": 2, "notifications": 2, "emails": 2})
+        self.assertCountEqual(Notification.objects.values_list("recipient_id", flat=True), [self.ead.pk, self.evs.pk])
+        email = OutboundEmail.objects.get(to_email="ead@acme.test")
+        self.assertEqual(email.subject, "[Lucid] Policy updated")
+        self.assertEqual(email.body, "See the new policy.\n\n/documents/1/")
+        self.assertEqual(email.notification.recipient_id, self.ead.pk)
+
+        services.notify_many(title="Upload", role=Roles.SUS, supplier=self.sup)
+        self.assertEqual(Notification.objects.filter(recipient=self.sus).count(), 1)
+
+    def test_explicit_recipients_are_deduplicated(self):
+        stats = services.notify_many([self.ead, self.ead, self.sus], "Hi")
+        self.assertEqual(stats, {"recipients": 2, "notifications": 2, "emails": 2})
+
+    def test_users_without_email_and_email_off(self):
+        User.objects.filter(pk=self.evs.pk).update(email="")
+        stats = services.notify_many(User.objects.filter(evaluator=self.ev, is_active=True), "Hi")
+        self.assertEqual(stats, {"recipients": 3, "notifications": 3, "emails": 2})
+
+        stats = services.notify_many([self.ead], "Quiet", email=False)
+        self.assertEqual(stats, {"recipients": 1, "notifications": 1, "emails": 0})
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+    def test_needs_recipients_or_a_role(self):
+        with self.assertRaises(ValueError):
+            services.notify_many(title="Hi")
+
+    def test_query_count_does_not_grow_with_recipients(self):
+        def run(n):
+            users = [User(email=f"u{i}-{n}@acme.test", role=Roles.EVS, evaluator=self.ev) for i in range(n)]
+            User.objects.bulk_create(users)
+            qs = User.objects.filter(email__endswith=f"-{n}@acme.test")
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(services.notify_many(qs, "Hi")["emails"], n)
+            return len(ctx.captured_queries)
+
+        run(1)  # creates this hour's dashboard rollup rows
+        self.assertEqual(run(2), run(25))
+
+    def test_unread_counts_follow(self):
+        self.assertEqual(cache.unread_count(self.ead.pk), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.notify_many([self.ead, self.sus], "Hi")
+        self.assertEqual(cache.unread_count(self.ead.pk), 1)
+        self.assertEqual(cache.unread_count(self.sus.pk), 1)
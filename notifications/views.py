@@ -2,34 +2,25 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.utils import timezone
 from django.http import HttpResponse
 from django.http import JsonResponse
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.conf import settings
 from django.views.decorators.http import require_POST
-from django.template.loader import render_to_string
 from urllib.parse import urlparse
 
+from . import cache
 from .models import Notification
 from .services import mark_read, mark_all_read
 
 
-def _mark_read(obj: Notification):
-    if obj.read_at:
-        return False
-    obj.read_at = timezone.now()
-    obj.save(update_fields=["read_at"])
-    return True
-
-
 def _rbac_queryset(user):
     return Notification.objects.filter(recipient=user)
 
 @login_required
 def inbox(request):
     notes = _rbac_queryset(request.user).order_by("-created_at")
-    unread_count = notes.filter(read_at__isnull=True).count()
+    unread_count = cache.unread_count(request.user.pk)
     return render(
         request,
         "notifications/inbox.html",
@@ -41,7 +32,7 @@ def inbox(request):
 @require_POST
 def read(request, pk: int):
     n = get_object_or_404(Notification, pk=pk, recipient=request.user)
-    changed = _mark_read(n)
+    changed = mark_read(n)
 
     # If this was an AJAX call from the offcanvas, return JSON
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
@@ -63,8 +54,7 @@ def read(request, pk: int):
 @login_required
 @require_POST
 def read_all(request):
-    qs = _rbac_queryset(request.user).filter(read_at__isnull=True)
-    updated = qs.update(read_at=timezone.now())
+    updated = mark_all_read(request.user)
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
         return JsonResponse({"ok": True, "updated": updated})
     messages.info(request, f"Marked {updated} notification(s) as read.")
@@ -74,14 +64,7 @@ def read_all(request):
 # Offcanvas panel (slider) endpoints
 @login_required
 def panel(request):
-    html = render_to_string(
-        "notifications/panel.html",
-        {
-            "notifications": _rbac_queryset(request.user).order_by("-created_at")[:10],
-        },
-        request=request,
-    )
-    return HttpResponse(html)
+    return HttpResponse(cache.panel_html(request))
 
 
 @login_required
@@ -102,9 +85,7 @@ def read_and_redirect(request, pk: int):
 @login_required
 def read_go(request, pk):
     n = get_object_or_404(Notification, pk=pk, recipient=request.user)
-    if not n.read_at:
-        n.read_at = timezone.now()
-        n.save(update_fields=["read_at"])
+    mark_read(n)
 
     target = n.link_url or "/"
 
@@ -4,11 +4,11 @@ from django.contrib.auth.decorators import login_required
 from django.http import HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
-from django.db.models import Q
 
 from .models import PaymentRecord, PaymentTransaction, PLAN_DEFAULT_AMOUNTS
 from .forms import PaymentRecordForm, PaymentTransactionForm
 from .services import can_manage_payments, can_view_payments
+from search.services import matching
 
 from django.conf import settings
 
@@ -50,14 +50,10 @@ def list_payments(request):
     except Exception:
         pass
     if q:
-        qs = qs.filter(
-            Q(evaluator__name__icontains=q)
-            | Q(subscription_id__icontains=q)
-            | Q(notes__icontains=q)
-        )
-
-    # Sorting
-    sort = request.GET.get("sort") or "-created_at"
+        qs = matching(qs, q)
+
+    # Sorting (a search keeps its relevance order unless a sort is picked)
+    sort = request.GET.get("sort") or ("" if q else "-created_at")
     allowed = {
         "created_at",
         "-created_at",
@@ -88,17 +84,12 @@ def list_payments(request):
         except Exception:
             pass
         if q:
-            tx_qs = tx_qs.filter(
-                Q(record__evaluator__name__icontains=q)
-                | Q(reference__icontains=q)
-                | Q(method__icontains=q)
-                | Q(notes__icontains=q)
-            )
-        tx_sort = request.GET.get("sort") or "-created_at"
+            tx_qs = matching(tx_qs, q)
+        tx_sort = request.GET.get("sort") or ("" if q else "-created_at")
         tx_allowed = {"created_at", "-created_at", "amount", "-amount"}
         if tx_sort in tx_allowed:
             tx_qs = tx_qs.order_by(tx_sort)
-        else:
+        elif not q:
             tx_qs = tx_qs.order_by("-created_at")
 
     # For filters UI
@@ -138,18 +129,17 @@ def create_record(request):
             messages.success(request, "Payment record created.")
             # Optional: notify EADs of the evaluator
             try:
-                from notifications.services import notify
+                from notifications.services import notify_many
                 from notifications.models import Level
 
-                for u in rec.evaluator.users.filter(is_active=True, role="EAD"):
-                    notify(
-                        u,
-                        f"Subscription created — {rec.get_plan_display()}",
-                        body=f"Valid from {rec.start_date} to {rec.end_date}",
-                        level=Level.INFO,
-                        link_url="/router/ead/",
-                        email=True,
-                    )
+                notify_many(
+                    role="EAD",
+                    evaluator=rec.evaluator_id,
+                    title=f"Subscription created — {rec.get_plan_display()}",
+                    body=f"Valid from {rec.start_date} to {rec.end_date}",
+                    level=Level.INFO,
+                    link_url="/router/ead/",
+                )
             except Exception:
                 pass
 
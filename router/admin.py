@@ -1,3 +1,22 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DashboardRollup
+
+
+@admin.register(DashboardRollup)
+class DashboardRollupAdmin(admin.ModelAdmin):
+    list_display = (
+        "bucket",
+        "grain",
+        "evaluator_id",
+        "supplier_id",
+        "docs_uploaded",
+        "activities_started",
+        "files_ok",
+        "files_failed",
+        "tickets_opened",
+        "notifications_sent",
+        "revenue",
+    )
+    list_filter = ("grain",)
+    search_fields = ("evaluator_id", "supplier_id")
@@ -0,0 +1,82 @@
+"""
+Dashboard context cache keyed by (role, evaluator_id, supplier_id, range).
+
+Every key also embeds a generation counter: one per evaluator (tenant) and a
+global one for the Lucid-side (LAD/LUS) views. router.signals bumps the
+writing tenant's counter and the global one after each relevant commit, so a
+write only orphans that tenant's entries (plus the global views) and old
+entries simply age out.
+
+Bumps come from whichever process made the write (another web worker,
+run_workers, cron), so this only works on a shared cache backend; on a
+per-process one (see core.cache) contexts are built on every request.
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from accounts.models import Roles
+from core.cache import is_shared
+
+
+TIMEOUT = int(getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 300))
+
+GLOBAL_ROLES = (Roles.LAD, Roles.LUS)
+
+
+def _gen_key(evaluator_id=None) -> str:
+    return f"dash:gen:ev:{evaluator_id}" if evaluator_id else "dash:gen:global"
+
+
+def generation(evaluator_id=None) -> int:
+    key = _gen_key(evaluator_id)
+    # Seed from the clock so an evicted counter never reuses an old generation.
+    cache.add(key, time.time_ns() // 1000, timeout=None)
+    return cache.get(key) or 0
+
+
+def _incr(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+
+
+def bump(evaluator_id=None) -> None:
+    """Invalidate the global views and, when given, one tenant's views."""
+    _incr(_gen_key())
+    if evaluator_id:
+        _incr(_gen_key(evaluator_id))
+
+
+def bump_all() -> None:
+    """Invalidate every dashboard (e.g. after a bulk rollup rebuild)."""
+    from tenants.models import Evaluator
+
+    _incr(_gen_key())
+    for ev_id in Evaluator.objects.values_list("id", flat=True):
+        _incr(_gen_key(ev_id))
+
+
+def bump_on_commit(evaluator_id=None) -> None:
+    # After commit, so a concurrent reader can't cache pre-commit numbers
+    # under the new generation.
+    transaction.on_commit(lambda: bump(evaluator_id))
+
+
+def cached(role, *, evaluator_id=None, supplier_id=None, range_key="", builder):
+    """Return the cached context for this dashboard, building it on a miss."""
+    if not is_shared():
+        return builder()
+    gen = generation(None if role in GLOBAL_ROLES else evaluator_id)
+    key = f"dash:ctx:{role}:{evaluator_id or 0}:{supplier_id or 0}:{range_key or '-'}:{gen}"
+    ctx = cache.get(key)
+    if ctx is None:
+        ctx = builder()
+        cache.set(key, ctx, TIMEOUT)
+    return ctx
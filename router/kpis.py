@@ -0,0 +1,77 @@
+"""
+KPI cards declared per view and compiled into one aggregate query per source.
+
+    cards = kpis.collect(
+        total=kpis.count(a.files.all()),
+        valid=kpis.count(a.files.all(), Q(status=FileStatus.VALID_OK)),
+        bytes=kpis.total(a.files.all(), "file_size"),
+    )
+
+KPIs whose source querysets compile to the same SQL share a single
+`.aggregate()` call, each one becoming `Count/Sum(..., filter=Q(...))`.
+A source of `None` (optional model not installed) yields the default
+without touching the database.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+from django.core.exceptions import EmptyResultSet
+from django.db import models
+from django.db.models import Count, Q, Sum
+
+
+@dataclass(frozen=True)
+class Kpi:
+    source: models.QuerySet | None
+    aggregate: Any
+    default: Any = 0
+
+
+def _queryset(source):
+    if source is None or isinstance(source, models.QuerySet):
+        return source
+    return source._default_manager.all()  # a model class
+
+
+def count(source, q: Q | None = None, *, field: str = "pk", distinct: bool = False) -> Kpi:
+    return Kpi(_queryset(source), Count(field, filter=q, distinct=distinct), 0)
+
+
+def total(source, field: str, q: Q | None = None, *, default=0) -> Kpi:
+    return Kpi(_queryset(source), Sum(field, filter=q), default)
+
+
+def _source_key(qs):
+    """Group key for a source queryset, or None if it can match no rows."""
+    try:
+        return qs.model, str(qs.order_by().query)
+    except EmptyResultSet:
+        return None
+
+
+def collect(**kpis: Kpi) -> dict:
+    """Evaluate `kpis` with one query per distinct source. Returns {name: value}."""
+    out = {name: kpi.default for name, kpi in kpis.items()}
+    groups: dict[tuple, tuple] = {}
+    for name, kpi in kpis.items():
+        if kpi.source is None:
+            continue
+        key = _source_key(kpi.source)
+        if key is None:
+            continue
+        qs, members = groups.setdefault(key, (kpi.source, {}))
+        members[name] = kpi
+
+    for qs, members in groups.values():
+        row = qs.order_by().aggregate(**{name: kpi.aggregate for name, kpi in members.items()})
+        for name, kpi in members.items():
+            value = row.get(name)
+            if value is None:
+                value = kpi.default
+            elif isinstance(kpi.aggregate, Count):
+                value = int(value)
+            out[name] = value
+    return out
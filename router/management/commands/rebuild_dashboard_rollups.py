@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from router import cache, rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild dashboard rollup rows from Documents, Activities, Files, Tickets, Notifications and Payments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help="Only rebuild buckets from this date (YYYY-MM-DD); default rebuilds everything.",
+        )
+        parser.add_argument(
+            "--prune-hours",
+            action="store_true",
+            help="Only drop hour rows older than the retention window.",
+        )
+
+    def handle(self, *args, **options):
+        if options.get("prune_hours"):
+            n = rollups.prune_hours()
+            self.stdout.write(self.style.SUCCESS(f"Pruned {n} hour rollup rows."))
+            return
+
+        since = None
+        if options.get("since"):
+            try:
+                since = datetime.strptime(options["since"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--since must be YYYY-MM-DD")
+
+        n = rollups.rebuild(since=since)
+        cache.bump_all()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt dashboard rollups: {n} rows."))
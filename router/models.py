@@ -1,3 +1,43 @@
 from django.db import models
 
-# Create your models here.
+
+class RollupGrain(models.TextChoices):
+    DAY = "day", "Day"
+    HOUR = "hour", "Hour"
+
+
+class DashboardRollup(models.Model):
+    """
+    Pre-aggregated dashboard facts per tenant and time bucket.
+
+    Rows are keyed by (evaluator_id, supplier_id, grain, bucket). Tenant ids are
+    plain integers (0 = no evaluator / no supplier) so the unique key also holds
+    for Lucid-side facts. Buckets are local-time midnights (day) or hour starts.
+    Maintained incrementally by router.signals and rebuilt by the
+    `rebuild_dashboard_rollups` command.
+    """
+
+    evaluator_id = models.IntegerField(default=0)
+    supplier_id = models.IntegerField(default=0)
+    grain = models.CharField(max_length=4, choices=RollupGrain.choices)
+    bucket = models.DateTimeField()
+
+    docs_uploaded = models.IntegerField(default=0)
+    activities_started = models.IntegerField(default=0)
+    files_uploaded = models.IntegerField(default=0)
+    files_ok = models.IntegerField(default=0)
+    files_failed = models.IntegerField(default=0)
+    tickets_opened = models.IntegerField(default=0)
+    notifications_sent = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [("evaluator_id", "supplier_id", "grain", "bucket")]
+        indexes = [
+            models.Index(fields=["grain", "bucket"]),
+            models.Index(fields=["evaluator_id", "grain", "bucket"]),
+        ]
+        ordering = ["grain", "bucket"]
+
+    def __str__(self):
+        return f"{self.grain} {self.bucket:%Y-%m-%d %H:00} ev={self.evaluator_id} sup={self.supplier_id}"
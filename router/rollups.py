@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncHour
+from django.utils import timezone
+
+from activities.models import FileStatus
+from .models import DashboardRollup, RollupGrain
+
+# Count-like facts; `revenue` is the only decimal metric.
+COUNT_METRICS = (
+    "docs_uploaded",
+    "activities_started",
+    "files_uploaded",
+    "files_ok",
+    "files_failed",
+    "tickets_opened",
+    "notifications_sent",
+)
+METRICS = COUNT_METRICS + ("revenue",)
+
+# ActivityFile statuses counted as ok / failed (mirrors the SUS dashboard cards)
+OK_STATUSES = (FileStatus.VALID_OK,)
+FAILED_STATUSES = (FileStatus.VALID_FAILED, FileStatus.UPLOAD_FAILED)
+
+# Hour rows only back the "day" range, so we keep a short tail of them.
+HOUR_RETENTION_DAYS = int(getattr(settings, "DASHBOARD_ROLLUP_HOUR_RETENTION_DAYS", 7))
+
+
+# ---------- bucketing ----------
+
+
+def _local(ts) -> datetime:
+    """Aware local datetime for a datetime or a plain date (midnight)."""
+    if isinstance(ts, datetime):
+        if timezone.is_naive(ts):
+            ts = timezone.make_aware(ts)
+        return timezone.localtime(ts)
+    return timezone.make_aware(datetime.combine(ts, time.min))
+
+
+def floor_bucket(ts, grain: str) -> datetime:
+    local = _local(ts)
+    if grain == RollupGrain.HOUR:
+        return local.replace(minute=0, second=0, microsecond=0)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _hour_cutoff() -> datetime:
+    return floor_bucket(timezone.now() - timedelta(days=HOUR_RETENTION_DAYS), RollupGrain.HOUR)
+
+
+# ---------- writes ----------
+
+
+def bump(ts, *, evaluator_id=None, supplier_id=None, **deltas) -> None:
+    """
+    Add `deltas` (metric=amount, negative to undo) to the day and hour buckets
+    containing `ts`. Runs inside the caller's transaction so facts commit or roll
+    back together with the source row.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if ts is None or not deltas:
+        return
+    unknown = set(deltas) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown rollup metric(s): {', '.join(sorted(unknown))}")
+
+    for grain in (RollupGrain.DAY, RollupGrain.HOUR):
+        bucket = floor_bucket(ts, grain)
+        if grain == RollupGrain.HOUR and bucket < _hour_cutoff():
+            continue
+        key = dict(
+            evaluator_id=evaluator_id or 0,
+            supplier_id=supplier_id or 0,
+            grain=grain,
+            bucket=bucket,
+        )
+        _apply(key, deltas)
+
+
+def _apply(key: dict, deltas: dict) -> None:
+    increments = {k: F(k) + v for k, v in deltas.items()}
+    if DashboardRollup.objects.filter(**key).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            DashboardRollup.objects.create(**key, **deltas)
+    except IntegrityError:
+        # Lost the insert race; the row exists now.
+        DashboardRollup.objects.filter(**key).update(**increments)
+
+
+# ---------- reads ----------
+
+
+def scoped(grain: str = RollupGrain.DAY, *, evaluator_id=None, supplier_id=None):
+    qs = DashboardRollup.objects.filter(grain=grain)
+    if evaluator_id is not None:
+        qs = qs.filter(evaluator_id=evaluator_id)
+    if supplier_id is not None:
+        qs = qs.filter(supplier_id=supplier_id)
+    return qs
+
+
+def grain_for(start, end) -> str:
+    """
+    Hour rows for windows of about a day (the "day" range, whose start is
+    rounded down to the hour by align()), day rows otherwise.
+    """
+    return RollupGrain.HOUR if (end - start) < timedelta(days=2) else RollupGrain.DAY
+
+
+def align(start, end) -> datetime:
+    """
+    `start` rounded down to the rollup bucket it falls in. Range views use
+    this as their window start, so totals() (which can only count whole
+    buckets) and any live query over the same window agree.
+    """
+    return floor_bucket(start, grain_for(start, end))
+
+
+def totals(start, end, *, evaluator_id=None, supplier_id=None, metrics=METRICS) -> dict:
+    """
+    Sum `metrics` over the buckets overlapping [start, end]. Returns ints for
+    count metrics and Decimal for revenue (0 when there are no rows).
+
+    Buckets are counted whole, so `start` should come from align();
+    otherwise the first bucket's rows from before `start` are included.
+    """
+    grain = grain_for(start, end)
+    qs = scoped(grain, evaluator_id=evaluator_id, supplier_id=supplier_id).filter(
+        bucket__gte=floor_bucket(start, grain), bucket__lte=end
+    )
+    agg = qs.aggregate(**{m: Sum(m) for m in metrics})
+    return {m: _zero(m, agg.get(m)) for m in metrics}
+
+
+def all_time(*, evaluator_id=None, supplier_id=None, metrics=METRICS) -> dict:
+    qs = scoped(RollupGrain.DAY, evaluator_id=evaluator_id, supplier_id=supplier_id)
+    agg = qs.aggregate(**{m: Sum(m) for m in metrics})
+    return {m: _zero(m, agg.get(m)) for m in metrics}
+
+
+def _zero(metric: str, value):
+    if metric == "revenue":
+        return value or Decimal("0")
+    return int(value or 0)
+
+
+# ---------- rebuild ----------
+
+
+def _trunc(grain: str, field: str):
+    return TruncHour(field) if grain == RollupGrain.HOUR else TruncDay(field)
+
+
+def _collect(grain: str, lower):
+    """
+    Yield (evaluator_id, supplier_id, bucket, deltas) from grouped queries over
+    the source tables, mirroring what the signal handlers add row by row.
+    """
+    from activities.models import Activity, ActivityFile
+    from documents.models import Document
+    from notifications.models import Notification
+    from payments.models import PaymentTransaction
+    from tickets.models import Ticket
+
+    def since(qs, field, as_date=False):
+        if not lower:
+            return qs
+        return qs.filter(**{f"{field}__gte": lower.date() if as_date else lower})
+
+    for r in (
+        since(Document.objects.all(), "uploaded_at")
+        .values("evaluator_id", "supplier_id", b=_trunc(grain, "uploaded_at"))
+        .annotate(c=Count("id"))
+        .order_by()
+    ):
+        yield r["evaluator_id"], r["supplier_id"], r["b"], {"docs_uploaded": r["c"]}
+
+    for r in (
+        since(Activity.objects.all(), "started_at")
+        .values("evaluator_id", "supplier_id", b=_trunc(grain, "started_at"))
+        .annotate(c=Count("id"))
+        .order_by()
+    ):
+        yield r["evaluator_id"], r["supplier_id"], r["b"], {"activities_started": r["c"]}
+
+    for r in (
+        since(ActivityFile.objects.all(), "uploaded_at")
+        .values(
+            ev=F("activity__evaluator_id"),
+            sup=F("activity__supplier_id"),
+            b=_trunc(grain, "uploaded_at"),
+        )
+        .annotate(
+            c=Count("id"),
+            ok=Count("id", filter=Q(status__in=OK_STATUSES)),
+            failed=Count("id", filter=Q(status__in=FAILED_STATUSES)),
+        )
+        .order_by()
+    ):
+        yield r["ev"], r["sup"], r["b"], {
+            "files_uploaded": r["c"],
+            "files_ok": r["ok"],
+            "files_failed": r["failed"],
+        }
+
+    for r in (
+        since(Ticket.objects.all(), "created_at")
+        .values(
+            ev=Coalesce(
+                "evaluator__evaluator_id",
+                "supplier__evaluator_id",
+                "created_by__evaluator_id",
+            ),
+            sup=Coalesce("supplier__supplier_id", "created_by__supplier_id"),
+            b=_trunc(grain, "created_at"),
+        )
+        .annotate(c=Count("id"))
+        .order_by()
+    ):
+        yield r["ev"], r["sup"], r["b"], {"tickets_opened": r["c"]}
+
+    for r in (
+        since(Notification.objects.all(), "created_at")
+        .values(
+            ev=F("recipient__evaluator_id"),
+            sup=F("recipient__supplier_id"),
+            b=_trunc(grain, "created_at"),
+        )
+        .annotate(c=Count("id"))
+        .order_by()
+    ):
+        yield r["ev"], r["sup"], r["b"], {"notifications_sent": r["c"]}
+
+    # paid_on is a DateField: day buckets only, hour rows land on midnight
+    for r in (
+        since(PaymentTransaction.objects.all(), "paid_on", as_date=True)
+        .values(ev=F("record__evaluator_id"), b=F("paid_on"))
+        .annotate(s=Sum("amount"))
+        .order_by()
+    ):
+        yield r["ev"], None, r["b"], {"revenue": r["s"] or Decimal("0")}
+
+
+def rebuild(*, since: date | None = None) -> int:
+    """
+    Recompute rollups from the source tables and replace the existing rows (all
+    of them, or those from `since` onwards). Hour rows older than the retention
+    window are dropped. Returns the number of rows written.
+    """
+    start = _local(since) if since else None
+    hour_cutoff = _hour_cutoff()
+    hour_start = max(start, hour_cutoff) if start else hour_cutoff
+
+    rows: dict[tuple, dict] = {}
+    for grain, lower in ((RollupGrain.DAY, start), (RollupGrain.HOUR, hour_start)):
+        for ev_id, sup_id, ts, deltas in _collect(grain, lower):
+            bucket = floor_bucket(ts, grain)
+            if grain == RollupGrain.HOUR and bucket < hour_start:
+                continue
+            acc = rows.setdefault((ev_id or 0, sup_id or 0, grain, bucket), {})
+            for metric, value in deltas.items():
+                if value:
+                    acc[metric] = acc.get(metric, 0) + value
+
+    objs = [
+        DashboardRollup(
+            evaluator_id=ev_id, supplier_id=sup_id, grain=grain, bucket=bucket, **deltas
+        )
+        for (ev_id, sup_id, grain, bucket), deltas in rows.items()
+        if deltas
+    ]
+    with transaction.atomic():
+        day_qs = DashboardRollup.objects.filter(grain=RollupGrain.DAY)
+        if start:
+            day_qs = day_qs.filter(bucket__gte=start)
+        day_qs.delete()
+        DashboardRollup.objects.filter(grain=RollupGrain.HOUR).filter(
+            Q(bucket__gte=hour_start) | Q(bucket__lt=hour_cutoff)
+        ).delete()
+        DashboardRollup.objects.bulk_create(objs, batch_size=1000)
+    return len(objs)
+
+
+def prune_hours() -> int:
+    """Drop hour rows that fell out of the retention window."""
+    deleted, _ = DashboardRollup.objects.filter(
+        grain=RollupGrain.HOUR, bucket__lt=_hour_cutoff()
+    ).delete()
+    return deleted
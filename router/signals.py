@@ -0,0 +1,282 @@
+from collections import Counter, defaultdict
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from activities.models import Activity, ActivityFile
+from core.signals import post_bulk_create
+from documents.models import Document
+from notifications.models import Notification
+from payments.models import PaymentRecord, PaymentTransaction
+from tenants.models import Evaluator, Supplier
+from tickets.models import Ticket
+
+from . import cache, rollups
+from .models import RollupGrain
+
+
+# ---------- tenant resolution ----------
+
+
+def _activity_tenant(activity_id):
+    row = (
+        Activity.objects.filter(pk=activity_id)
+        .values_list("evaluator_id", "supplier_id")
+        .first()
+    )
+    return row or (None, None)
+
+
+def _file_tenant(af: ActivityFile):
+    if ActivityFile.activity.is_cached(af):
+        return af.activity.evaluator_id, af.activity.supplier_id
+    return _activity_tenant(af.activity_id)
+
+
+def _user_tenant(user_id):
+    row = User.objects.filter(pk=user_id).values_list("evaluator_id", "supplier_id").first()
+    return row or (None, None)
+
+
+def _ticket_tenant(t: Ticket):
+    return t.tenant_ids()
+
+
+def _file_deltas(status, sign: int) -> dict:
+    return {
+        "files_ok": sign if status in rollups.OK_STATUSES else 0,
+        "files_failed": sign if status in rollups.FAILED_STATUSES else 0,
+    }
+
+
+# ---------- documents / activities ----------
+
+
+@receiver(post_save, sender=Document)
+def document_rollup_saved(sender, instance: Document, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.bump(
+            instance.uploaded_at,
+            evaluator_id=instance.evaluator_id,
+            supplier_id=instance.supplier_id,
+            docs_uploaded=1,
+        )
+
+
+@receiver(post_delete, sender=Document)
+def document_rollup_deleted(sender, instance: Document, **kwargs):
+    rollups.bump(
+        instance.uploaded_at,
+        evaluator_id=instance.evaluator_id,
+        supplier_id=instance.supplier_id,
+        docs_uploaded=-1,
+    )
+
+
+@receiver(post_save, sender=Activity)
+def activity_rollup_saved(sender, instance: Activity, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.bump(
+            instance.started_at,
+            evaluator_id=instance.evaluator_id,
+            supplier_id=instance.supplier_id,
+            activities_started=1,
+        )
+
+
+@receiver(post_delete, sender=Activity)
+def activity_rollup_deleted(sender, instance: Activity, **kwargs):
+    rollups.bump(
+        instance.started_at,
+        evaluator_id=instance.evaluator_id,
+        supplier_id=instance.supplier_id,
+        activities_started=-1,
+    )
+
+
+@receiver(post_save, sender=ActivityFile)
+def activity_file_rollup_saved(sender, instance: ActivityFile, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_loaded_status", None)
+    if created:
+        deltas = {"files_uploaded": 1, **_file_deltas(instance.status, 1)}
+    elif previous is not None and previous != instance.status:
+        old = _file_deltas(previous, -1)
+        new = _file_deltas(instance.status, 1)
+        deltas = {k: old[k] + new[k] for k in old}
+    else:
+        return
+    if not any(deltas.values()):
+        return
+    ev, sup = _file_tenant(instance)
+    rollups.bump(instance.uploaded_at, evaluator_id=ev, supplier_id=sup, **deltas)
+
+
+@receiver(post_delete, sender=ActivityFile)
+def activity_file_rollup_deleted(sender, instance: ActivityFile, **kwargs):
+    ev, sup = _file_tenant(instance)
+    rollups.bump(
+        instance.uploaded_at,
+        evaluator_id=ev,
+        supplier_id=sup,
+        files_uploaded=-1,
+        **_file_deltas(instance.status, -1),
+    )
+
+
+@receiver(post_bulk_create, sender=ActivityFile)
+def activity_file_rollup_bulk_created(sender, instances, **kwargs):
+    # one bump per (tenant, hour) instead of one per file
+    groups = defaultdict(Counter)
+    for af in instances:
+        ev, sup = _file_tenant(af)
+        deltas = groups[(ev, sup, rollups.floor_bucket(af.uploaded_at, RollupGrain.HOUR))]
+        deltas.update({"files_uploaded": 1, **_file_deltas(af.status, 1)})
+    for (ev, sup, hour), deltas in groups.items():
+        rollups.bump(hour, evaluator_id=ev, supplier_id=sup, **deltas)
+
+
+# ---------- tickets / notifications ----------
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_rollup_saved(sender, instance: Ticket, created, raw=False, **kwargs):
+    if created and not raw:
+        ev, sup = _ticket_tenant(instance)
+        rollups.bump(instance.created_at, evaluator_id=ev, supplier_id=sup, tickets_opened=1)
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_rollup_deleted(sender, instance: Ticket, **kwargs):
+    ev, sup = _ticket_tenant(instance)
+    rollups.bump(instance.created_at, evaluator_id=ev, supplier_id=sup, tickets_opened=-1)
+
+
+@receiver(post_save, sender=Notification)
+def notification_rollup_saved(sender, instance: Notification, created, raw=False, **kwargs):
+    if created and not raw:
+        ev, sup = _user_tenant(instance.recipient_id)
+        rollups.bump(instance.created_at, evaluator_id=ev, supplier_id=sup, notifications_sent=1)
+
+
+@receiver(post_bulk_create, sender=Notification)
+def notification_rollup_bulk_created(sender, instances, **kwargs):
+    tenants = {
+        pk: (ev, sup)
+        for pk, ev, sup in User.objects.filter(pk__in={n.recipient_id for n in instances}).values_list(
+            "pk", "evaluator_id", "supplier_id"
+        )
+    }
+    groups = Counter(
+        (*tenants.get(n.recipient_id, (None, None)), rollups.floor_bucket(n.created_at, RollupGrain.HOUR))
+        for n in instances
+    )
+    for (ev, sup, hour), n in groups.items():
+        rollups.bump(hour, evaluator_id=ev, supplier_id=sup, notifications_sent=n)
+
+
+@receiver(post_delete, sender=Notification)
+def notification_rollup_deleted(sender, instance: Notification, **kwargs):
+    ev, sup = _user_tenant(instance.recipient_id)
+    rollups.bump(instance.created_at, evaluator_id=ev, supplier_id=sup, notifications_sent=-1)
+
+
+# ---------- payments ----------
+
+
+def _record_evaluator(record_id):
+    return PaymentRecord.objects.filter(pk=record_id).values_list("evaluator_id", flat=True).first()
+
+
+@receiver(pre_save, sender=PaymentTransaction)
+def payment_rollup_snapshot(sender, instance: PaymentTransaction, raw=False, **kwargs):
+    # Edits can move money between days or tenants; remember what to undo.
+    instance._rollup_previous = None
+    if instance.pk and not raw:
+        instance._rollup_previous = (
+            PaymentTransaction.objects.filter(pk=instance.pk)
+            .values_list("record_id", "paid_on", "amount")
+            .first()
+        )
+
+
+@receiver(post_save, sender=PaymentTransaction)
+def payment_rollup_saved(sender, instance: PaymentTransaction, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_rollup_previous", None)
+    if previous:
+        record_id, paid_on, amount = previous
+        if (record_id, paid_on, amount) == (instance.record_id, instance.paid_on, instance.amount):
+            return
+        rollups.bump(paid_on, evaluator_id=_record_evaluator(record_id), revenue=-amount)
+    rollups.bump(
+        instance.paid_on,
+        evaluator_id=_record_evaluator(instance.record_id),
+        revenue=instance.amount,
+    )
+
+
+@receiver(post_delete, sender=PaymentTransaction)
+def payment_rollup_deleted(sender, instance: PaymentTransaction, **kwargs):
+    rollups.bump(
+        instance.paid_on,
+        evaluator_id=_record_evaluator(instance.record_id),
+        revenue=-instance.amount,
+    )
+
+
+# ---------- dashboard cache ----------
+
+
+def _cache_tenant(instance):
+    """Evaluator whose dashboards a write affects (None = global views only)."""
+    if isinstance(instance, Evaluator):
+        return instance.pk
+    if isinstance(instance, ActivityFile):
+        return _file_tenant(instance)[0]
+    if isinstance(instance, Ticket):
+        return _ticket_tenant(instance)[0]
+    if isinstance(instance, PaymentTransaction):
+        return _record_evaluator(instance.record_id)
+    if isinstance(instance, Notification):
+        return None  # only LAD counts notifications
+    return getattr(instance, "evaluator_id", None)
+
+
+def dashboard_cache_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if sender is User and update_fields and set(update_fields) <= {"last_login"}:
+        return
+    cache.bump_on_commit(_cache_tenant(instance))
+
+
+def dashboard_cache_deleted(sender, instance, **kwargs):
+    cache.bump_on_commit(_cache_tenant(instance))
+
+
+def dashboard_cache_bulk_created(sender, instances, **kwargs):
+    for evaluator_id in {_cache_tenant(i) for i in instances}:
+        cache.bump_on_commit(evaluator_id)
+
+
+for _model in (
+    Document,
+    Activity,
+    ActivityFile,
+    Ticket,
+    Notification,
+    PaymentRecord,
+    PaymentTransaction,
+    Evaluator,
+    Supplier,
+    User,
+):
+    post_save.connect(dashboard_cache_saved, sender=_model, dispatch_uid=f"dash_cache_save_{_model.__name__}")
+    post_delete.connect(dashboard_cache_deleted, sender=_model, dispatch_uid=f"dash_cache_del_{_model.__name__}")
+    post_bulk_create.connect(
+        dashboard_cache_bulk_created, sender=_model, dispatch_uid=f"dash_cache_bulk_{_model.__name__}"
+    )
@@ -1,3 +1,216 @@
-from django.test import TestCase
+import tempfile
+from datetime import datetime, timedelta
 
-# Create your tests here.
+from unittest import mock
+
+from django.core.cache import cache as django_cache, caches
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import Roles, User
+from activities import rules
+from activities.models import Activity, ActivityFile, FileStatus
+from documents.models import Document
+from tenants.models import Evaluator, Supplier
+from tenants.testing import TenantFixture, make_evaluator, make_supplier, supplier_user
+
+from . import cache, kpis, rollups
+from .models import RollupGrain
+
+
+class KpiCollectTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ev = make_evaluator()
+        make_supplier(cls.ev, is_active=True)
+        make_supplier(cls.ev, "s2", is_active=False)
+
+    def test_same_source_is_one_query(self):
+        suppliers = Supplier.objects.filter(evaluator=self.ev)
+        with self.assertNumQueries(1):
+            cards = kpis.collect(
+                total=kpis.count(suppliers),
+                active=kpis.count(suppliers, Q(is_active=True)),
+                inactive=kpis.count(suppliers, Q(is_active=False)),
+            )
+        self.assertEqual(cards, {"total": 2, "active": 1, "inactive": 1})
+
+    def test_one_query_per_source(self):
+        with self.assertNumQueries(2):
+            cards = kpis.collect(
+                suppliers=kpis.count(Supplier),
+                evaluators=kpis.count(Evaluator),
+                active_suppliers=kpis.count(Supplier, Q(is_active=True)),
+            )
+        self.assertEqual(cards, {"suppliers": 2, "evaluators": 1, "active_suppliers": 1})
+
+    def test_missing_source_uses_default(self):
+        with self.assertNumQueries(0):
+            cards = kpis.collect(
+                none=kpis.count(None),
+                empty=kpis.count(Supplier.objects.none()),
+                amount=kpis.total(None, "amount", default=0.0),
+            )
+        self.assertEqual(cards, {"none": 0, "empty": 0, "amount": 0.0})
+
+
+# A shared cache that costs no database queries (Redis in production), so the
+# counts below are the pages' own round-trips.
+SHARED_CACHE = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": tempfile.mkdtemp(prefix="lfras-test-cache-"),
+    }
+}
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class DashboardQueryCountTests(TenantFixture, TestCase):
+    """Each dashboard takes a fixed number of round-trips, however much data there is."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.users = {
+            Roles.LAD: User.objects.create_user("lad@lucid.test", "pw", role=Roles.LAD),
+            Roles.LUS: User.objects.create_user("lus@lucid.test", "pw", role=Roles.LUS),
+            Roles.EAD: User.objects.create_user("ead@acme.test", "pw", role=Roles.EAD, evaluator=cls.ev),
+            Roles.EVS: User.objects.create_user("evs@acme.test", "pw", role=Roles.EVS, evaluator=cls.ev),
+            Roles.SUS: supplier_user(cls.sup),
+        }
+        User.objects.filter(pk__in=[u.pk for u in cls.users.values()]).update(must_change_password=False)
+
+    def setUp(self):
+        django_cache.clear()
+
+    def _add_data(self, n):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_rows(n)
+
+    def _create_rows(self, n):
+        for i in range(n):
+            sup = Supplier.objects.create(evaluator=self.ev, name=f"Extra {n}-{i}", subdomain=f"x{n}-{i}")
+            Document.objects.create(
+                evaluator=self.ev, supplier=self.sup, title=f"doc {i}", file=f"docs/{i}.pdf", file_size=10
+            )
+            a = Activity.objects.create(evaluator=self.ev, supplier=sup, started_by=self.users[Roles.SUS])
+            for status in (FileStatus.VALID_OK, FileStatus.VALID_FAILED):
+                ActivityFile.objects.create(
+                    activity=a, original_name="f.pdf", file="f.pdf", file_size=10, status=status
+                )
+
+    # (role, url, queries with a cold cache, queries with a warm cache)
+    PAGES = [
+        (Roles.LAD, "/lad/?range=month", 17, 2),
+        (Roles.EAD, "/ead/?range=month", 12, 3),
+        (Roles.EVS, "/evs/?range=month", 10, 3),
+        (Roles.SUS, "/sus/?range=month", 8, 4),
+    ]
+    ACTIVITY_DETAIL = (10, 8)
+
+    def _get(self, url, role, n):
+        self.client.force_login(User.objects.get(pk=self.users[role].pk))
+        with self.assertNumQueries(n):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def _check_pages(self):
+        for role, url, cold, warm in self.PAGES:
+            with self.subTest(role=role):
+                django_cache.clear()
+                self._get(url, role, cold)
+                self._get(url, role, warm)
+
+    def test_fixed_query_count_with_little_data(self):
+        self._add_data(1)
+        self._check_pages()
+
+    def test_fixed_query_count_with_more_data(self):
+        self._add_data(5)
+        self._check_pages()
+
+    def test_activity_detail_fixed_query_count(self):
+        cold, warm = self.ACTIVITY_DETAIL
+        a = Activity.objects.create(evaluator=self.ev, supplier=self.sup, started_by=self.users[Roles.SUS])
+        for n in (1, 5):
+            with self.captureOnCommitCallbacks(execute=True):
+                for i in range(n):
+                    ActivityFile.objects.create(
+                        activity=a, original_name=f"{n}-{i}.pdf", file="f.pdf", file_size=10,
+                        status=FileStatus.VALID_OK,
+                    )
+            with self.subTest(files=n):
+                django_cache.clear()
+                rules._memo.clear()
+                self._get(f"/activities/{a.pk}/", Roles.SUS, cold)
+                self._get(f"/activities/{a.pk}/", Roles.SUS, warm)
+
+
+class DashboardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ev1 = make_evaluator("one")
+        cls.ev2 = make_evaluator("two")
+
+    def setUp(self):
+        django_cache.clear()
+
+    def _build(self, role, ev):
+        calls = []
+        cache.cached(role, evaluator_id=ev.id, range_key="week", builder=lambda: calls.append(1) or {})
+        return len(calls)
+
+    def test_hit_until_tenant_write(self):
+        self.assertEqual(self._build(Roles.EAD, self.ev1), 1)
+        self.assertEqual(self._build(Roles.EAD, self.ev1), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Supplier.objects.create(evaluator=self.ev1, name="New", subdomain="new")
+        self.assertEqual(self._build(Roles.EAD, self.ev1), 1)
+
+    def test_write_only_invalidates_own_tenant_and_global(self):
+        self._build(Roles.EAD, self.ev1)
+        self._build(Roles.EAD, self.ev2)
+        self._build(Roles.LAD, self.ev1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Supplier.objects.create(evaluator=self.ev2, name="New", subdomain="new")
+        self.assertEqual(self._build(Roles.EAD, self.ev1), 0)
+        self.assertEqual(self._build(Roles.EAD, self.ev2), 1)
+        self.assertEqual(self._build(Roles.LAD, self.ev1), 1)
+
+    def test_bump_from_another_process_invalidates(self):
+        self.assertEqual(self._build(Roles.EAD, self.ev1), 1)
+        # a separate backend instance stands in for another worker / cron
+        other = caches.create_connection("default")
+        with mock.patch.object(cache, "cache", other):
+            cache.bump(self.ev1.id)
+        self.assertEqual(self._build(Roles.EAD, self.ev1), 1)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_per_process_cache_is_not_used(self):
+        with mock.patch.object(cache, "cache", caches["default"]):
+            self.assertEqual(self._build(Roles.EAD, self.ev1), 1)
+            self.assertEqual(self._build(Roles.EAD, self.ev1), 1)
+
+
+class RollupRangeTests(TestCase):
+    def _at(self, *args):
+        return timezone.make_aware(datetime(*args))
+
+    def test_align_rounds_to_the_bucket(self):
+        end = self._at(2026, 3, 10, 15, 30)
+        self.assertEqual(rollups.align(end - timedelta(days=7), end), self._at(2026, 3, 3))
+        self.assertEqual(rollups.align(end - timedelta(days=1), end), self._at(2026, 3, 9, 15))
+
+    def test_day_range_keeps_hour_grain_after_alignment(self):
+        end = timezone.now()
+        start = rollups.align(end - timedelta(days=1), end)
+        self.assertEqual(rollups.grain_for(start, end), RollupGrain.HOUR)
+
+    def test_totals_count_only_buckets_inside_the_aligned_window(self):
+        end = self._at(2026, 3, 10, 15, 30)
+        start = rollups.align(end - timedelta(days=7), end)
+        for ts in (self._at(2026, 3, 2, 23), self._at(2026, 3, 3, 1), self._at(2026, 3, 10, 15)):
+            rollups.bump(ts, evaluator_id=1, docs_uploaded=1)
+        facts = rollups.totals(start, end, evaluator_id=1, metrics=("docs_uploaded",))
+        self.assertEqual(facts["docs_uploaded"], 2)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+
+from django.db import models
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth
+from django.utils import timezone
+
+GRAINS = ("hour", "day", "month")
+
+LABEL_FORMATS = {
+    "hour": "%b %d, %H:00",
+    "day": "%b %d",
+    "month": "%b %Y",
+}
+
+_TRUNC = {"hour": TruncHour, "day": TruncDay, "month": TruncMonth}
+
+
+@dataclass
+class TimeSeries:
+    """Bucket starts (naive, in the requested timezone), labels and one list per aggregate."""
+
+    keys: list = field(default_factory=list)
+    labels: list = field(default_factory=list)
+    series: dict = field(default_factory=dict)
+
+    def __getitem__(self, name):
+        return self.series[name]
+
+
+def _floor(dt: datetime, grain: str) -> datetime:
+    dt = dt.replace(minute=0, second=0, microsecond=0)
+    if grain in ("day", "month"):
+        dt = dt.replace(hour=0)
+    if grain == "month":
+        dt = dt.replace(day=1)
+    return dt
+
+
+def _step(dt: datetime, grain: str) -> datetime:
+    if grain == "hour":
+        return dt + timedelta(hours=1)
+    if grain == "day":
+        return dt + timedelta(days=1)
+    y, m = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+    return dt.replace(year=y, month=m)
+
+
+def _naive_local(value, tz) -> datetime | None:
+    """Normalize a DB bucket (aware datetime or date) to a naive local datetime."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value, tz)
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return datetime.combine(value, time.min)
+    return None
+
+
+def bucket_keys(start, end, grain: str, tz=None) -> list:
+    """Every bucket start between start and end (inclusive), naive in `tz`."""
+    if grain not in GRAINS:
+        raise ValueError(f"Unknown grain '{grain}'")
+    tz = tz or timezone.get_current_timezone()
+    cur = _floor(_naive_local(start, tz), grain)
+    till = _floor(_naive_local(end, tz), grain)
+    keys = []
+    while cur <= till:
+        keys.append(cur)
+        cur = _step(cur, grain)
+    return keys
+
+
+def bucket_labels(start, end, grain: str, tz=None) -> list:
+    fmt = LABEL_FORMATS[grain]
+    return [k.strftime(fmt) for k in bucket_keys(start, end, grain, tz)]
+
+
+def bucket_series(
+    qs,
+    ts_field: str,
+    start,
+    end,
+    *,
+    grain: str = "day",
+    aggregates: dict | None = None,
+    tz=None,
+) -> TimeSeries:
+    """
+    Group `qs` by `ts_field` truncated to `grain` in the database and return a
+    gap-filled TimeSeries for [start, end].
+
+    `aggregates` maps series names to aggregate expressions (default: a single
+    "count" series). Counts come back as ints, everything else as floats.
+    DateFields cannot be truncated to hours; they bucket on midnight instead.
+    `qs=None` yields zero-filled series, mirroring the optional-model pattern
+    used by the dashboards.
+    """
+    tz = tz or timezone.get_current_timezone()
+    aggregates = aggregates or {"count": Count("pk")}
+    keys = bucket_keys(start, end, grain, tz)
+    series = {name: {k: 0 for k in keys} for name in aggregates}
+
+    if qs is not None and keys:
+        model_field = qs.model._meta.get_field(ts_field)
+        trunc_grain = grain
+        if grain == "hour" and not isinstance(model_field, models.DateTimeField):
+            trunc_grain = "day"
+        if isinstance(model_field, models.DateTimeField):
+            trunc = _TRUNC[trunc_grain](ts_field, tzinfo=tz)
+            lower = timezone.make_aware(keys[0], tz)
+            window = {f"{ts_field}__gte": lower, f"{ts_field}__lte": end}
+        else:
+            trunc = _TRUNC[trunc_grain](ts_field)
+            window = {f"{ts_field}__gte": keys[0].date(), f"{ts_field}__lte": _naive_local(end, tz).date()}
+
+        rows = (
+            qs.filter(**window)
+            .annotate(_bucket=trunc)
+            .values("_bucket")
+            .annotate(**aggregates)
+            .order_by("_bucket")
+        )
+        for row in rows:
+            key = _naive_local(row["_bucket"], tz)
+            if key is None:
+                continue
+            key = _floor(key, grain)
+            for name in aggregates:
+                if key in series[name]:
+                    series[name][key] += row[name] or 0
+
+    out = {}
+    for name, agg in aggregates.items():
+        cast = int if isinstance(agg, Count) else float
+        out[name] = [cast(series[name][k]) for k in keys]
+
+    fmt = LABEL_FORMATS[grain]
+    return TimeSeries(keys=keys, labels=[k.strftime(fmt) for k in keys], series=out)
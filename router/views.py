@@ -1,24 +1,29 @@
 from __future__ import annotations
 from datetime import timedelta, date
-from django.db import models
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Count, Sum
-from django.db.models.functions import TruncDate
-from django.db.models.functions import TruncMonth
+from django.db.models import Count, Q, Sum
 from django.shortcuts import redirect, render
 from django.utils import timezone
 
 from accounts.models import Roles
+from tenants import ledger
 from documents.models import Document
 
+from . import cache, kpis, rollups, timeseries
+
 
 # ---------- helpers ----------
 
 
 def _parse_range(request):
-    """Parse ?range=day|week|month or 7d|30d|90d (default month=30d). Returns (start, end, label)."""
+    """
+    Parse ?range=day|week|month or 7d|30d|90d (default month=30d). Returns (start, end, label).
+
+    The start is rounded down to the hour ("day") or to midnight, so rollup
+    totals and live queries over the window count the same rows.
+    """
     end = timezone.now()
     rng = (request.GET.get("range") or "").lower()
     if rng in {"day", "1d"}:
@@ -29,10 +34,14 @@ def _parse_range(request):
         days, label = 90, "last 90 days"
     else:  # month or default
         days, label = 30, "last 30 days"
-    start = end - timedelta(days=days)
+    start = rollups.align(end - timedelta(days=days), end)
     return start, end, label
 
 
+def _range_key(request) -> str:
+    return (request.GET.get("range") or "").lower()
+
+
 def _shift_month(d: date, delta_months: int) -> date:
     """First day of month shifted by delta_months (can be negative)."""
     y = d.year + (d.month - 1 + delta_months) // 12
@@ -40,12 +49,14 @@ def _shift_month(d: date, delta_months: int) -> date:
     return date(y, m, 1)
 
 
+def _last_12_month_window():
+    """(first day of the month 11 months ago, now) — the monthly charts' window."""
+    start = _shift_month(timezone.localdate().replace(day=1), -11)
+    return start, timezone.now()
+
+
 def _last_12_month_labels():
-    end = date.today().replace(day=1)
-    labels = []
-    for i in range(11, -1, -1):
-        labels.append(_shift_month(end, -i).strftime("%b %Y"))
-    return labels
+    return timeseries.bucket_labels(*_last_12_month_window(), "month")
 
 
 def _human_bytes(n: int) -> str:
@@ -61,39 +72,34 @@ def _human_bytes(n: int) -> str:
 
 
 def _monthly_count_series(qs, ts_field: str, labels):
-    if qs is None:
-        return [0] * len(labels)
-    agg = (
-        qs.annotate(m=TruncMonth(ts_field))
-        .values("m")
-        .annotate(c=Count("id"))
-        .order_by("m")
-    )
-    m = {k: 0 for k in labels}
-    for row in agg:
-        if row["m"]:
-            key = row["m"].strftime("%b %Y")
-            if key in m:
-                m[key] = int(row["c"] or 0)
-    return [m[k] for k in labels]
+    ts = timeseries.bucket_series(qs, ts_field, *_last_12_month_window(), grain="month")
+    by_label = dict(zip(ts.labels, ts["count"]))
+    return [by_label.get(k, 0) for k in labels]
 
 
 def _monthly_sum_series(qs, ts_field: str, amount_field: str, labels):
-    if qs is None:
-        return [0] * len(labels)
-    agg = (
-        qs.annotate(m=TruncMonth(ts_field))
-        .values("m")
-        .annotate(s=Sum(amount_field))
-        .order_by("m")
+    ts = timeseries.bucket_series(
+        qs,
+        ts_field,
+        *_last_12_month_window(),
+        grain="month",
+        aggregates={"sum": Sum(amount_field)},
+    )
+    by_label = dict(zip(ts.labels, ts["sum"]))
+    return [by_label.get(k, 0) for k in labels]
+
+
+def _rollup_monthly_series(metric: str, labels, *, evaluator_id=None, supplier_id=None):
+    """Monthly series for a rollup metric (counts as ints, revenue as floats)."""
+    series = _monthly_sum_series(
+        rollups.scoped(evaluator_id=evaluator_id, supplier_id=supplier_id),
+        "bucket",
+        metric,
+        labels,
     )
-    m = {k: 0 for k in labels}
-    for row in agg:
-        if row["m"]:
-            key = row["m"].strftime("%b %Y")
-            if key in m:
-                m[key] = float(row["s"] or 0)
-    return [m[k] for k in labels]
+    if metric in rollups.COUNT_METRICS:
+        return [int(v) for v in series]
+    return series
 
 
 # role checks
@@ -149,30 +155,16 @@ def index(request):
 # ---------- LAD ----------
 
 
-@login_required
-@user_passes_test(is_LAD)
-def lad_dashboard(request):
+def _lad_context(request) -> dict:
     start, end, label = _parse_range(request)
 
     from tenants.models import Evaluator, Supplier
     from accounts.models import User
 
     try:
-        from documents.models import Document
-    except Exception:
-        Document = None
-    try:
-        from tickets.models import Ticket, TicketAttachment
-    except Exception:
-        Ticket = TicketAttachment = None
-    try:
-        from activities.models import ActivityFile
-    except Exception:
-        ActivityFile = None
-    try:
-        from notifications.models import Notification
+        from tickets.models import Ticket
     except Exception:
-        Notification = None
+        Ticket = None
     try:
         from payments.models import PaymentTransaction
     except Exception:
@@ -182,24 +174,19 @@ def lad_dashboard(request):
     except Exception:
         PaymentRecord = None
 
-    eval_count = Evaluator.objects.filter(is_active=True).count()
-    supplier_count = Supplier.objects.count()
-    lucid_staff = User.objects.filter(role__in=[Roles.LAD, Roles.LUS]).count()
-    docs_range = (
-        Document.objects.filter(uploaded_at__range=(start, end)).count()
-        if Document
-        else 0
-    )
-    open_tickets = (
-        Ticket.objects.exclude(status__in=["resolved", "closed"]).count()
-        if Ticket
-        else 0
-    )
-    notif_sent = (
-        Notification.objects.filter(created_at__range=(start, end)).count()
-        if Notification
-        else 0
+    cards = kpis.collect(
+        eval_count=kpis.count(Evaluator, Q(is_active=True)),
+        supplier_count=kpis.count(Supplier),
+        lucid_staff=kpis.count(User, Q(role__in=[Roles.LAD, Roles.LUS])),
+        open_tickets=kpis.count(Ticket, ~Q(status__in=["resolved", "closed"])),
     )
+    eval_count = cards["eval_count"]
+    supplier_count = cards["supplier_count"]
+    lucid_staff = cards["lucid_staff"]
+    open_tickets = cards["open_tickets"]
+    facts = rollups.totals(start, end, metrics=("docs_uploaded", "notifications_sent"))
+    docs_range = facts["docs_uploaded"]
+    notif_sent = facts["notifications_sent"]
 
     # ---- recent rows (pre-sliced; no further filtering in templates) ----
     recent_evaluators = list(Evaluator.objects.order_by("-created_at")[:5])
@@ -214,46 +201,12 @@ def lad_dashboard(request):
         else []
     )
 
-    # storage
-    doc_bytes = (
-        Document.objects.filter(uploaded_at__range=(start, end)).aggregate(
-            s=Sum("file_size")
-        )["s"]
-        or 0
-        if Document
-        else 0
-    )
-    attach_bytes = 0
-    if TicketAttachment:
-        try:
-            # If the model has a persisted file_size field, use the DB to sum it.
-            field_names = {f.name for f in TicketAttachment._meta.get_fields()}
-            if "file_size" in field_names:
-                attach_bytes = TicketAttachment.objects.aggregate(s=Sum("file_size")).get("s") or 0
-            else:
-                # Fall back to summing the in-storage sizes (no DB column). This keeps the
-                # dashboard working without altering the schema.
-                attach_bytes = sum((a.file.size or 0) for a in TicketAttachment.objects.only("file"))
-        except Exception:
-            attach_bytes = 0
-    act_bytes = (
-        ActivityFile.objects.aggregate(s=Sum("file_size"))["s"] or 0
-        if ActivityFile
-        else 0
-    )
-    total_bytes = (
-        ActivityFile.objects.aggregate(total=models.Sum("file_size")).get("total") or 0
-    )
-    s3_used = _human_bytes(total_bytes)
+    # storage (ledger maintained on upload/delete; see tenants.ledger)
+    total_bytes = ledger.usage()["bytes"]
 
     # charts
     labels = _last_12_month_labels()
-    chart_revenue = _monthly_sum_series(
-        PaymentTransaction.objects.all() if PaymentTransaction else None,
-        "paid_on",
-        "amount",
-        labels,
-    )
+    chart_revenue = _rollup_monthly_series("revenue", labels)
     total_revenue = float(sum(chart_revenue or []))
     chart_evals = _monthly_count_series(Evaluator.objects.all(), "created_at", labels)
 
@@ -274,74 +227,16 @@ def lad_dashboard(request):
     if rng in {"30d", "90d", "1d"}:  # collapse 30d->month (approx), 1d->day, keep 90d as 90d window with day granularity
         rng = {"30d": "month", "90d": "month", "1d": "day"}[rng]
 
-    now = timezone.localtime()
-    start_dt = start  # from _parse_range
-    end_dt = end
     gran = "hour" if rng == "day" else "day"
 
-    from collections import OrderedDict
-    from datetime import datetime as _dt, date as _date
-
-    def bucket_keys():
-        keys = []
-        if gran == "hour":
-            cur = start_dt.replace(minute=0, second=0, microsecond=0)
-            till = end_dt.replace(minute=0, second=0, microsecond=0)
-            while cur <= till:
-                keys.append(cur)
-                cur += timedelta(hours=1)
-        else:
-            cur = start_dt.date()
-            till = end_dt.date()
-            while cur <= till:
-                # store as datetime for consistent keys
-                keys.append(_dt.combine(cur, _dt.min.time(), tzinfo=now.tzinfo))
-                cur += timedelta(days=1)
-        return keys
-
-    def label_for(dt):
-        return dt.strftime("%b %d, %H:00") if gran == "hour" else dt.strftime("%b %d")
-
-    def to_bucket(v):
-        d = v
-        if isinstance(d, str):
-            for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M:%S%z", "%Y-%m-%d"):
-                try:
-                    d = _dt.strptime(d[:len(fmt)], fmt)
-                    break
-                except Exception:
-                    continue
-        if isinstance(d, _date) and not isinstance(d, _dt):
-            d = _dt.combine(d, _dt.min.time(), tzinfo=now.tzinfo)
-        if not isinstance(d, _dt):
-            return None
-        return d.replace(minute=0, second=0, microsecond=0, tzinfo=now.tzinfo) if gran == "hour" else _dt.combine(d.date(), _dt.min.time(), tzinfo=now.tzinfo)
-
-    keys = bucket_keys()
-
     # Evaluators Created
-    eval_series = OrderedDict((k, 0) for k in keys)
-    for r in (
-        Evaluator.objects
-        .filter(created_at__gte=start_dt, created_at__lte=end_dt)
-        .values("created_at")
-    ):
-        b = to_bucket(r["created_at"])
-        if b in eval_series:
-            eval_series[b] += 1
-    eval_labels = [label_for(k) for k in eval_series.keys()]
-    eval_data = list(eval_series.values())
+    evals_ts = timeseries.bucket_series(
+        Evaluator.objects.all(), "created_at", start, end, grain=gran
+    )
+    eval_labels = evals_ts.labels
+    eval_data = evals_ts["count"]
 
     # Payments (count & amount) — detect model/fields
-    try:
-        from payments.models import PaymentTransaction
-    except Exception:
-        PaymentTransaction = None
-    try:
-        from payments.models import PaymentRecord
-    except Exception:
-        PaymentRecord = None
-
     def detect_fields(model):
         if not model:
             return None, None
@@ -353,34 +248,21 @@ def lad_dashboard(request):
     pay_model = PaymentTransaction or PaymentRecord
     pay_date_field, pay_amount_field = detect_fields(pay_model)
 
-    pay_count_series = OrderedDict((k, 0) for k in keys)
-    pay_amount_series = OrderedDict((k, 0.0) for k in keys)
-
-    if pay_model and pay_date_field:
-        rows_qs = pay_model.objects.filter(**{f"{pay_date_field}__gte": start_dt, f"{pay_date_field}__lte": end_dt})
-        if pay_amount_field:
-            rows_qs = rows_qs.values(pay_date_field, pay_amount_field)
-        else:
-            rows_qs = rows_qs.values(pay_date_field)
-        for r in rows_qs:
-            b = to_bucket(r.get(pay_date_field))
-            if b in pay_count_series:
-                pay_count_series[b] += 1
-                if pay_amount_field:
-                    amt = r.get(pay_amount_field) or 0
-                    try:
-                        pay_amount_series[b] += float(amt)
-                    except Exception:
-                        from decimal import Decimal
-                        try:
-                            pay_amount_series[b] += float(Decimal(amt))
-                        except Exception:
-                            pass
-
-    pay_count_labels = [label_for(k) for k in pay_count_series.keys()]
-    pay_count_data = list(pay_count_series.values())
-    pay_amount_labels = [label_for(k) for k in pay_amount_series.keys()]
-    pay_amount_data = list(pay_amount_series.values())
+    pay_aggs = {"count": Count("pk")}
+    if pay_amount_field:
+        pay_aggs["amount"] = Sum(pay_amount_field)
+    pay_ts = timeseries.bucket_series(
+        pay_model.objects.all() if pay_model and pay_date_field else None,
+        pay_date_field or "pk",
+        start,
+        end,
+        grain=gran,
+        aggregates=pay_aggs,
+    )
+    pay_count_labels = pay_ts.labels
+    pay_count_data = pay_ts["count"]
+    pay_amount_labels = pay_ts.labels
+    pay_amount_data = pay_ts.series.get("amount", [0.0] * len(pay_ts.keys))
 
     ctx = dict(
         range_label=label,
@@ -409,48 +291,47 @@ def lad_dashboard(request):
         pay_amount_labels=pay_amount_labels,
         pay_amount_data=pay_amount_data,
     )
+    return ctx
+
+
+@login_required
+@user_passes_test(is_LAD)
+def lad_dashboard(request):
+    ctx = cache.cached(
+        Roles.LAD, range_key=_range_key(request), builder=lambda: _lad_context(request)
+    )
     return render(request, "dash/lad.html", ctx)
 
 
 # ---------- LUS ----------
 
 
-@login_required
-@user_passes_test(is_LUS)
-def lus_dashboard(request):
+def _lus_context(request) -> dict:
     start, end, label = _parse_range(request)
 
     from tenants.models import Evaluator, Supplier
     from accounts.models import User
 
-    try:
-        from documents.models import Document
-    except Exception:
-        Document = None
     try:
         from tickets.models import Ticket
     except Exception:
         Ticket = None
 
-    eval_count = Evaluator.objects.count()
-    supplier_count = Supplier.objects.count()
-    lucid_staff = User.objects.filter(role__in=[Roles.LAD, Roles.LUS]).count()
-    docs_range = (
-        Document.objects.filter(uploaded_at__range=(start, end)).count()
-        if Document
-        else 0
-    )
-    tickets_open = (
-        Ticket.objects.exclude(status__in=["resolved", "closed"]).count()
-        if Ticket
-        else 0
+    cards = kpis.collect(
+        eval_count=kpis.count(Evaluator),
+        supplier_count=kpis.count(Supplier),
+        lucid_staff=kpis.count(User, Q(role__in=[Roles.LAD, Roles.LUS])),
+        tickets_open=kpis.count(Ticket, ~Q(status__in=["resolved", "closed"])),
     )
+    eval_count = cards["eval_count"]
+    supplier_count = cards["supplier_count"]
+    lucid_staff = cards["lucid_staff"]
+    tickets_open = cards["tickets_open"]
+    docs_range = rollups.totals(start, end, metrics=("docs_uploaded",))["docs_uploaded"]
 
     # simple chart: tickets opened per month
     labels = _last_12_month_labels()
-    chart_tickets = _monthly_count_series(
-        Ticket.objects.all() if Ticket else None, "created_at", labels
-    )
+    chart_tickets = _rollup_monthly_series("tickets_opened", labels)
 
     ctx = dict(
         range_label=label,
@@ -464,20 +345,23 @@ def lus_dashboard(request):
         chart_labels=labels,
         chart_tickets=chart_tickets,
     )
+    return ctx
+
+
+@login_required
+@user_passes_test(is_LUS)
+def lus_dashboard(request):
+    ctx = cache.cached(
+        Roles.LUS, range_key=_range_key(request), builder=lambda: _lus_context(request)
+    )
     return render(request, "dash/lus.html", ctx)
 
 
 # ---------- EAD ----------
 
 
-@login_required
-@user_passes_test(is_EAD)
-def ead_dashboard(request):
+def _ead_context(request, ev) -> dict:
     start, end, label = _parse_range(request)
-    ev = _require_evaluator(request.user)
-    if not ev:
-        messages.error(request, "No Evaluator associated with your account.")
-        return redirect("accounts:logout")
 
     from tenants.models import Supplier
 
@@ -485,10 +369,6 @@ def ead_dashboard(request):
         from documents.models import Document
     except Exception:
         Document = None
-    try:
-        from activities.models import Activity
-    except Exception:
-        Activity = None
     from accounts.models import User
 
     try:
@@ -496,31 +376,26 @@ def ead_dashboard(request):
     except Exception:
         PaymentRecord = None
 
-    supplier_count = Supplier.objects.filter(evaluator=ev).count()
-    evs_count = User.objects.filter(
-        evaluator=ev, role=Roles.EVS, is_active=True
-    ).count()
-    docs_count = (
-        Document.objects.filter(evaluator=ev, uploaded_at__range=(start, end)).count()
-        if Document
-        else 0
-    )
-    act_count = (
-        Activity.objects.filter(evaluator=ev, started_at__range=(start, end)).count()
-        if Activity
-        else 0
-    )
-
-    if Document:
-        today = timezone.localdate()
-        week_end = today + timedelta(days=7)
-        expiring_week = Document.objects.filter(
-            evaluator=ev,
-            is_active=True,
-            expires_at__date__range=(today, week_end),
-        ).count()
-    else:
-        expiring_week = 0
+    today = timezone.localdate()
+    week_end = today + timedelta(days=7)
+    cards = kpis.collect(
+        supplier_count=kpis.count(Supplier.objects.filter(evaluator=ev)),
+        evs_count=kpis.count(
+            User.objects.filter(evaluator=ev), Q(role=Roles.EVS, is_active=True)
+        ),
+        expiring_week=kpis.count(
+            Document.objects.filter(evaluator=ev) if Document else None,
+            Q(is_active=True, expires_at__date__range=(today, week_end)),
+        ),
+    )
+    supplier_count = cards["supplier_count"]
+    evs_count = cards["evs_count"]
+    expiring_week = cards["expiring_week"]
+    facts = rollups.totals(
+        start, end, evaluator_id=ev.id, metrics=("docs_uploaded", "activities_started")
+    )
+    docs_count = facts["docs_uploaded"]
+    act_count = facts["activities_started"]
 
     active_plan = (
         PaymentRecord.objects.filter(evaluator=ev, status="active")
@@ -531,16 +406,8 @@ def ead_dashboard(request):
     )
 
     labels = _last_12_month_labels()
-    chart_docs = _monthly_count_series(
-        Document.objects.filter(evaluator=ev) if Document else None,
-        "uploaded_at",
-        labels,
-    )
-    chart_acts = _monthly_count_series(
-        Activity.objects.filter(evaluator=ev) if Activity else None,
-        "started_at",
-        labels,
-    )
+    chart_docs = _rollup_monthly_series("docs_uploaded", labels, evaluator_id=ev.id)
+    chart_acts = _rollup_monthly_series("activities_started", labels, evaluator_id=ev.id)
 
     # plan limits (from your pricing tiers)
     plan_key = getattr(active_plan, "plan", None) if active_plan else None
@@ -558,6 +425,7 @@ def ead_dashboard(request):
         "users": evs_count,
         "documents": docs_count,
         "activities": act_count,
+        "storage_bytes": ledger.usage(evaluator_id=ev.id)["bytes"],
     }
     ctx = dict(
         range_label=label,
@@ -576,31 +444,33 @@ def ead_dashboard(request):
         usage_limits=usage_limits,
         usage_used=usage_used,
     )
-    return render(request, "dash/ead.html", ctx)
-
-
-# ---------- EVS ----------
+    return ctx
 
 
 @login_required
-@user_passes_test(is_EVS)
-def evs_dashboard(request):
-    start, end, label = _parse_range(request)
+@user_passes_test(is_EAD)
+def ead_dashboard(request):
     ev = _require_evaluator(request.user)
     if not ev:
         messages.error(request, "No Evaluator associated with your account.")
         return redirect("accounts:logout")
+    ctx = cache.cached(
+        Roles.EAD,
+        evaluator_id=ev.id,
+        range_key=_range_key(request),
+        builder=lambda: _ead_context(request, ev),
+    )
+    return render(request, "dash/ead.html", ctx)
+
+
+# ---------- EVS ----------
+
+
+def _evs_context(request, ev) -> dict:
+    start, end, label = _parse_range(request)
 
     from tenants.models import Supplier
 
-    try:
-        from documents.models import Document
-    except Exception:
-        Document = None
-    try:
-        from activities.models import Activity
-    except Exception:
-        Activity = None
     from accounts.models import User
 
     try:
@@ -608,32 +478,23 @@ def evs_dashboard(request):
     except Exception:
         PaymentRecord = None
 
-    supplier_count = Supplier.objects.filter(evaluator=ev, is_active=True).count()
-    evs_count = User.objects.filter(
-        evaluator=ev, role=Roles.EVS, is_active=True
-    ).count()
-    act_count = (
-        Activity.objects.filter(evaluator=ev, started_at__range=(start, end)).count()
-        if Activity
-        else 0
+    cards = kpis.collect(
+        supplier_count=kpis.count(Supplier.objects.filter(evaluator=ev), Q(is_active=True)),
+        evs_count=kpis.count(
+            User.objects.filter(evaluator=ev), Q(role=Roles.EVS, is_active=True)
+        ),
     )
-    docs_count = (
-        Document.objects.filter(evaluator=ev, uploaded_at__range=(start, end)).count()
-        if Document
-        else 0
+    supplier_count = cards["supplier_count"]
+    evs_count = cards["evs_count"]
+    facts = rollups.totals(
+        start, end, evaluator_id=ev.id, metrics=("docs_uploaded", "activities_started")
     )
+    act_count = facts["activities_started"]
+    docs_count = facts["docs_uploaded"]
 
     labels = _last_12_month_labels()
-    chart_docs = _monthly_count_series(
-        Document.objects.filter(evaluator=ev) if Document else None,
-        "uploaded_at",
-        labels,
-    )
-    chart_acts = _monthly_count_series(
-        Activity.objects.filter(evaluator=ev) if Activity else None,
-        "started_at",
-        labels,
-    )
+    chart_docs = _rollup_monthly_series("docs_uploaded", labels, evaluator_id=ev.id)
+    chart_acts = _rollup_monthly_series("activities_started", labels, evaluator_id=ev.id)
 
     active_plan = (
         PaymentRecord.objects.filter(evaluator=ev, status="active")
@@ -655,113 +516,59 @@ def evs_dashboard(request):
         "chart_labels": labels,
         "chart_docs": chart_docs,
         "chart_acts": chart_acts,
+        # (label, value) rows for the trend lists; templates have no zip
+        "chart_docs_rows": list(zip(labels, chart_docs)),
+        "chart_acts_rows": list(zip(labels, chart_acts)),
         "active_plan": active_plan,
     }
-    return render(request, "dash/evs.html", ctx)
-
-
-# ---------- SUS ----------
+    return ctx
 
 
 @login_required
-@user_passes_test(is_SUS)
-def sus_dashboard(request):
-    start, end, label = _parse_range(request)
+@user_passes_test(is_EVS)
+def evs_dashboard(request):
     ev = _require_evaluator(request.user)
-    sup = _require_supplier(request.user)
-    if not (ev and sup):
-        messages.error(request, "No Supplier/Evaluator associated with your account.")
+    if not ev:
+        messages.error(request, "No Evaluator associated with your account.")
         return redirect("accounts:logout")
+    ctx = cache.cached(
+        Roles.EVS,
+        evaluator_id=ev.id,
+        range_key=_range_key(request),
+        builder=lambda: _evs_context(request, ev),
+    )
+    return render(request, "dash/evs.html", ctx)
 
-    try:
-        from activities.models import Activity, ActivityFile
-    except Exception:
-        Activity = ActivityFile = None
-    try:
-        from documents.models import Document
-    except Exception:
-        Document = None
 
-    # Activities in selected range for this supplier/evaluator
-    act_count = (
-        Activity.objects.filter(
-            evaluator_id=ev.id,
-            supplier_id=sup.id,
-            started_at__range=(start, end),
-        ).count()
-        if Activity
-        else 0
-    )
+# ---------- SUS ----------
 
-    # Files across activities for this supplier/evaluator, filtered by the file's uploaded timestamp
-    failed_statuses = []
-    if ActivityFile:
-        # Build failure set dynamically to avoid attribute errors
-        try:
-            failed_statuses = [ActivityFile.status.VALID_FAILED]  # if inner enum exists
-        except Exception:
-            from activities.models import FileStatus as _FS  # fallback if status is module-level
-            failed_statuses = [_FS.VALID_FAILED]
-        # Add UPLOAD_FAILED if present
-        try:
-            # handle both enum-on-model and module-level constant
-            failed_statuses.append(ActivityFile.FileStatus.UPLOAD_FAILED)
-        except Exception:
-            try:
-                from activities.models import FileStatus as _FS
-                if hasattr(_FS, "UPLOAD_FAILED"):
-                    failed_statuses.append(_FS.UPLOAD_FAILED)
-            except Exception:
-                pass
-
-    files_valid_ok = (
-        ActivityFile.objects.filter(
-            activity__evaluator_id=ev.id,
-            activity__supplier_id=sup.id,
-            status=getattr(ActivityFile.status, "VALID_OK", "VALID_OK"),
-            uploaded_at__range=(start, end),
-        ).count()
-        if ActivityFile
-        else 0
-    )
 
-    files_failed = (
-        ActivityFile.objects.filter(
-            activity__evaluator_id=ev.id,
-            activity__supplier_id=sup.id,
-            status__in=failed_statuses,
-            uploaded_at__range=(start, end),
-        ).count()
-        if ActivityFile and failed_statuses
-        else 0
-    )
+def _sus_context(request, ev, sup) -> dict:
+    start, end, label = _parse_range(request)
 
-    # Total documents uploaded by this supplier in range (optional card)
-    docs_count = (
-        Document.objects.filter(
-            evaluator_id=ev.id,
-            supplier_id=sup.id,
-            uploaded_at__range=(start, end),
-        ).count()
-        if Document
-        else 0
+    # Range facts for this supplier/evaluator; files are bucketed by their
+    # uploaded timestamp, documents by uploaded_at, activities by started_at.
+    facts = rollups.totals(
+        start,
+        end,
+        evaluator_id=ev.id,
+        supplier_id=sup.id,
+        metrics=("activities_started", "files_ok", "files_failed", "docs_uploaded"),
     )
+    act_count = facts["activities_started"]
+    files_valid_ok = facts["files_ok"]
+    files_failed = facts["files_failed"]
+    docs_count = facts["docs_uploaded"]
 
     # For completeness, also compute total files regardless of range (useful for secondary info)
-    files_count = (
-        ActivityFile.objects.filter(
-            activity__evaluator_id=ev.id, activity__supplier_id=sup.id
-        ).count()
-        if ActivityFile
-        else 0
-    )
+    files_count = rollups.all_time(
+        evaluator_id=ev.id, supplier_id=sup.id, metrics=("files_uploaded",)
+    )["files_uploaded"]
 
     # chart: activities per month for this supplier
     labels = _last_12_month_labels()
-    chart_acts = _monthly_count_series(
-        Activity.objects.filter(evaluator=ev, supplier=sup) if Activity else None,
-        "started_at",
-        labels,
+    chart_acts = _rollup_monthly_series(
+        "activities_started", labels, evaluator_id=ev.id, supplier_id=sup.id
     )
 
     ctx = dict(
@@ -778,4 +585,22 @@ def sus_dashboard(request):
         files_failed=files_failed,
         files_count=files_count,
     )
+    return ctx
+
+
+@login_required
+@user_passes_test(is_SUS)
+def sus_dashboard(request):
+    ev = _require_evaluator(request.user)
+    sup = _require_supplier(request.user)
+    if not (ev and sup):
+        messages.error(request, "No Supplier/Evaluator associated with your account.")
+        return redirect("accounts:logout")
+    ctx = cache.cached(
+        Roles.SUS,
+        evaluator_id=ev.id,
+        supplier_id=sup.id,
+        range_key=_range_key(request),
+        builder=lambda: _sus_context(request, ev, sup),
+    )
     return render(request, "dash/sus.html", ctx)
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import SearchEntry
+
+
+@admin.register(SearchEntry)
+class SearchEntryAdmin(admin.ModelAdmin):
+    list_display = ("kind", "object_id", "title", "evaluator", "supplier", "updated_at")
+    list_filter = ("kind",)
+    search_fields = ("title",)
+    readonly_fields = ("kind", "object_id", "evaluator", "supplier", "title", "names", "body", "url", "updated_at")
@@ -0,0 +1,15 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate, pre_migrate
+
+
+class SearchConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "search"
+
+    def ready(self):
+        from . import signals
+
+        # migrations are generated per deploy, so the extension and the
+        # PostgreSQL-only indexes are created here
+        pre_migrate.connect(signals.create_trigram_extension, sender=self)
+        post_migrate.connect(signals.create_postgres_indexes, sender=self)
@@ -0,0 +1,140 @@
+"""
+What the search index stores for each kind of object.
+
+An Indexer turns one model instance into the columns of its SearchEntry.
+`dependents` lists the kinds whose entries embed this object's name (a
+supplier's entry carries its evaluator's name, ...), with the lookup from
+that kind's model to this one, so a rename re-indexes them.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable
+from urllib.parse import quote
+
+from django.apps import apps
+from django.urls import reverse
+
+
+def _join(*parts) -> str:
+    return " ".join(str(p) for p in parts if p)
+
+
+@dataclass(frozen=True)
+class Indexer:
+    kind: str
+    model: str  # "app_label.Model"
+    build: Callable  # instance -> dict of SearchEntry fields
+    select_related: tuple = ()
+    dependents: tuple = ()  # (kind, lookup to this model)
+
+    def get_model(self):
+        return apps.get_model(self.model)
+
+    def queryset(self):
+        return self.get_model()._default_manager.select_related(*self.select_related)
+
+
+def _document(d) -> dict:
+    return {
+        "title": d.title,
+        "names": _join(d.supplier.name if d.supplier_id else "", d.evaluator.name if d.evaluator_id else ""),
+        "body": _join(d.get_category_display(), d.download_name),
+        "evaluator_id": d.evaluator_id,
+        "supplier_id": d.supplier_id,
+        "url": reverse("documents:detail", args=[d.pk]),
+    }
+
+
+def _supplier(s) -> dict:
+    return {
+        "title": s.name,
+        "names": _join(s.subdomain, s.evaluator.name, s.poc_name, s.email, s.primary_email),
+        "body": _join(s.website, s.city, s.state, s.country, s.notes),
+        "evaluator_id": s.evaluator_id,
+        "supplier_id": s.pk,
+        "url": reverse("tenants:supplier_detail", args=[s.pk]),
+    }
+
+
+def _evaluator(e) -> dict:
+    return {
+        "title": e.name,
+        "names": _join(e.subdomain, e.email_domain, e.poc_name, e.poc_email),
+        "body": _join(e.website, e.city, e.state),
+        "evaluator_id": e.pk,
+        "supplier_id": None,
+        "url": reverse("tenants:evaluator_detail") + "?q=" + quote(e.name),
+    }
+
+
+def _ticket(t) -> dict:
+    evaluator_id, supplier_id = t.tenant_ids()
+    return {
+        "title": t.title,
+        "names": _join(t.get_status_display(), t.get_priority_display()),
+        "body": t.description,
+        "evaluator_id": evaluator_id,
+        "supplier_id": supplier_id,
+        "url": reverse("tickets:detail", args=[t.pk]),
+    }
+
+
+def _payment(r) -> dict:
+    return {
+        "title": r.evaluator.name,
+        "names": _join(r.subscription_id, r.get_plan_display(), r.get_status_display()),
+        "body": r.notes,
+        "evaluator_id": r.evaluator_id,
+        "supplier_id": None,
+        "url": reverse("payments:detail", args=[r.pk]),
+    }
+
+
+def _payment_tx(t) -> dict:
+    return {
+        "title": t.record.evaluator.name,
+        "names": _join(t.external_id, t.get_method_display()),
+        "body": t.notes,
+        "evaluator_id": t.record.evaluator_id,
+        "supplier_id": None,
+        "url": reverse("payments:detail", args=[t.record_id]),
+    }
+
+
+INDEXERS = {
+    ix.kind: ix
+    for ix in (
+        Indexer("document", "documents.Document", _document, ("evaluator", "supplier")),
+        Indexer(
+            "supplier",
+            "tenants.Supplier",
+            _supplier,
+            ("evaluator",),
+            dependents=(("document", "supplier"),),
+        ),
+        Indexer(
+            "evaluator",
+            "tenants.Evaluator",
+            _evaluator,
+            dependents=(
+                ("supplier", "evaluator"),
+                ("document", "evaluator"),
+                ("payment", "evaluator"),
+                ("payment_tx", "record__evaluator"),
+            ),
+        ),
+        Indexer("ticket", "tickets.Ticket", _ticket),
+        Indexer("payment", "payments.PaymentRecord", _payment, ("evaluator",)),
+        Indexer("payment_tx", "payments.PaymentTransaction", _payment_tx, ("record__evaluator",)),
+    )
+}
+
+
+def kind_for(model) -> str:
+    label = model._meta.label
+    for ix in INDEXERS.values():
+        if ix.model == label:
+            return ix.kind
+    raise LookupError(f"{label} is not indexed for search")
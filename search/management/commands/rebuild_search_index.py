@@ -0,0 +1,13 @@
+# search/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from search import services
+
+
+class Command(BaseCommand):
+    help = "Re-index every searchable object and drop entries of deleted objects."
+
+    def handle(self, *args, **options):
+        counts = services.rebuild()
+        summary = ", ".join(f"{kind}: {n}" for kind, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt — {summary}"))
@@ -0,0 +1,60 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models
+from django.db.models.functions import Upper
+
+
+class SearchEntry(models.Model):
+    """
+    One row per searchable object (document, supplier, evaluator, ticket,
+    payment record or transaction), kept in sync by search.signals.
+
+    `title` (weight A), `names` (B) and `body` (C) feed the `vector`
+    tsvector; `title` also has a trigram index for fuzzy name matches.
+    Partial matches use icontains, which PostgreSQL runs as
+    `UPPER(col) LIKE UPPER('%q%')`, hence the trigram indexes on UPPER() of
+    each text column (see POSTGRES_INDEXES). The tenant columns carry the
+    object's evaluator/supplier so search() can apply role scoping without
+    touching the source tables.
+    """
+
+    kind = models.CharField(max_length=20)
+    object_id = models.PositiveBigIntegerField()
+
+    evaluator = models.ForeignKey(
+        "tenants.Evaluator", null=True, blank=True, on_delete=models.CASCADE, related_name="+"
+    )
+    supplier = models.ForeignKey(
+        "tenants.Supplier", null=True, blank=True, on_delete=models.CASCADE, related_name="+"
+    )
+
+    title = models.CharField(max_length=255)
+    names = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+    url = models.CharField(max_length=255, blank=True)
+    vector = SearchVectorField(null=True, editable=False)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [("kind", "object_id")]
+        # portable indexes only; see POSTGRES_INDEXES
+        indexes = [
+            models.Index(fields=["evaluator", "kind"]),
+            models.Index(fields=["supplier", "kind"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}: {self.title}"
+
+
+# GIN indexes that only PostgreSQL can build. They are not in Meta.indexes
+# (SQLite can't parse them); search.signals.create_postgres_indexes adds any
+# missing ones after migrate.
+POSTGRES_INDEXES = (
+    GinIndex(fields=["vector"], name="search_entry_vector_gin"),
+    GinIndex(fields=["title"], opclasses=["gin_trgm_ops"], name="search_entry_title_trgm"),
+    GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="search_entry_title_upper_trgm"),
+    GinIndex(OpClass(Upper("names"), name="gin_trgm_ops"), name="search_entry_names_upper_trgm"),
+    GinIndex(OpClass(Upper("body"), name="gin_trgm_ops"), name="search_entry_body_upper_trgm"),
+)
@@ -0,0 +1,172 @@
+"""
+Search over documents, suppliers, evaluators, tickets and payments.
+
+Every searchable object has one SearchEntry (see search.indexers for what
+goes into it), upserted by search.signals whenever the object is saved.
+On PostgreSQL the entry's weighted tsvector is rebuilt in the same UPDATE
+batch and queries use the GIN indexes:
+
+- full text: `vector @@ websearch_to_tsquery(q)`, ranked with ts_rank;
+- fuzzy titles: trigram similarity on the title;
+- partial words (an email fragment, part of a subdomain or an ID):
+  icontains on the title, names and body, served by trigram indexes on
+  their UPPER() expressions (see SearchEntry.Meta).
+
+Other databases (local SQLite) keep the text columns only and fall back
+to icontains.
+
+`search()` is the tenant-scoped API; `matching()` narrows a list view's
+(already role-scoped) queryset to the hits, best match first.
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Value
+
+from accounts.models import Roles
+
+from .indexers import INDEXERS, kind_for
+from .models import SearchEntry
+
+CONFIG = getattr(settings, "SEARCH_CONFIG", "english")
+CHUNK_SIZE = int(getattr(settings, "SEARCH_INDEX_CHUNK_SIZE", 500))
+
+ENTRY_FIELDS = ["evaluator", "supplier", "title", "names", "body", "url", "updated_at"]
+
+# kinds each role may search, besides the tenant filter below
+EVALUATOR_KINDS = ("document", "supplier", "ticket")
+SUPPLIER_KINDS = ("document", "ticket")
+
+
+def _full_text() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def _vector():
+    return (
+        SearchVector("title", weight="A", config=CONFIG)
+        + SearchVector("names", weight="B", config=CONFIG)
+        + SearchVector("body", weight="C", config=CONFIG)
+    )
+
+
+# ---------- maintenance ----------
+
+
+def index(kind: str, objs) -> int:
+    """Upsert the entries of `objs` (instances of the kind's model). Returns entries written."""
+    ix = INDEXERS[kind]
+    rows = []
+    for obj in objs:
+        row = SearchEntry(kind=kind, object_id=obj.pk, **ix.build(obj))
+        row.title = row.title[:255]
+        rows.append(row)
+    if not rows:
+        return 0
+    ids = [r.object_id for r in rows]
+
+    renamed = []
+    if ix.dependents:
+        before = dict(
+            SearchEntry.objects.filter(kind=kind, object_id__in=ids).values_list("object_id", "title")
+        )
+        renamed = [r.object_id for r in rows if r.object_id in before and before[r.object_id] != r.title]
+
+    SearchEntry.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=["kind", "object_id"], update_fields=ENTRY_FIELDS
+    )
+    if _full_text():
+        SearchEntry.objects.filter(kind=kind, object_id__in=ids).update(vector=_vector())
+
+    # entries that embed a renamed object's name
+    if renamed:
+        for dep_kind, lookup in ix.dependents:
+            reindex(dep_kind, INDEXERS[dep_kind].queryset().filter(**{f"{lookup}__in": renamed}))
+    return len(rows)
+
+
+def reindex(kind: str, qs=None) -> int:
+    """Re-index `qs` (default: every object of the kind) in primary-key chunks."""
+    qs = INDEXERS[kind].queryset() if qs is None else qs
+    written, last = 0, 0
+    while True:
+        chunk = list(qs.filter(pk__gt=last).order_by("pk")[:CHUNK_SIZE])
+        if not chunk:
+            return written
+        written += index(kind, chunk)
+        last = chunk[-1].pk
+
+
+def remove(kind: str, ids) -> None:
+    SearchEntry.objects.filter(kind=kind, object_id__in=list(ids)).delete()
+
+
+def rebuild() -> dict:
+    """Re-index every kind and drop entries whose object is gone. Returns {kind: entries}."""
+    counts = {}
+    for kind, ix in INDEXERS.items():
+        counts[kind] = reindex(kind)
+        live = ix.get_model()._default_manager.values("pk")
+        SearchEntry.objects.filter(kind=kind).exclude(object_id__in=live).delete()
+    return counts
+
+
+# ---------- queries ----------
+
+
+def entries(q: str):
+    """SearchEntry rows matching `q`, annotated with `rank` (best first)."""
+    q = (q or "").strip()
+    if not q:
+        return SearchEntry.objects.none()
+    if not _full_text():
+        return (
+            SearchEntry.objects.filter(Q(title__icontains=q) | Q(names__icontains=q) | Q(body__icontains=q))
+            .annotate(rank=Value(0.0, output_field=FloatField()))
+            .order_by("-updated_at")
+        )
+    query = SearchQuery(q, search_type="websearch", config=CONFIG)
+    partial = Q(title__icontains=q) | Q(names__icontains=q) | Q(body__icontains=q)
+    return (
+        SearchEntry.objects.filter(Q(vector=query) | Q(title__trigram_similar=q) | partial)
+        .annotate(rank=SearchRank(F("vector"), query) + TrigramSimilarity("title", q))
+        .order_by("-rank", "-updated_at")
+    )
+
+
+def scoped(qs, user):
+    """Entries `user` may see: LAD/LUS everything, others their tenant's objects."""
+    if not user.is_authenticated:
+        return qs.none()
+    if user.role in (Roles.LAD, Roles.LUS):
+        return qs
+    if user.role in (Roles.EAD, Roles.EVS):
+        return qs.filter(kind__in=EVALUATOR_KINDS, evaluator_id=user.evaluator_id)
+    if user.role == Roles.SUS:
+        return qs.filter(kind__in=SUPPLIER_KINDS, evaluator_id=user.evaluator_id, supplier_id=user.supplier_id)
+    return qs.none()
+
+
+def search(user, q: str, kinds=None, limit: int = 20) -> list:
+    """Best `limit` entries matching `q` that `user` may see, optionally of `kinds` only."""
+    qs = scoped(entries(q), user)
+    if kinds:
+        qs = qs.filter(kind__in=list(kinds))
+    return list(qs[:limit])
+
+
+def matching(qs, q: str):
+    """
+    `qs` (a queryset of an indexed model, already role-scoped) narrowed to
+    the objects matching `q`, annotated with `search_rank`, best first.
+    """
+    hits = entries(q).filter(kind=kind_for(qs.model))
+    rank = hits.filter(object_id=OuterRef("pk")).values("rank")[:1]
+    return (
+        qs.filter(pk__in=hits.values("object_id"))
+        .annotate(search_rank=Subquery(rank, output_field=FloatField()))
+        .order_by("-search_rank", *qs.query.order_by)
+    )
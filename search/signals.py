@@ -0,0 +1,68 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+
+from core.signals import post_bulk_create
+from documents.models import Document
+from payments.models import PaymentRecord, PaymentTransaction
+from tenants.models import Evaluator, Supplier
+from tickets.models import Ticket
+
+from . import services
+from .indexers import kind_for
+
+INDEXED = (Document, Supplier, Evaluator, Ticket, PaymentRecord, PaymentTransaction)
+
+
+# ---------- index maintenance ----------
+
+
+def _connect(signal, handler):
+    for model in INDEXED:
+        signal.connect(handler, sender=model, dispatch_uid=f"search.{handler.__name__}.{model._meta.label}")
+
+
+def entry_saved(sender, instance, raw=False, **kwargs):
+    if not raw:  # fixtures are indexed by rebuild_search_index
+        services.index(kind_for(sender), [instance])
+
+
+def entries_bulk_created(sender, instances, **kwargs):
+    services.index(kind_for(sender), instances)
+
+
+def entry_deleted(sender, instance, **kwargs):
+    services.remove(kind_for(sender), [instance.pk])
+
+
+_connect(post_save, entry_saved)
+_connect(post_bulk_create, entries_bulk_created)
+_connect(post_delete, entry_deleted)
+
+
+# ---------- database setup ----------
+
+
+def create_trigram_extension(sender, using="default", **kwargs):
+    """pg_trgm must exist before the trigram index is created (see SearchConfig.ready)."""
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+
+def create_postgres_indexes(sender, using="default", **kwargs):
+    """Add the missing POSTGRES_INDEXES once the table exists (see SearchConfig.ready)."""
+    from .models import POSTGRES_INDEXES, SearchEntry
+
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    table = SearchEntry._meta.db_table
+    with connection.cursor() as cursor:
+        if table not in connection.introspection.table_names(cursor):
+            return
+        existing = connection.introspection.get_constraints(cursor, table)
+    with connection.schema_editor() as editor:
+        for index in POSTGRES_INDEXES:
+            if index.name not in existing:
+                editor.add_index(SearchEntry, index)
@@ -0,0 +1,91 @@
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.test import TestCase
+
+from accounts.models import Roles, User
+from documents.models import Document
+from payments.models import PaymentRecord
+from tenants.models import Evaluator, Supplier
+from tenants.testing import make_evaluator
+
+from . import services
+from .models import SearchEntry
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ev = make_evaluator(website="https://acme-widgets.test")
+        cls.other = make_evaluator("other")
+        cls.sup = Supplier.objects.create(
+            evaluator=cls.ev, name="Northwind", subdomain="northwind-logistics", poc_name="Dana Quill"
+        )
+        cls.sup2 = Supplier.objects.create(evaluator=cls.ev, name="Southwind", subdomain="southwind")
+        cls.foreign = Supplier.objects.create(evaluator=cls.other, name="Westwind", subdomain="westwind")
+
+        cls.doc = Document.objects.create(evaluator=cls.ev, supplier=cls.sup, title="Wind policy", file="d/a.pdf")
+        cls.doc2 = Document.objects.create(evaluator=cls.ev, supplier=cls.sup2, title="Wind audit", file="d/b.pdf")
+        cls.foreign_doc = Document.objects.create(
+            evaluator=cls.other, supplier=cls.foreign, title="Wind report", file="d/c.pdf"
+        )
+        cls.payment = PaymentRecord.objects.create(
+            evaluator=cls.ev, plan="essentials", amount_yearly=7777, subscription_id="SUB-88412", notes="wire ref 5531"
+        )
+
+        cls.lad = User.objects.create_user("lad@lucid.test", "pw", role=Roles.LAD)
+        cls.ead = User.objects.create_user("ead@acme.test", "pw", role=Roles.EAD, evaluator=cls.ev)
+        cls.sus = User.objects.create_user("sus@nw.test", "pw", role=Roles.SUS, evaluator=cls.ev, supplier=cls.sup)
+
+    def hits(self, user, q, **kwargs):
+        return {(e.kind, e.object_id) for e in services.search(user, q, **kwargs)}
+
+    def test_admins_see_every_tenant(self):
+        self.assertEqual(
+            self.hits(self.lad, "wind", kinds=["document"]),
+            {("document", self.doc.pk), ("document", self.doc2.pk), ("document", self.foreign_doc.pk)},
+        )
+
+    def test_evaluator_users_see_their_evaluator_only(self):
+        self.assertEqual(
+            self.hits(self.ead, "wind"),
+            {
+                ("document", self.doc.pk),
+                ("document", self.doc2.pk),
+                ("supplier", self.sup.pk),
+                ("supplier", self.sup2.pk),
+            },
+        )
+        # payments and evaluators are not evaluator-user kinds
+        self.assertEqual(self.hits(self.ead, "SUB-88412"), set())
+        self.assertEqual(self.hits(self.lad, "SUB-88412"), {("payment", self.payment.pk)})
+
+    def test_supplier_users_see_their_supplier_only(self):
+        self.assertEqual(self.hits(self.sus, "wind"), {("document", self.doc.pk)})
+
+    def test_anonymous_and_roleless_users_see_nothing(self):
+        nobody = User.objects.create_user("x@acme.test", "pw", role="", evaluator=self.ev)
+        self.assertEqual(self.hits(AnonymousUser(), "wind"), set())
+        self.assertEqual(self.hits(nobody, "wind"), set())
+
+    def test_partial_words_match_names_and_body(self):
+        suppliers = Supplier.objects.filter(evaluator=self.ev)
+        for q in ("logist", "Quil", "wind-logis"):
+            with self.subTest(q=q):
+                self.assertEqual(list(services.matching(suppliers, q)), [self.sup])
+        self.assertEqual(list(services.matching(Evaluator.objects.all(), "widgets")), [self.ev])
+        self.assertEqual(list(services.matching(PaymentRecord.objects.all(), "88412")), [self.payment])
+        self.assertEqual(list(services.matching(PaymentRecord.objects.all(), "5531")), [self.payment])
+
+    def test_matching_keeps_the_role_scope(self):
+        qs = Document.objects.filter(evaluator=self.ev)
+        self.assertEqual(set(services.matching(qs, "wind")), {self.doc, self.doc2})
+
+    def test_partial_matches_use_the_trigram_indexes(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("PostgreSQL only")
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            for field in ("title", "names", "body"):
+                with self.subTest(field=field):
+                    plan = SearchEntry.objects.filter(**{f"{field}__icontains": "wind"}).explain()
+                    self.assertIn(f"search_entry_{field}_upper_trgm", plan)
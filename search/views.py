@@ -0,0 +1,26 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+
+from . import services
+
+MAX_RESULTS = 50
+
+
+@login_required
+def query(request):
+    """GET ?q=...[&kind=document&kind=supplier][&limit=20] → ranked hits the user may see."""
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), MAX_RESULTS)
+    except ValueError:
+        limit = 20
+    hits = services.search(
+        request.user, request.GET.get("q", ""), kinds=request.GET.getlist("kind"), limit=limit
+    )
+    return JsonResponse(
+        {
+            "results": [
+                {"kind": h.kind, "id": h.object_id, "title": h.title, "url": h.url, "rank": round(h.rank or 0, 4)}
+                for h in hits
+            ]
+        }
+    )
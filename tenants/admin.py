@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Evaluator, Supplier, PaymentTransaction
+from .models import Evaluator, Supplier, PaymentTransaction, StorageUsage
 
 
 @admin.register(PaymentTransaction)
@@ -29,3 +29,10 @@ class SupplierAdmin(admin.ModelAdmin):
     search_fields = ("name", "primary_email")
 
 
+
+
+@admin.register(StorageUsage)
+class StorageUsageAdmin(admin.ModelAdmin):
+    list_display = ("category", "evaluator_id", "supplier_id", "bytes_used", "object_count", "updated_at")
+    list_filter = ("category",)
+    search_fields = ("evaluator_id", "supplier_id")
@@ -0,0 +1,195 @@
+"""
+Storage usage ledger.
+
+`record()` applies byte/object deltas to StorageUsage with F() increments in
+the caller's transaction (tenants.signals calls it on create, size change and
+delete). Reads are a single indexed aggregate instead of summing file sizes
+across whole tables. `reconcile()` recomputes the ledger from the source
+tables and corrects any drift.
+"""
+
+from __future__ import annotations
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import StorageCategory, StorageUsage
+
+
+# ---------- writes ----------
+
+
+def record(category: str, *, evaluator_id=None, supplier_id=None, size: int = 0, objects: int = 0) -> None:
+    if not size and not objects:
+        return
+    key = dict(evaluator_id=evaluator_id or 0, supplier_id=supplier_id or 0, category=category)
+    increments = dict(bytes_used=F("bytes_used") + size, object_count=F("object_count") + objects)
+    if StorageUsage.objects.filter(**key).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            StorageUsage.objects.create(**key, bytes_used=size, object_count=objects)
+    except IntegrityError:
+        # Lost the insert race; the row exists now.
+        StorageUsage.objects.filter(**key).update(**increments)
+
+
+# ---------- reads ----------
+
+
+def _scoped(evaluator_id=None, supplier_id=None, categories=None):
+    qs = StorageUsage.objects.all()
+    if evaluator_id is not None:
+        qs = qs.filter(evaluator_id=evaluator_id)
+    if supplier_id is not None:
+        qs = qs.filter(supplier_id=supplier_id)
+    if categories:
+        qs = qs.filter(category__in=categories)
+    return qs
+
+
+def usage(*, evaluator_id=None, supplier_id=None, categories=None) -> dict:
+    """{"bytes": int, "objects": int} for the given scope (everything by default)."""
+    agg = _scoped(evaluator_id, supplier_id, categories).aggregate(
+        bytes=Sum("bytes_used"), objects=Sum("object_count")
+    )
+    return {"bytes": int(agg["bytes"] or 0), "objects": int(agg["objects"] or 0)}
+
+
+def usage_by_category(*, evaluator_id=None, supplier_id=None) -> dict:
+    out = {c: {"bytes": 0, "objects": 0} for c in StorageCategory.values}
+    rows = (
+        _scoped(evaluator_id, supplier_id)
+        .values("category")
+        .annotate(bytes=Sum("bytes_used"), objects=Sum("object_count"))
+        .order_by()
+    )
+    for r in rows:
+        out[r["category"]] = {"bytes": int(r["bytes"] or 0), "objects": int(r["objects"] or 0)}
+    return out
+
+
+# ---------- reconcile ----------
+
+# Categories backed by a table we can recompute from (all of them; zips are
+# counted through ActivityZip).
+RECONCILED = (
+    StorageCategory.DOCUMENTS,
+    StorageCategory.ACTIVITY_FILES,
+    StorageCategory.ACTIVITY_ZIPS,
+    StorageCategory.TICKET_ATTACHMENTS,
+    StorageCategory.PROFILE_PHOTOS,
+)
+
+
+def _measure() -> dict:
+    """{(evaluator_id, supplier_id, category): (bytes, objects)} from the source tables."""
+    from accounts.models import User
+    from activities.models import ActivityFile, ActivityZip
+    from documents.models import Document
+    from tickets.models import TicketAttachment
+
+    has_file = ~Q(file="") & Q(file__isnull=False)
+    sources = [
+        (
+            StorageCategory.DOCUMENTS,
+            Document.objects.filter(has_file).values(ev=F("evaluator_id"), sup=F("supplier_id")),
+            "file_size",
+        ),
+        (
+            StorageCategory.ACTIVITY_FILES,
+            ActivityFile.objects.filter(has_file).values(
+                ev=F("activity__evaluator_id"), sup=F("activity__supplier_id")
+            ),
+            "file_size",
+        ),
+        (
+            StorageCategory.ACTIVITY_ZIPS,
+            ActivityZip.objects.exclude(zip_file="").values(
+                ev=F("activity__evaluator_id"), sup=F("activity__supplier_id")
+            ),
+            "file_size",
+        ),
+        (
+            StorageCategory.PROFILE_PHOTOS,
+            User.objects.exclude(profile_photo="")
+            .exclude(profile_photo__isnull=True)
+            .values(ev=F("evaluator_id"), sup=F("supplier_id")),
+            "profile_photo_size",
+        ),
+    ]
+
+    out: dict[tuple, tuple] = {}
+    for category, qs, size_field in sources:
+        for r in qs.annotate(b=Sum(size_field), n=Count("pk")).order_by():
+            out[(r["ev"] or 0, r["sup"] or 0, category)] = (int(r["b"] or 0), r["n"])
+
+    # Ticket tenants come from the related users, resolved per ticket.
+    for att in TicketAttachment.objects.filter(has_file).select_related("ticket"):
+        ev, sup = att.ticket.tenant_ids()
+        key = (ev or 0, sup or 0, StorageCategory.TICKET_ATTACHMENTS)
+        b, n = out.get(key, (0, 0))
+        out[key] = (b + att.file_size, n + 1)
+    return out
+
+
+def reconcile(*, dry_run: bool = False) -> list:
+    """
+    Recompute the table-backed categories and fix rows that drifted.
+    Returns [(evaluator_id, supplier_id, category, (old_bytes, old_objects), (new_bytes, new_objects))].
+    """
+    measured = _measure()
+    with transaction.atomic():
+        current = {
+            (r.evaluator_id, r.supplier_id, r.category): r
+            for r in StorageUsage.objects.select_for_update().filter(category__in=RECONCILED)
+        }
+        changes = []
+        for key in set(measured) | set(current):
+            new = measured.get(key, (0, 0))
+            row = current.get(key)
+            old = (row.bytes_used, row.object_count) if row else (0, 0)
+            if old == new:
+                continue
+            changes.append((*key, old, new))
+            if dry_run:
+                continue
+            if row:
+                row.bytes_used, row.object_count = new
+                row.save(update_fields=["bytes_used", "object_count", "updated_at"])
+            else:
+                ev_id, sup_id, category = key
+                StorageUsage.objects.create(
+                    evaluator_id=ev_id,
+                    supplier_id=sup_id,
+                    category=category,
+                    bytes_used=new[0],
+                    object_count=new[1],
+                )
+    return changes
+
+
+def fill_missing_sizes() -> int:
+    """
+    One-off: read the stored size of files whose size column is still 0 (rows
+    created before the column was tracked). One storage HEAD per file.
+    """
+    from accounts.models import User
+    from tickets.models import TicketAttachment
+
+    filled = 0
+    for model, file_field, size_field in (
+        (TicketAttachment, "file", "file_size"),
+        (User, "profile_photo", "profile_photo_size"),
+    ):
+        qs = model.objects.filter(**{size_field: 0}).exclude(**{file_field: ""}).exclude(
+            **{f"{file_field}__isnull": True}
+        )
+        for obj in qs.only("pk", file_field):
+            try:
+                size = getattr(obj, file_field).size
+            except Exception:
+                continue
+            model.objects.filter(pk=obj.pk).update(**{size_field: size})
+            filled += 1
+    return filled
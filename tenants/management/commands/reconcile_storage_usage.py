@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from tenants import ledger
+
+
+class Command(BaseCommand):
+    help = "Recompute the storage usage ledger from Documents, Activity files and zips, Ticket attachments and Profile photos."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drift without writing corrections.",
+        )
+        parser.add_argument(
+            "--fill-sizes",
+            action="store_true",
+            help="First read the stored size of attachments/photos whose size column is 0 (one storage request each).",
+        )
+
+    def handle(self, *args, **options):
+        if options.get("fill_sizes"):
+            n = ledger.fill_missing_sizes()
+            self.stdout.write(f"Filled sizes for {n} files.")
+
+        changes = ledger.reconcile(dry_run=options.get("dry_run", False))
+        for ev_id, sup_id, category, old, new in sorted(changes):
+            self.stdout.write(
+                f"  ev={ev_id} sup={sup_id} {category}: {old[0]} B/{old[1]} -> {new[0]} B/{new[1]}"
+            )
+        verb = "Would fix" if options.get("dry_run") else "Fixed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(changes)} ledger rows."))
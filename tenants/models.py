@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils import timezone
 import secrets, string
+import uuid
 
 
 class Plan(models.TextChoices):
@@ -109,6 +110,11 @@ class Supplier(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # A fresh, never reused stamp for every change to the supplier's
+    # validation rules, written in the same transaction; compiled rule
+    # matchers are keyed by it (activities.rules). Only rules.bump() writes
+    # it: save() leaves it out of UPDATEs.
+    rules_version = models.UUIDField(default=uuid.uuid4, editable=False)
 
     class Meta:
         unique_together = [
@@ -127,6 +133,14 @@ class Supplier(models.Model):
         hint = f"@{self.subdomain}" if self.subdomain else self.evaluator.name
         return f"{self.name} ({hint})"
 
+    def save(self, *args, **kwargs):
+        # a full save must not write back the rules stamp it loaded
+        if not self._state.adding and not kwargs.get("force_insert") and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != "rules_version"
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def domain(self) -> str:
         """Convenience: domain derived from POC email if present."""
@@ -156,3 +170,35 @@ class SupplierValidationRule(models.Model):
 
     def __str__(self):
         return f"{self.expected_name} ({'required' if self.is_required else 'optional'}) for {self.supplier.name}"
+
+
+# --- Storage usage ledger ---
+class StorageCategory(models.TextChoices):
+    DOCUMENTS = "documents", "Documents"
+    ACTIVITY_FILES = "activity_files", "Activity files"
+    ACTIVITY_ZIPS = "activity_zips", "Activity zips"
+    TICKET_ATTACHMENTS = "ticket_attachments", "Ticket attachments"
+    PROFILE_PHOTOS = "profile_photos", "Profile photos"
+
+
+class StorageUsage(models.Model):
+    """
+    Bytes and object counts stored per (evaluator, supplier, category).
+
+    Tenant ids are plain integers (0 = none) so Lucid-side files have a row too.
+    Maintained by tenants.signals / tenants.ledger and corrected by the
+    `reconcile_storage_usage` command.
+    """
+    evaluator_id = models.IntegerField(default=0)
+    supplier_id = models.IntegerField(default=0)
+    category = models.CharField(max_length=32, choices=StorageCategory.choices)
+    bytes_used = models.BigIntegerField(default=0)
+    object_count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [("evaluator_id", "supplier_id", "category")]
+        indexes = [models.Index(fields=["evaluator_id", "category"])]
+
+    def __str__(self):
+        return f"{self.category} ev={self.evaluator_id} sup={self.supplier_id}: {self.bytes_used} B / {self.object_count}"
@@ -1,6 +1,16 @@
-from django.db.models.signals import post_save
+from collections import defaultdict
+
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import Evaluator, Supplier
+
+from accounts.models import User
+from activities.models import Activity, ActivityFile, ActivityZip
+from core.signals import post_bulk_create
+from documents.models import Document
+from tickets.models import TicketAttachment
+
+from . import ledger
+from .models import Evaluator, StorageCategory, Supplier
 from .services import ensure_evaluator_folders, ensure_supplier_folders
 
 
@@ -14,3 +24,124 @@ def evaluator_created(sender, instance: Evaluator, created, **kwargs):
 def supplier_created(sender, instance: Supplier, created, **kwargs):
     if created:
         ensure_supplier_folders(instance)
+
+
+# ---------- storage ledger ----------
+
+
+def _activity_tenant(obj):
+    """Tenant of an ActivityFile / ActivityZip via its activity."""
+    if type(obj).activity.is_cached(obj):
+        return obj.activity.evaluator_id, obj.activity.supplier_id
+    row = (
+        Activity.objects.filter(pk=obj.activity_id)
+        .values_list("evaluator_id", "supplier_id")
+        .first()
+    )
+    return row or (None, None)
+
+
+# model -> (category, file field, size field, tenant resolver)
+LEDGER_SOURCES = {
+    Document: (
+        StorageCategory.DOCUMENTS,
+        "file",
+        "file_size",
+        lambda d: (d.evaluator_id, d.supplier_id),
+    ),
+    ActivityFile: (StorageCategory.ACTIVITY_FILES, "file", "file_size", _activity_tenant),
+    ActivityZip: (StorageCategory.ACTIVITY_ZIPS, "zip_file", "file_size", _activity_tenant),
+    TicketAttachment: (
+        StorageCategory.TICKET_ATTACHMENTS,
+        "file",
+        "file_size",
+        lambda a: a.ticket.tenant_ids(),
+    ),
+    User: (
+        StorageCategory.PROFILE_PHOTOS,
+        "profile_photo",
+        "profile_photo_size",
+        lambda u: (u.evaluator_id, u.supplier_id),
+    ),
+}
+
+
+def _ledger_state(instance, file_field, size_field):
+    """(bytes, objects) this row currently accounts for."""
+    if not getattr(instance, file_field):
+        return 0, 0
+    return getattr(instance, size_field) or 0, 1
+
+
+@receiver(pre_save)
+def storage_ledger_snapshot(sender, instance, raw=False, update_fields=None, **kwargs):
+    spec = LEDGER_SOURCES.get(sender)
+    if not spec or raw:
+        return
+    _, file_field, size_field, _ = spec
+
+    if sender is User:
+        photo = instance.profile_photo
+        if not photo:
+            instance.profile_photo_size = 0
+        elif not photo._committed:
+            instance.profile_photo_size = photo.size or 0
+
+    instance._ledger_skip = bool(update_fields) and not ({file_field, size_field} & set(update_fields))
+    if instance._state.adding or instance._ledger_skip or hasattr(instance, "_ledger_prev"):
+        return
+    # First save of a row loaded from the DB: read what it accounted for.
+    row = sender._default_manager.filter(pk=instance.pk).values_list(file_field, size_field).first()
+    instance._ledger_prev = (row[1] or 0, 1) if row and row[0] else (0, 0)
+
+
+@receiver(post_save)
+def storage_ledger_saved(sender, instance, created, raw=False, **kwargs):
+    spec = LEDGER_SOURCES.get(sender)
+    if not spec or raw or getattr(instance, "_ledger_skip", False):
+        return
+    category, file_field, size_field, tenant = spec
+    prev = (0, 0) if created else getattr(instance, "_ledger_prev", (0, 0))
+    cur = _ledger_state(instance, file_field, size_field)
+    instance._ledger_prev = cur
+    if cur == prev:
+        return
+    ev, sup = tenant(instance)
+    ledger.record(
+        category,
+        evaluator_id=ev,
+        supplier_id=sup,
+        size=cur[0] - prev[0],
+        objects=cur[1] - prev[1],
+    )
+
+
+@receiver(post_delete)
+def storage_ledger_deleted(sender, instance, **kwargs):
+    spec = LEDGER_SOURCES.get(sender)
+    if not spec:
+        return
+    category, file_field, size_field, tenant = spec
+    size, objects = getattr(instance, "_ledger_prev", None) or _ledger_state(instance, file_field, size_field)
+    if not objects:
+        return
+    ev, sup = tenant(instance)
+    ledger.record(category, evaluator_id=ev, supplier_id=sup, size=-size, objects=-objects)
+
+
+@receiver(post_bulk_create)
+def storage_ledger_bulk_created(sender, instances, **kwargs):
+    spec = LEDGER_SOURCES.get(sender)
+    if not spec:
+        return
+    category, file_field, size_field, tenant = spec
+    totals = defaultdict(lambda: [0, 0])
+    for obj in instances:
+        size, objects = _ledger_state(obj, file_field, size_field)
+        obj._ledger_prev = (size, objects)
+        if objects:
+            t = totals[tenant(obj)]
+            t[0] += size
+            t[1] += objects
+    for (ev, sup), (size, objects) in totals.items():
+        ledger.record(category, evaluator_id=ev, supplier_id=sup, size=size, objects=objects)
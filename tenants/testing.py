@@ -0,0 +1,48 @@
+"""
+Tenant fixtures shared by the apps' tests.
+
+    class MyTests(TenantFixture, TestCase):
+        @classmethod
+        def setUpTestData(cls):
+            super().setUpTestData()  # cls.ev (Acme), cls.sup (S1)
+            cls.user = supplier_user(cls.sup)
+"""
+
+from accounts.models import Roles, User
+
+from .models import Evaluator, Supplier
+
+
+def make_evaluator(slug: str = "acme", **fields) -> Evaluator:
+    """Evaluator `slug` ("acme" -> Acme, acme.test)."""
+    values = dict(
+        name=slug.title(),
+        email_domain=f"{slug}.test",
+        subdomain=slug,
+        poc_name="P",
+        poc_email=f"p@{slug}.test",
+    )
+    return Evaluator.objects.create(**{**values, **fields})
+
+
+def make_supplier(evaluator: Evaluator, slug: str = "s1", **fields) -> Supplier:
+    """Supplier `slug` of `evaluator` ("s1" -> S1)."""
+    values = dict(evaluator=evaluator, name=slug.upper(), subdomain=slug)
+    return Supplier.objects.create(**{**values, **fields})
+
+
+def supplier_user(supplier: Supplier, email: str = "sus@acme.test", **fields) -> User:
+    """An SUS user of `supplier` (and its evaluator), password "pw"."""
+    return User.objects.create_user(
+        email, "pw", role=Roles.SUS, evaluator=supplier.evaluator, supplier=supplier, **fields
+    )
+
+
+class TenantFixture:
+    """TestCase mixin: evaluator Acme as `cls.ev` and its supplier S1 as `cls.sup`."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ev = make_evaluator()
+        cls.sup = make_supplier(cls.ev)
@@ -1,3 +1,102 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from activities.models import Activity, ActivityFile
+from core.signals import bulk_create
+from documents.models import Document
+
+from . import ledger
+from .models import StorageCategory, StorageUsage
+from .testing import TenantFixture
+
+
+DOCS = StorageCategory.DOCUMENTS
+
+
+class LedgerTests(TenantFixture, TestCase):
+    def usage(self, **scope):
+        return ledger.usage(evaluator_id=self.ev.pk, **scope)
+
+    def _doc(self, size, **kwargs):
+        return Document.objects.create(
+            evaluator=self.ev, supplier=self.sup, title="doc", file="docs/a.pdf", file_size=size, **kwargs
+        )
+
+    def test_record_upserts_and_applies_deltas(self):
+        ledger.record(DOCS, evaluator_id=self.ev.pk, supplier_id=self.sup.pk, size=100, objects=1)
+        ledger.record(DOCS, evaluator_id=self.ev.pk, supplier_id=self.sup.pk, size=50, objects=1)
+        ledger.record(DOCS, evaluator_id=self.ev.pk, supplier_id=self.sup.pk, size=-30, objects=-1)
+
+        row = StorageUsage.objects.get(evaluator_id=self.ev.pk, supplier_id=self.sup.pk, category=DOCS)
+        self.assertEqual((row.bytes_used, row.object_count), (120, 1))
+
+    def test_record_without_tenant_uses_zero_ids(self):
+        ledger.record(StorageCategory.PROFILE_PHOTOS, size=10, objects=1)
+        self.assertTrue(StorageUsage.objects.filter(evaluator_id=0, supplier_id=0).exists())
+
+    def test_zero_delta_writes_nothing(self):
+        with self.assertNumQueries(0):
+            ledger.record(DOCS, evaluator_id=self.ev.pk, size=0, objects=0)
+
+    def test_document_create_resize_delete(self):
+        doc = self._doc(100)
+        self.assertEqual(self.usage(), {"bytes": 100, "objects": 1})
+
+        doc.file_size = 250
+        doc.save()
+        self.assertEqual(self.usage(), {"bytes": 250, "objects": 1})
+
+        doc.delete()
+        self.assertEqual(self.usage(), {"bytes": 0, "objects": 0})
+
+    def test_unrelated_update_fields_skip_the_ledger(self):
+        doc = self._doc(100)
+        doc.title = "renamed"
+        with CaptureQueriesContext(connection) as ctx:
+            doc.save(update_fields=["title"])
+        self.assertFalse([q for q in ctx.captured_queries if "tenants_storageusage" in q["sql"]])
+        self.assertEqual(self.usage(), {"bytes": 100, "objects": 1})
+
+    def test_row_without_file_is_not_counted(self):
+        Document.objects.create(evaluator=self.ev, supplier=self.sup, title="empty", file="", file_size=0)
+        self.assertEqual(self.usage(), {"bytes": 0, "objects": 0})
+
+    def test_bulk_create_is_recorded(self):
+        bulk_create(
+            Document,
+            [
+                Document(evaluator=self.ev, supplier=self.sup, title=f"d{i}", file=f"docs/{i}.pdf", file_size=10)
+                for i in range(3)
+            ],
+        )
+        self.assertEqual(self.usage(supplier_id=self.sup.pk), {"bytes": 30, "objects": 3})
+
+    def test_activity_files_use_the_activity_tenant(self):
+        activity = Activity.objects.create(evaluator=self.ev, supplier=self.sup)
+        ActivityFile.objects.create(activity=activity, original_name="f.pdf", file="f.pdf", file_size=7)
+
+        by_category = ledger.usage_by_category(evaluator_id=self.ev.pk, supplier_id=self.sup.pk)
+        self.assertEqual(by_category[StorageCategory.ACTIVITY_FILES], {"bytes": 7, "objects": 1})
+        self.assertEqual(by_category[DOCS], {"bytes": 0, "objects": 0})
+
+    def test_reconcile_fixes_drift(self):
+        self._doc(100)
+        self._doc(20)
+        # drift: a write that bypassed the signals
+        StorageUsage.objects.filter(evaluator_id=self.ev.pk, category=DOCS).update(bytes_used=1, object_count=9)
+        ledger.record(DOCS, evaluator_id=self.ev.pk, supplier_id=999, size=5, objects=1)
+
+        changes = ledger.reconcile(dry_run=True)
+        self.assertCountEqual(
+            changes,
+            [
+                (self.ev.pk, self.sup.pk, DOCS, (1, 9), (120, 2)),
+                (self.ev.pk, 999, DOCS, (5, 1), (0, 0)),
+            ],
+        )
+        self.assertEqual(self.usage(supplier_id=self.sup.pk), {"bytes": 1, "objects": 9})
+
+        ledger.reconcile()
+        self.assertEqual(self.usage(), {"bytes": 120, "objects": 2})
+        self.assertEqual(ledger.reconcile(), [])
@@ -13,7 +13,7 @@ from .services import (
     create_sus_for_supplier,
     create_evaluator_user,
 )
-from django.db.models import Q
+from search.services import matching
 from accounts.utils import invite_user
 from auditlog.services import log_event
 from notifications.services import notify
@@ -316,15 +316,7 @@ def evaluators_list(request):
 
     q = request.GET.get("q", "").strip()
     if q:
-        qs = qs.filter(
-            Q(name__icontains=q)
-            | Q(poc_name__icontains=q)
-            | Q(poc_email__icontains=q)
-            | Q(website__icontains=q)
-            | Q(city__icontains=q)
-            | Q(state__icontains=q)
-            | Q(subdomain__icontains=q)
-        )
+        qs = matching(qs, q)
 
     paginator = Paginator(qs, 20)
     page_number = request.GET.get("page")
@@ -354,9 +346,7 @@ def suppliers_list(request):
     # Simple search
     q = request.GET.get("q", "").strip()
     if q:
-        qs = qs.filter(
-            Q(name__icontains=q) | Q(evaluator__name__icontains=q)
-        )
+        qs = matching(qs, q)
 
     paginator = Paginator(qs, 20)
     page_number = request.GET.get("page")
@@ -141,6 +141,32 @@ class Ticket(models.Model):
     def __str__(self) -> str:  # pragma: no cover
         return f"#{self.pk or '—'} {self.title}"
 
+    def tenant_ids(self):
+        """(evaluator_id, supplier_id) the ticket belongs to.
+
+        Precedence: the evaluator user, then the supplier user, then the creator.
+        """
+        from django.contrib.auth import get_user_model
+
+        ids = [i for i in (self.evaluator_id, self.supplier_id, self.created_by_id) if i]
+        users = {
+            r["id"]: r
+            for r in get_user_model()
+            .objects.filter(pk__in=ids)
+            .values("id", "evaluator_id", "supplier_id")
+        }
+
+        def pick(field, *user_ids):
+            for uid in user_ids:
+                val = users.get(uid, {}).get(field)
+                if val:
+                    return val
+            return None
+
+        ev = pick("evaluator_id", self.evaluator_id, self.supplier_id, self.created_by_id)
+        sup = pick("supplier_id", self.supplier_id, self.created_by_id)
+        return ev, sup
+
 
 class TicketComment(models.Model):
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="comments")
@@ -159,10 +185,17 @@ class TicketAttachment(models.Model):
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="attachments")
     uploaded_by = models.ForeignKey(USER_MODEL, on_delete=models.PROTECT, related_name="ticket_attachments")
     file = models.FileField(upload_to=attachment_upload_to)
+    file_size = models.BigIntegerField(default=0)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["uploaded_at"]
 
+    def save(self, *args, **kwargs):
+        # size the upload before it is committed, so we never HEAD the object
+        if self.file and not self.file_size and not self.file._committed:
+            self.file_size = self.file.size or 0
+        super().save(*args, **kwargs)
+
     def __str__(self) -> str:  # pragma: no cover
         return f"Attachment {self.file.name} for {self.ticket}"
\ No newline at end of file